@@ -0,0 +1,36 @@
+"""Shared bootstrap for the benchmark scripts.
+
+Benchmarks run against a throwaway test database (in-memory for SQLite) so
+they never touch ``db.sqlite3``.
+"""
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup(create_db=True):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main.settings')
+
+    import django
+    django.setup()
+
+    if create_db:
+        from django.db import connection
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+
+def timeit(func, repeat=20):
+    """Run ``func`` ``repeat`` times and return (median, p95) in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return statistics.median(samples), p95
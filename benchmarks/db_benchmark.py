@@ -0,0 +1,166 @@
+"""Compare enroll/read throughput across database profiles.
+
+Each profile runs in its own process against a fresh database. Worker
+threads play the part of gunicorn workers: every operation is one
+"request" (a course listing read, or an enroll/unenroll write) followed by
+the connection bookkeeping Django does when a request finishes, so
+``CONN_MAX_AGE`` and pooling take effect as they would in production.
+
+SQLite profiles use a temporary file. Set ``DATABASE_URL`` to a PostgreSQL
+server to add the pooled and persistent PostgreSQL profiles; they run
+against a ``test_`` database that is created and dropped by the benchmark.
+
+Usage: python benchmarks/db_benchmark.py [--threads 8] [--seconds 5] [--write-ratio 0.2]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import _django
+
+SQLITE_PROFILES = {
+    'sqlite-default': {'SQLITE_TUNED': '0'},
+    'sqlite-tuned': {'SQLITE_TUNED': '1'},
+}
+POSTGRES_PROFILES = {
+    'postgres-per-request': {'DB_POOL': '0', 'DB_CONN_MAX_AGE': '0'},
+    'postgres-persistent': {'DB_POOL': '0', 'DB_CONN_MAX_AGE': '60'},
+    'postgres-pool': {'DB_POOL': '1'},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--courses', type=int, default=200)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--profile', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(run_profile(args)))
+        return
+
+    profiles = dict(SQLITE_PROFILES)
+    if os.environ.get('DATABASE_URL', '').startswith(('postgres', 'pgsql')):
+        profiles.update(POSTGRES_PROFILES)
+
+    print(f'{args.threads} threads, {args.seconds:g}s per profile, {args.write_ratio:.0%} writes')
+    print(f'{"profile":<22}{"ops/s":>10}{"reads/s":>10}{"writes/s":>10}{"p95 ms":>10}{"errors":>8}')
+    for name, env in profiles.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            child_env = {**os.environ, **env}
+            if name.startswith('sqlite'):
+                child_env['DATABASE_URL'] = f'sqlite:///{Path(tmp) / "bench.sqlite3"}'
+            output = subprocess.run(
+                [sys.executable, __file__, '--profile', name,
+                 '--threads', str(args.threads), '--seconds', str(args.seconds),
+                 '--write-ratio', str(args.write_ratio),
+                 '--courses', str(args.courses), '--users', str(args.users)],
+                env=child_env, capture_output=True, text=True, check=True,
+            ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f'{name:<22}{result["ops"]:>10.0f}{result["reads"]:>10.0f}'
+            f'{result["writes"]:>10.0f}{result["p95"]:>10.1f}{result["errors"]:>8}'
+        )
+
+
+def run_profile(args):
+    _django.setup(create_db=False)
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import OperationalError, close_old_connections, connection
+
+    database_name = settings.DATABASES['default']['NAME']
+    if connection.vendor == 'sqlite':
+        call_command('migrate', verbosity=0)
+    else:
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+    from courses.models import Course
+    from courses.services import CourseService, EnrollmentService
+    from users.models import User
+
+    authors = User.objects.bulk_create(
+        [User(username=f'author{i}', role='author') for i in range(10)]
+    )
+    Course.objects.bulk_create([
+        Course(author=authors[i % len(authors)], title=f'Course {i}', slug=f'course-{i}',
+               description='Benchmark course', is_published=True)
+        for i in range(args.courses)
+    ])
+    User.objects.bulk_create([User(username=f'student{i}') for i in range(args.users)])
+    course_ids = list(Course.objects.values_list('pk', flat=True))
+    student_ids = list(User.objects.filter(role='student').values_list('pk', flat=True))
+    connection.close()
+
+    per_page = settings.COURSES_PER_PAGE
+    deadline = time.perf_counter() + args.seconds
+    lock = threading.Lock()
+    totals = {'reads': 0, 'writes': 0, 'errors': 0, 'samples': []}
+
+    def worker(seed):
+        rng = random.Random(seed)
+        reads = writes = errors = 0
+        samples = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                user = User.objects.get(pk=rng.choice(student_ids))
+                if rng.random() < args.write_ratio:
+                    course = Course.objects.get(pk=rng.choice(course_ids))
+                    if EnrollmentService.is_enrolled(user, course):
+                        EnrollmentService.unenroll_user(user, course)
+                    else:
+                        EnrollmentService.enroll_user(user, course)
+                    writes += 1
+                else:
+                    courses = list(CourseService.get_published_courses()[:per_page])
+                    EnrollmentService.filter_enrolled(user, courses)
+                    reads += 1
+            except OperationalError:
+                errors += 1
+            finally:
+                # What the request_finished signal does at the end of a request.
+                close_old_connections()
+            samples.append((time.perf_counter() - start) * 1000)
+        connection.close()
+        with lock:
+            totals['reads'] += reads
+            totals['writes'] += writes
+            totals['errors'] += errors
+            totals['samples'].extend(samples)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if connection.vendor != 'sqlite':
+        connection.creation.destroy_test_db(database_name, verbosity=0)
+
+    samples = sorted(totals['samples']) or [0]
+    return {
+        'ops': (totals['reads'] + totals['writes']) / elapsed,
+        'reads': totals['reads'] / elapsed,
+        'writes': totals['writes'] / elapsed,
+        'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'errors': totals['errors'],
+    }
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Measure how long a worker is occupied by concurrent material downloads.
+
+Each simulated client reads the response at a fixed bandwidth, as a slow
+network peer would. In "python" mode the worker streams the file and stays
+busy until the client has read all of it. In "x-accel-redirect" mode the
+worker only builds headers and the proxy streams the file.
+
+Usage: python benchmarks/download_benchmark.py [--size-mb 50] [--clients 8] [--client-mbps 20]
+"""
+import argparse
+import shutil
+import tempfile
+import threading
+import time
+
+import _django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=50)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--client-mbps', type=float, default=20.0, help='Per-client bandwidth in MB/s')
+    args = parser.parse_args()
+
+    _django.setup()
+    from django.core.files import File
+    from django.test import RequestFactory, override_settings
+    from courses.models import Course, Enrollment, Lesson, Material
+    from courses.views import download_material
+    from users.models import User
+
+    media_root = tempfile.mkdtemp()
+    try:
+        with override_settings(MEDIA_ROOT=media_root):
+            author = User.objects.create(username='author', role='author')
+            student = User.objects.create(username='student')
+            course = Course.objects.create(author=author, title='Video course', description='d', is_published=True)
+            lesson = Lesson.objects.create(course=course, title='Lesson', content='c')
+            Enrollment.objects.create(user=student, course=course)
+            with tempfile.TemporaryFile() as source:
+                source.truncate(args.size_mb * 1024 * 1024)
+                material = Material.objects.create(
+                    lesson=lesson, title='Lecture', material_type='video', file=File(source, name='lecture.mp4')
+                )
+
+            factory = RequestFactory()
+            bytes_per_second = args.client_mbps * 1024 * 1024
+
+            def download(mode, occupancy):
+                request = factory.get(f'/materials/{material.pk}/download/')
+                request.user = student
+                start = time.perf_counter()
+                with override_settings(MATERIAL_DELIVERY_MODE=mode, MEDIA_ROOT=media_root):
+                    response = download_material(request, material_id=material.pk)
+                    for chunk in response:
+                        time.sleep(len(chunk) / bytes_per_second)
+                    response.close()
+                occupancy.append(time.perf_counter() - start)
+
+            print(f'{args.clients} concurrent downloads of {args.size_mb} MB at {args.client_mbps} MB/s per client')
+            print(f'{"mode":<20}{"worker s/download":>20}{"total worker s":>16}{"wall s":>10}')
+            for mode in ('python', 'x-accel-redirect'):
+                occupancy = []
+                threads = [threading.Thread(target=download, args=(mode, occupancy)) for _ in range(args.clients)]
+                wall = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                wall = time.perf_counter() - wall
+                print(f'{mode:<20}{sum(occupancy) / len(occupancy):>20.3f}{sum(occupancy):>16.3f}{wall:>10.2f}')
+    finally:
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
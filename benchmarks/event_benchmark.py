@@ -0,0 +1,83 @@
+"""Measure what recording lesson views adds to each ``lesson_detail`` request.
+
+Compares three modes against a file-backed SQLite database, where every
+INSERT outside a batch pays for its own commit:
+
+- ``off``: no event recorded (the baseline),
+- ``per-request``: one INSERT per view (``ACCESS_EVENT_BUFFER_SIZE=1``),
+- ``buffered``: events written in batches of ``--buffer-size``.
+
+Usage: python benchmarks/event_benchmark.py [--requests 2000] [--buffer-size 200]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import _django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--buffer-size', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f'sqlite:///{tmp}/events.sqlite3'
+        _django.setup(create_db=False)
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+        run(args)
+
+
+def run(args):
+    from django.test import Client, override_settings
+    from django.urls import reverse
+    from courses import analytics, events
+    from courses.models import AccessEvent, Course, Enrollment, Lesson
+    from users.models import User
+
+    author = User.objects.create_user('bench_author', password='pw', role='author')
+    student = User.objects.create_user('bench_student', password='pw')
+    course = Course.objects.create(author=author, title='Benchmark', description='d', is_published=True)
+    lesson = Lesson.objects.create(course=course, title='Lesson', content='Text ' * 200)
+    Enrollment.objects.create(user=student, course=course)
+    client = Client(HTTP_HOST='localhost')
+    client.force_login(student)
+    url = reverse('lesson_detail', args=[course.slug, lesson.pk])
+
+    def measure():
+        for _ in range(min(args.requests, 200)):
+            client.get(url)  # warm up caches and the connection
+        samples = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            response = client.get(url)
+            samples.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.status_code
+        events.flush()
+        samples.sort()
+        return samples[len(samples) // 2], sum(samples) / len(samples), samples[int(len(samples) * 0.95)]
+
+    record = analytics.record_lesson_view
+    results = {}
+    analytics.record_lesson_view = lambda user, lesson: None
+    try:
+        results['off'] = measure()
+    finally:
+        analytics.record_lesson_view = record
+    with override_settings(ACCESS_EVENT_BUFFER_SIZE=1):
+        results['per-request'] = measure()
+    with override_settings(ACCESS_EVENT_BUFFER_SIZE=args.buffer_size, ACCESS_EVENT_FLUSH_INTERVAL=3600):
+        results['buffered'] = measure()
+
+    baseline = results['off'][1]
+    print(f'{args.requests} lesson_detail requests per mode, {AccessEvent.objects.count()} events written')
+    print(f'{"mode":<14}{"median ms":>11}{"mean ms":>10}{"p95 ms":>9}{"overhead ms":>13}')
+    for mode, (median, mean, p95) in results.items():
+        print(f'{mode:<14}{median:>11.3f}{mean:>10.3f}{p95:>9.3f}{mean - baseline:>13.3f}')
+
+
+if __name__ == '__main__':
+    main()
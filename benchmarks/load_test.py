@@ -0,0 +1,152 @@
+"""Load-test the catalog pages under sync and uvicorn gunicorn workers.
+
+For every configuration the script starts gunicorn on a free local port,
+waits until it answers, and then runs ``--concurrency`` client threads for
+``--duration`` seconds against a mix of catalog URLs. With
+``--slow-client-ms`` each client pauses that long in the middle of sending
+its request headers. This models a slow network peer: a sync worker is
+blocked for the whole pause, while an async worker serves other clients.
+
+Usage: python benchmarks/load_test.py [--concurrency 50] [--duration 15] [--slow-client-ms 0]
+       python benchmarks/load_test.py --url http://127.0.0.1:8000  # test a running server
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from _django import BASE_DIR
+
+CONFIGS = {
+    'sync': {
+        'app': 'main.wsgi:application',
+        'env': {'GUNICORN_WORKER_CLASS': 'sync'},
+    },
+    'uvicorn': {
+        'app': 'main.asgi:application',
+        'env': {'GUNICORN_WORKER_CLASS': 'uvicorn_worker.UvicornWorker', 'ASYNC_VIEWS': '1'},
+    },
+}
+
+PATHS = ['/', '/courses/', '/courses/?q=python']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=2)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server on port {port} did not start')
+
+
+def run_load(base_url, concurrency, duration, slow_client_ms):
+    parts = urlsplit(base_url)
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(index):
+        nonlocal errors
+        count = 0
+        while time.monotonic() < deadline:
+            path = PATHS[(index + count) % len(PATHS)]
+            count += 1
+            start = time.perf_counter()
+            try:
+                with socket.create_connection((parts.hostname, parts.port), timeout=30) as sock:
+                    sock.sendall(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n'.encode())
+                    if slow_client_ms:
+                        time.sleep(slow_client_ms / 1000)
+                    sock.sendall(b'Connection: close\r\n\r\n')
+                    response = http.client.HTTPResponse(sock)
+                    response.begin()
+                    response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    if not latencies:
+        return {'rps': 0, 'p50': 0, 'p95': 0, 'p99': 0, 'errors': errors}
+    return {
+        'rps': len(latencies) / duration,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+        'p99': latencies[int(len(latencies) * 0.99) - 1],
+        'errors': errors,
+    }
+
+
+def start_server(name, port, workers):
+    config = CONFIGS[name]
+    env = {**os.environ, **config['env'], 'GUNICORN_WORKERS': str(workers)}
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', config['app'], '--config', 'gunicorn.conf.py',
+         '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', '--access-logfile', '/dev/null'],
+        cwd=BASE_DIR, env=env,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=int, default=15)
+    parser.add_argument('--slow-client-ms', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=2, help='Workers per configuration (default: 2)')
+    parser.add_argument('--url', help='Benchmark an already running server instead')
+    args = parser.parse_args()
+
+    print(f'{args.concurrency} clients, {args.duration}s, slow client delay {args.slow_client_ms}ms')
+    print(f'{"setup":<12}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"errors":>8}')
+
+    def report(name, result):
+        print(f'{name:<12}{result["rps"]:>10.1f}{result["p50"]:>10.1f}{result["p95"]:>10.1f}'
+              f'{result["p99"]:>10.1f}{result["errors"]:>8}')
+
+    if args.url:
+        report('server', run_load(args.url, args.concurrency, args.duration, args.slow_client_ms))
+        return
+
+    for name in CONFIGS:
+        port = free_port()
+        server = start_server(name, port, args.workers)
+        try:
+            wait_until_up('127.0.0.1', port)
+            report(name, run_load(f'http://127.0.0.1:{port}', args.concurrency, args.duration, args.slow_client_ms))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
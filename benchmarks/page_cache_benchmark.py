@@ -0,0 +1,125 @@
+"""Measure anonymous catalog pages with and without the full-page cache.
+
+Fills a temporary SQLite database with ``--courses`` published courses of
+``--lessons`` lessons each, then times anonymous GETs of the home page, the
+course list and a course page through the full middleware stack, with
+``PAGE_CACHE_TIMEOUT=0`` (every request renders) and with the cache warm.
+
+Then purges the course page ``--purges`` times while ``--threads`` threads
+request it in a loop, and counts the responses that were rendered, served
+stale while another thread rendered, or cached. With misses coalesced there
+is about one render per purge, however many threads are waiting.
+
+Usage: python benchmarks/page_cache_benchmark.py [--requests 1000] [--threads 8]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import _django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000, help='Requests timed per page and mode')
+    parser.add_argument('--courses', type=int, default=200)
+    parser.add_argument('--lessons', type=int, default=20, help='Lessons per course')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--purges', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f'sqlite:///{tmp}/pages.sqlite3'
+        _django.setup(create_db=False)
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+        run(args)
+
+
+def run(args):
+    from django.test import Client, override_settings
+    from django.urls import reverse
+    from courses import http_cache, page_cache
+    from courses.models import Course, Lesson
+    from users.models import User
+
+    author = User.objects.create_user('bench_author', password='pw', role='author')
+    courses = Course.objects.bulk_create([
+        Course(author=author, title=f'Course {i}', slug=f'course-{i}', description='Text ' * 50, is_published=True)
+        for i in range(args.courses)
+    ])
+    Lesson.objects.bulk_create([
+        Lesson(course=course, title=f'Lesson {j}', content='Body', order=j, progress_slot=j)
+        for course in courses for j in range(args.lessons)
+    ])
+    Course.objects.update(lesson_count=args.lessons, progress_slots=args.lessons)
+    course = courses[0]
+    pages = {
+        'home': reverse('home'),
+        'course_list': reverse('course_list'),
+        'course_detail': reverse('course_detail', args=[course.slug]),
+    }
+    client = Client(HTTP_HOST='localhost')
+
+    def measure(url):
+        client.get(url)  # warm up the cache and the connection
+        return _django.timeit(lambda: client.get(url), repeat=args.requests)
+
+    results = {}
+    with override_settings(ALLOWED_HOSTS=['localhost'], PAGE_CACHE_TIMEOUT=0):
+        for name, url in pages.items():
+            results[name, 'render'] = measure(url)
+    with override_settings(ALLOWED_HOSTS=['localhost'], PAGE_CACHE_TIMEOUT=60):
+        for name, url in pages.items():
+            results[name, 'cached'] = measure(url)
+        served = stampede(args, pages['course_detail'], page_cache, http_cache.course_keys(course))
+
+    print(f'{args.requests} anonymous requests per page and mode, {args.courses} courses')
+    print(f'{"page":<15}{"mode":<8}{"median ms":>11}{"p95 ms":>9}')
+    for (name, mode), (median, p95) in results.items():
+        print(f'{name:<15}{mode:<8}{median:>11.3f}{p95:>9.3f}')
+    print(
+        f'{args.purges} purges of course_detail under {args.threads} threads: {served["miss"]} renders, '
+        f'{served["stale"]} stale and {served["hit"]} cached responses'
+    )
+
+
+def stampede(args, url, page_cache, keys):
+    """Purge ``keys`` repeatedly while threads request ``url``; returns how
+    each response was served."""
+    from collections import Counter
+    from django.db import connections
+    from django.test import Client
+
+    served = Counter()
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def hammer():
+        client = Client(HTTP_HOST='localhost')
+        try:
+            while not stop.is_set():
+                status = client.get(url)['X-Page-Cache']
+                with lock:
+                    served[status] += 1
+        finally:
+            connections.close_all()
+
+    client = Client(HTTP_HOST='localhost')
+    client.get(url)
+    threads = [threading.Thread(target=hammer) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for _ in range(args.purges):
+        page_cache.purge(*keys)
+        time.sleep(0.02)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return served
+
+
+if __name__ == '__main__':
+    main()
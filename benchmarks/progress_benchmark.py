@@ -0,0 +1,173 @@
+"""Compare completion bitmaps on ``Enrollment`` with a row per completed lesson.
+
+Fills a temporary SQLite database with ``--students`` students, each
+enrolled in ``--courses`` courses of ``--lessons`` lessons, who completed
+``--completed`` of every course's lessons. The same completions are stored
+both ways: in ``Enrollment.progress`` and in a ``completion`` table with a
+row per (user, lesson), as a ``LessonCompletion`` model would. Reports
+
+- the bytes each layout adds on disk (tables and indexes, from ``dbstat``),
+- the time to mark one lesson complete (``ProgressService.mark_complete``
+  against an INSERT into the completion table),
+- the time to read a student's enrollments with their percent complete,
+  as ``my_courses`` does.
+
+Usage: python benchmarks/progress_benchmark.py [--students 2000] [--courses 5] [--lessons 40]
+"""
+import argparse
+import os
+import random
+import tempfile
+
+import _django
+
+COMPLETION_TABLE = '''
+    CREATE TABLE completion (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        lesson_id INTEGER NOT NULL,
+        completed_at DATETIME NOT NULL,
+        UNIQUE (user_id, lesson_id)
+    )
+'''
+COMPLETION_INDEX = 'CREATE INDEX completion_lesson_idx ON completion (lesson_id)'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--courses', type=int, default=5, help='Courses each student is enrolled in')
+    parser.add_argument('--lessons', type=int, default=40, help='Lessons per course')
+    parser.add_argument('--completed', type=float, default=0.5, help='Share of lessons completed')
+    parser.add_argument('--marks', type=int, default=2000, help='Mark-complete calls timed per layout')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f'sqlite:///{tmp}/progress.sqlite3'
+        _django.setup(create_db=False)
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+        run(args)
+
+
+def table_bytes(cursor, table):
+    cursor.execute(
+        'SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name = %s '
+        'OR name IN (SELECT name FROM sqlite_master WHERE tbl_name = %s AND type = %s)',
+        [table, table, 'index'],
+    )
+    return cursor.fetchone()[0]
+
+
+def run(args):
+    from django.db import connection, transaction
+    from django.utils import timezone
+    from courses import progress
+    from courses.models import Course, Enrollment, Lesson
+    from courses.services import EnrollmentService, ProgressService
+    from users.models import User
+
+    rng = random.Random(0)
+    author = User.objects.create_user('bench_author', password='pw', role='author')
+    students = User.objects.bulk_create([User(username=f'student{i}') for i in range(args.students)])
+    courses, lessons = [], {}
+    for i in range(args.courses):
+        course = Course.objects.create(author=author, title=f'Course {i}', description='d', is_published=True)
+        lessons[course.pk] = [
+            Lesson.objects.create(course=course, title=f'Lesson {j}', content='Body', order=j) for j in range(args.lessons)
+        ]
+        courses.append(course)
+    Course.objects.update(lesson_count=args.lessons)
+    enrollments = Enrollment.objects.bulk_create(
+        [Enrollment(user=student, course=course) for student in students for course in courses], batch_size=5000,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(COMPLETION_TABLE)
+        cursor.execute(COMPLETION_INDEX)
+        cursor.execute('VACUUM')
+        enrollment_before = table_bytes(cursor, 'courses_enrollment')
+
+    # Everything but the timed marks is loaded in bulk, the same set both ways.
+    done = max(0, int(args.lessons * args.completed) - 1)
+    now = timezone.now()
+    rows = []
+    with transaction.atomic():
+        for enrollment in enrollments:
+            completed = rng.sample(lessons[enrollment.course_id], done)
+            bitmap = b''
+            for lesson in completed:
+                bitmap = progress.with_slot(bitmap, lesson.progress_slot)
+                rows.append((enrollment.user_id, lesson.pk, now))
+            enrollment.progress, enrollment.completed_count = bitmap, len(completed)
+        Enrollment.objects.bulk_update(enrollments, ['progress', 'completed_count'], batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.executemany('INSERT INTO completion (user_id, lesson_id, completed_at) VALUES (%s, %s, %s)', rows)
+
+    # One more lesson per enrollment, marked both ways and timed.
+    pending = []
+    for enrollment in rng.sample(enrollments, min(args.marks, len(enrollments))):
+        bitmap = bytes(Enrollment.objects.values_list('progress', flat=True).get(pk=enrollment.pk))
+        lesson = next(lesson for lesson in lessons[enrollment.course_id] if not progress.has(bitmap, lesson.progress_slot))
+        pending.append((User(pk=enrollment.user_id), lesson))
+
+    def mark_bitmap():
+        user, lesson = pending_bitmap.pop()
+        ProgressService.mark_complete(user, lesson)
+
+    def mark_row():
+        user, lesson = pending_rows.pop()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO completion (user_id, lesson_id, completed_at) VALUES (%s, %s, %s) '
+                'ON CONFLICT (user_id, lesson_id) DO NOTHING',
+                [user.pk, lesson.pk, timezone.now()],
+            )
+
+    pending_bitmap, pending_rows = list(pending), list(pending)
+    marks = {
+        'bitmap': _django.timeit(mark_bitmap, repeat=len(pending)),
+        'rows': _django.timeit(mark_row, repeat=len(pending)),
+    }
+
+    # my_courses lists the enrollments either way; rows need a count on top.
+    def read_bitmap():
+        enrollments = EnrollmentService.get_user_enrollments(rng.choice(students))
+        return {enrollment.course_id: enrollment.percent_complete for enrollment in enrollments}
+
+    def read_rows():
+        student = rng.choice(students)
+        enrollments = list(EnrollmentService.get_user_enrollments(student))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT l.course_id, COUNT(*) FROM completion c JOIN courses_lesson l ON l.id = c.lesson_id '
+                'WHERE c.user_id = %s GROUP BY l.course_id',
+                [student.pk],
+            )
+            counts = dict(cursor.fetchall())
+        return {
+            enrollment.course_id: round(100 * counts.get(enrollment.course_id, 0) / enrollment.course.lesson_count)
+            for enrollment in enrollments
+        }
+
+    reads = {'bitmap': _django.timeit(read_bitmap, repeat=500), 'rows': _django.timeit(read_rows, repeat=500)}
+
+    with connection.cursor() as cursor:
+        cursor.execute('VACUUM')
+        sizes = {
+            'bitmap': table_bytes(cursor, 'courses_enrollment') - enrollment_before,
+            'rows': table_bytes(cursor, 'completion'),
+        }
+        cursor.execute('SELECT COUNT(*) FROM completion')
+        completions = cursor.fetchone()[0]
+
+    print(f'{len(enrollments)} enrollments, {completions} completions')
+    print(f'{"layout":<8}{"bytes on disk":>15}{"mark median ms":>16}{"mark p95 ms":>13}{"read median ms":>16}{"read p95 ms":>13}')
+    for layout in ('bitmap', 'rows'):
+        print(
+            f'{layout:<8}{sizes[layout]:>15,}{marks[layout][0]:>16.3f}{marks[layout][1]:>13.3f}'
+            f'{reads[layout][0]:>16.3f}{reads[layout][1]:>13.3f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
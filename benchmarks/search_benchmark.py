@@ -0,0 +1,80 @@
+"""Compare indexed course search with the old ``icontains`` scan.
+
+Usage: python benchmarks/search_benchmark.py [--courses 100000]
+"""
+import argparse
+import random
+
+import _django
+
+WORDS = (
+    'python django data science machine learning web design network security '
+    'cloud devops testing algorithms statistics database frontend backend mobile '
+    'java rust go kotlin swift linux docker kubernetes analytics visualization '
+    'marketing finance writing photography music drawing language history'
+).split()
+
+
+# Synthetic long-tail vocabulary so that, as in real catalogs, most terms
+# appear in only a small fraction of the courses.
+RARE_WORDS = [f'topic{n}' for n in range(20_000)]
+
+
+def sentence(rng, length):
+    words = []
+    for _ in range(length):
+        if rng.random() < 0.2:
+            words.append(rng.choice(WORDS))
+        else:
+            words.append(RARE_WORDS[min(int(rng.paretovariate(0.8)) * 7, len(RARE_WORDS) - 1)])
+    return ' '.join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--courses', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    _django.setup()
+    from django.core.management import call_command
+    from django.db.models import Q
+    from courses.models import Course
+    from courses.search import search
+    from users.models import User
+
+    rng = random.Random(42)
+    author = User.objects.create(username='bench-author', role='author')
+    batch = []
+    for i in range(args.courses):
+        batch.append(Course(
+            author=author,
+            title=sentence(rng, 4),
+            slug=f'course-{i}',
+            description=sentence(rng, 60),
+            is_published=True,
+        ))
+        if len(batch) == 5000:
+            Course.objects.bulk_create(batch)
+            batch = []
+    Course.objects.bulk_create(batch)
+    call_command('rebuild_search_index', verbosity=0, stdout=open('/dev/null', 'w'))
+
+    print(f'{args.courses} courses')
+    print(f'{"query":<24}{"icontains p50/p95 ms":>24}{"index p50/p95 ms":>22}')
+    for query in ('python', 'machine learning', 'topic700', 'topic7 topic14', 'nomatchword'):
+        def scan():
+            list(Course.objects.filter(
+                Q(title__icontains=query) | Q(description__icontains=query), is_published=True
+            )[:20])
+
+        def indexed():
+            list(search(query)[:20])
+
+        scan_p50, scan_p95 = _django.timeit(scan, args.repeat)
+        index_p50, index_p95 = _django.timeit(indexed, args.repeat)
+        print(f'{query:<24}{scan_p50:>12.2f}/{scan_p95:<11.2f}{index_p50:>10.2f}/{index_p95:.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Stress slug allocation with concurrent course creates from several processes.
+
+Every worker process creates ``--courses`` courses, mostly with the same
+title and some with a numbered one ("Intro to Python 3") that competes for
+the same slugs, the way several gunicorn workers would. The run fails if
+any create raises or two courses share a slug, and reports how the time
+per create changes as the number of duplicates grows.
+
+SQLite runs against a temporary file with the tuned settings (immediate
+transactions and a busy timeout). Set ``DATABASE_URL`` to a PostgreSQL
+server to stress it instead; the run uses a throwaway ``test_`` database.
+
+Usage: python benchmarks/slug_stress.py [--workers 8] [--courses 200]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import _django
+
+TITLE = 'Intro to Python'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--courses', type=int, default=200, help='Courses created by each worker')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        print(json.dumps(run_worker(args)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if not os.environ.get('DATABASE_URL', '').startswith(('postgres', 'pgsql')):
+            os.environ.update(
+                DATABASE_URL=f'sqlite:///{Path(tmp) / "slugs.sqlite3"}', SQLITE_TUNED='1', SQLITE_BUSY_TIMEOUT='30',
+            )
+        _django.setup(create_db=False)
+        from django.core.management import call_command
+        from django.db import connection
+
+        if connection.vendor == 'sqlite':
+            call_command('migrate', verbosity=0)
+            run(args)
+        else:
+            name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            os.environ['STRESS_DATABASE_NAME'] = name
+            try:
+                run(args)
+            finally:
+                connection.creation.destroy_test_db(name, verbosity=0)
+
+
+def run(args):
+    from django.db import connection
+    from courses.models import Course
+    from users.models import User
+
+    User.objects.create_user('stress_author', password='pw', role='author')
+    workers = [
+        subprocess.Popen(
+            [sys.executable, __file__, '--worker', str(i), '--courses', str(args.courses)],
+            stdout=subprocess.PIPE, text=True,
+        )
+        for i in range(args.workers)
+    ]
+    results = [json.loads(worker.communicate()[0].strip().splitlines()[-1]) for worker in workers]
+
+    slugs = list(Course.objects.values_list('slug', flat=True))
+    errors = [error for result in results for error in result['errors']]
+    expected = args.workers * args.courses
+    print(f'{args.workers} workers x {args.courses} creates on {connection.vendor}')
+    print(f'courses created: {len(slugs)} of {expected}, distinct slugs: {len(set(slugs))}, errors: {len(errors)}')
+    for error in errors[:5]:
+        print(f'  {error}')
+    first = sum(result['first_ms'] for result in results) / len(results)
+    last = sum(result['last_ms'] for result in results) / len(results)
+    print(f'mean ms per create: first tenth {first:.2f}, last tenth {last:.2f}')
+    if errors or len(slugs) != expected or len(set(slugs)) != len(slugs):
+        sys.exit(1)
+
+
+def run_worker(args):
+    _django.setup(create_db=False)
+    from django.db import connection
+    from courses.services import CourseService
+    from users.models import User
+
+    if 'STRESS_DATABASE_NAME' in os.environ:
+        connection.settings_dict['NAME'] = os.environ['STRESS_DATABASE_NAME']
+    author = User.objects.get(username='stress_author')
+    errors, samples = [], []
+    for i in range(args.courses):
+        # Every seventh course is numbered, and collides with the third
+        # "Intro to Python" unless both readings of the slug are counted.
+        title = f'{TITLE} {i % 5 + 2}' if i % 7 == 0 else TITLE
+        start = time.perf_counter()
+        try:
+            CourseService.create_course(author, title, 'Stress test')
+        except Exception as exc:
+            errors.append(f'worker {args.worker}: {exc!r}')
+        samples.append((time.perf_counter() - start) * 1000)
+    tenth = max(1, len(samples) // 10)
+    return {
+        'errors': errors,
+        'first_ms': sum(samples[:tenth]) / tenth,
+        'last_ms': sum(samples[-tenth:]) / tenth,
+    }
+
+
+if __name__ == '__main__':
+    main()
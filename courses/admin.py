@@ -1,5 +1,18 @@
-from django.contrib import admin
-from .models import Course, Lesson, Material, Enrollment
+import io
+
+from django import forms
+from django.contrib import admin, messages
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from . import slugs
+from .cohorts import CohortFileError, read_csv, summarize
+from .models import Course, Lesson, Material, Enrollment, Job, StoredBlob
+from .services import EnrollmentService
+
+
+class CohortUploadForm(forms.Form):
+    csv_file = forms.FileField(label='CSV file', help_text='A header row with a username column, then one user per row.')
+
 
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
@@ -7,6 +20,46 @@ class CourseAdmin(admin.ModelAdmin):
     list_filter = ('difficulty', 'is_published', 'created_at')
     search_fields = ('title', 'description', 'author__username')
     prepopulated_fields = {'slug': ('title',)}
+    actions = ['enroll_cohort']
+
+    # Shown in the problem list after an import; the full result is in the
+    # bulk_enroll command's --report file.
+    MAX_REPORTED_ROWS = 20
+
+    def save_model(self, request, obj, form, change):
+        if change and 'slug' in form.changed_data:
+            slugs.reserve([obj.slug])
+        super().save_model(request, obj, form, change)
+
+    @admin.action(description='Enroll a cohort from CSV in selected courses')
+    def enroll_cohort(self, request, queryset):
+        form = CohortUploadForm(request.POST, request.FILES) if 'apply' in request.POST else CohortUploadForm()
+        if form.is_valid():
+            course_slugs = list(queryset.values_list('slug', flat=True))
+            stream = io.TextIOWrapper(form.cleaned_data['csv_file'].file, encoding='utf-8-sig', newline='')
+            problems = []
+
+            def collect(result):
+                if result.status not in ('enrolled', 'already_enrolled') and len(problems) < self.MAX_REPORTED_ROWS:
+                    problems.append(f'line {result.line} ({result.username or "-"}, {result.course}): {result.status}')
+
+            try:
+                totals = summarize(EnrollmentService.bulk_enroll(read_csv(stream, course_slugs)), collect)
+            except (CohortFileError, UnicodeDecodeError) as exc:
+                self.message_user(request, f'Could not read the file: {exc}', messages.ERROR)
+                return None
+            self.message_user(request, ', '.join(f'{status}: {count}' for status, count in totals.items() if count))
+            if problems:
+                self.message_user(request, 'Skipped rows: ' + '; '.join(problems), messages.WARNING)
+            return None
+        return TemplateResponse(request, 'admin/courses/course/enroll_cohort.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Enroll a cohort',
+            'opts': self.model._meta,
+            'courses': queryset,
+            'form': form,
+            'action_checkbox_name': admin.helpers.ACTION_CHECKBOX_NAME,
+        })
 
 @admin.register(Lesson)
 class LessonAdmin(admin.ModelAdmin):
@@ -16,7 +69,7 @@ class LessonAdmin(admin.ModelAdmin):
 
 @admin.register(Material)
 class MaterialAdmin(admin.ModelAdmin):
-    list_display = ('title', 'lesson', 'material_type', 'uploaded_at')
+    list_display = ('title', 'lesson', 'material_type', 'original_filename', 'uploaded_at')
     list_filter = ('material_type', 'uploaded_at')
     search_fields = ('title', 'description')
 
@@ -25,3 +78,21 @@ class EnrollmentAdmin(admin.ModelAdmin):
     list_display = ('user', 'course', 'enrolled_at')
     list_filter = ('enrolled_at',)
     search_fields = ('user__username', 'course__title')
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by')
+    list_filter = ('status', 'name')
+    readonly_fields = ('created_at', 'locked_at', 'last_error')
+    actions = ['retry_jobs']
+
+    @admin.action(description='Retry selected jobs now')
+    def retry_jobs(self, request, queryset):
+        updated = queryset.update(status='queued', attempts=0, run_at=timezone.now(), locked_at=None)
+        self.message_user(request, f'{updated} jobs queued')
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'ref_count', 'created_at')
+    search_fields = ('name', 'sha256')
+    readonly_fields = ('name', 'sha256', 'size', 'ref_count', 'created_at')
@@ -0,0 +1,130 @@
+"""Daily per-course rollups of enrollments, material downloads and lesson views.
+
+``aggregate()`` (run periodically by ``manage.py aggregate_stats``) counts
+source rows into ``DailyCourseStats``. Each source keeps a
+``RollupWatermark`` with the highest row id already counted, so a run only
+reads the rows added since the last one, however large the tables get.
+
+Ids are handed out when a row is inserted but become visible only when
+its transaction commits, so a slow transaction can commit a lower id after
+a higher one was counted. Enrollments younger than the lag window are left
+for the next run; the lag must be longer than any write transaction.
+Access events are written in batches long after they happened, so their
+age says nothing about when they commit; ``events.py`` writes one batch at
+a time instead, which keeps their ids in commit order.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import events
+from .models import AccessEvent, Course, DailyCourseStats, Enrollment, RollupWatermark
+
+DEFAULT_LAG = timedelta(minutes=5)
+
+# Rollup column -> (source queryset, timestamp field).
+SOURCES = {
+    'enrollments': (lambda: Enrollment.objects.all(), 'enrolled_at'),
+    'downloads': (lambda: AccessEvent.objects.filter(kind='download'), 'created_at'),
+    'lesson_views': (lambda: AccessEvent.objects.filter(kind='lesson_view'), 'created_at'),
+}
+
+
+def aggregate(lag=DEFAULT_LAG, batch_size=50000):
+    """Count every source's new rows. Returns ``{column: rows counted}``."""
+    return {column: aggregate_source(column, lag, batch_size) for column in SOURCES}
+
+
+def aggregate_source(column, lag=DEFAULT_LAG, batch_size=50000):
+    source, time_field = SOURCES[column]
+    counted = 0
+    while True:
+        with transaction.atomic():
+            # The lock keeps two aggregators from counting the same rows.
+            watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=column)
+            ready = source().filter(
+                pk__gt=watermark.last_id, **{f'{time_field}__lte': timezone.now() - lag}
+            ).aggregate(last=Max('pk'))['last']
+            if ready is None:
+                return counted
+            upper = min(ready, watermark.last_id + batch_size)
+            counted += add_to_rollups(column, source().filter(pk__gt=watermark.last_id, pk__lte=upper), time_field)
+            watermark.last_id = upper
+            watermark.save(update_fields=['last_id', 'updated_at'])
+
+
+def add_to_rollups(column, rows, time_field):
+    counts = {
+        (row['course_id'], row['day']): row['total']
+        for row in rows.annotate(day=TruncDate(time_field)).order_by()
+        .values('course_id', 'day').annotate(total=Count('pk'))
+    }
+    if not counts:
+        return 0
+    course_ids = {course_id for course_id, _ in counts}
+    # Events of deleted courses are dropped.
+    live = set(Course.objects.filter(pk__in=course_ids).values_list('pk', flat=True))
+    existing = {
+        (stats.course_id, stats.day): stats
+        for stats in DailyCourseStats.objects.filter(course_id__in=live, day__in={day for _, day in counts})
+    }
+    updated = []
+    for (course_id, day), total in counts.items():
+        if course_id not in live:
+            continue
+        stats = existing.get((course_id, day)) or DailyCourseStats(course_id=course_id, day=day)
+        setattr(stats, column, getattr(stats, column) + total)
+        updated.append(stats)
+    DailyCourseStats.objects.bulk_create(
+        updated, update_conflicts=True, unique_fields=['course', 'day'], update_fields=[column],
+    )
+    return sum(counts.values())
+
+
+def rebuild():
+    """Drop the rollups and watermarks so the next run recounts everything."""
+    with transaction.atomic():
+        RollupWatermark.objects.all().delete()
+        DailyCourseStats.objects.all().delete()
+
+
+def is_new_download(request, response):
+    """Whether ``response`` starts a download, as opposed to a revalidation
+    or a Range request that resumes or seeks within one."""
+    if request.method != 'GET' or response.status_code not in (200, 206):
+        return False
+    range_header = request.headers.get('Range', '')
+    return not range_header or range_header.replace(' ', '').startswith('bytes=0-')
+
+
+def download_event(user, material):
+    return AccessEvent(
+        kind='download',
+        course_id=material.lesson.course_id,
+        lesson_id=material.lesson_id,
+        material_id=material.pk,
+        user_id=user.pk,
+    )
+
+
+def lesson_view_event(user, lesson):
+    return AccessEvent(kind='lesson_view', course_id=lesson.course_id, lesson_id=lesson.pk, user_id=user.pk)
+
+
+def record_download(user, material):
+    events.record(download_event(user, material))
+
+
+async def arecord_download(user, material):
+    await events.arecord(download_event(user, material))
+
+
+def record_lesson_view(user, lesson):
+    events.record(lesson_view_event(user, lesson))
+
+
+async def arecord_lesson_view(user, lesson):
+    await events.arecord(lesson_view_event(user, lesson))
@@ -0,0 +1,127 @@
+"""Async versions of the read-heavy catalog views.
+
+They are routed instead of their counterparts in ``views.py`` when
+``ASYNC_VIEWS`` is enabled, which is meant for ASGI deployments (gunicorn with
+the uvicorn worker). Database access goes through Django's async ORM, and
+templates are rendered only after every query has run.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import Http404
+from django.shortcuts import aget_object_or_404, redirect, render
+
+from . import analytics, http_cache, markup, page_cache
+from .delivery import serve_file
+from .models import Course, Lesson, Material
+from .pagination import KeysetPaginator
+from .services import CourseService, EnrollmentService, LessonService, MaterialService
+
+# Rendering may still touch the session or a database-backed cache, so it
+# runs in the request's thread rather than on the event loop.
+arender = sync_to_async(render)
+
+
+async def resolve_user(request):
+    # Resolve the user up front so templates never trigger a sync lookup.
+    request.user = await request.auser()
+    return request.user
+
+
+@page_cache.anonymous_page
+@http_cache.catalog_page(http_cache.home_validator)
+async def home(request):
+    user = await resolve_user(request)
+    courses = await CourseService.aget_featured_courses(settings.HOME_FEATURED_COURSES)
+    enrolled = await EnrollmentService.aget_enrolled_course_ids(user)
+    enrolled_ids = {course.pk for course in courses if course.pk in enrolled}
+    return await arender(request, 'courses/home.html', {'courses': courses, 'enrolled_ids': enrolled_ids})
+
+
+@page_cache.anonymous_page
+@http_cache.catalog_page(http_cache.course_list_validator)
+async def course_list(request):
+    user = await resolve_user(request)
+    query = request.GET.get('q', '')
+    if query:
+        courses = await CourseService.asearch_courses(query)
+    else:
+        courses = CourseService.get_published_courses()
+    paginator = KeysetPaginator(courses, settings.COURSES_PER_PAGE)
+    page = await paginator.aget_page(after=request.GET.get('after'), before=request.GET.get('before'))
+    enrolled = await EnrollmentService.aget_enrolled_course_ids(user)
+    return await arender(request, 'courses/course_list.html', {
+        'courses': page.object_list,
+        'page': page,
+        'query': query,
+        'enrolled_ids': {course.pk for course in page.object_list if course.pk in enrolled},
+    })
+
+
+@page_cache.anonymous_page
+@http_cache.catalog_page(http_cache.course_detail_validator)
+async def course_detail(request, slug):
+    user = await resolve_user(request)
+    course = await aget_object_or_404(Course.objects.published().for_detail(), slug=slug)
+    lessons = await LessonService.aget_outline(course.pk)
+    is_enrolled = False
+    if user.is_authenticated:
+        is_enrolled = await EnrollmentService.ais_enrolled(user, course)
+    return await arender(request, 'courses/course_detail.html', {
+        'course': course,
+        'lessons': lessons,
+        'is_enrolled': is_enrolled
+    })
+
+
+async def lesson_detail(request, slug, lesson_id):
+    user = await resolve_user(request)
+    lesson = await aget_object_or_404(
+        Lesson.objects.select_related('course').defer('content'),
+        id=lesson_id, course__slug=slug, course__is_published=True,
+    )
+    course = lesson.course
+
+    if user.is_authenticated:
+        is_author = course.author_id == user.pk
+        if not (is_author or await EnrollmentService.ais_enrolled(user, course)):
+            messages.error(request, 'You must enroll in this course to view lessons.')
+            return redirect('course_detail', slug=slug)
+    else:
+        messages.error(request, 'Please log in to view lessons.')
+        return redirect('login')
+
+    materials = await MaterialService.aget_lesson_materials(lesson)
+    outline = await LessonService.aget_outline(course.pk)
+    previous_lesson, next_lesson = outline.neighbours(lesson.pk)
+    content_html, toc = await markup.alesson_content(lesson)
+    await analytics.arecord_lesson_view(user, lesson)
+    return await arender(request, 'courses/lesson_detail.html', {
+        'course': course,
+        'lesson': lesson,
+        'content_html': content_html,
+        'toc': toc,
+        'materials': materials,
+        'outline': outline,
+        'previous_lesson': previous_lesson,
+        'next_lesson': next_lesson,
+    })
+
+
+@login_required
+async def download_material(request, material_id):
+    user = await resolve_user(request)
+    material = await aget_object_or_404(Material.objects.select_related('lesson__course'), id=material_id)
+    course = material.lesson.course
+
+    is_author = course.author_id == user.pk
+
+    if not (is_author or await EnrollmentService.ais_enrolled(user, course)):
+        raise Http404("You don't have permission to download this material")
+
+    # Looking up the file's size and modification time is blocking I/O.
+    response = await sync_to_async(serve_file)(request, material.file, material.download_filename, asynchronous=True)
+    if analytics.is_new_download(request, response):
+        await analytics.arecord_download(user, material)
+    return response
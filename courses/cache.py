@@ -0,0 +1,223 @@
+"""Helpers around the shared cache used by the courses app."""
+import hashlib
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def cache_is_shared():
+    """Whether every process sees the same cache, so an invalidation made
+    in one reaches them all (``CACHE_SHARED``)."""
+    return getattr(settings, 'CACHE_SHARED', False)
+
+
+class CourseFragmentCache:
+    """Rendered course card fragments, keyed on ``Course.id``, ``updated_at``
+    and the author's username.
+
+    Saving a course changes ``updated_at`` and therefore the key, so stale
+    fragments are never served after an edit; ``invalidate`` additionally
+    drops the current entries for changes that do not touch the course row.
+    """
+
+    PREFIX = 'course_fragment'
+    VARIANTS = ('home', 'course_list', 'author_profile', 'my_courses')
+    STATS_FLUSH_EVERY = 100
+
+    _lock = threading.Lock()
+    _pending = {'hits': 0, 'misses': 0}
+
+    @classmethod
+    def timeout(cls):
+        return getattr(settings, 'COURSE_FRAGMENT_CACHE_TIMEOUT', 3600)
+
+    @classmethod
+    def key(cls, course, variant):
+        version = int(course.updated_at.timestamp() * 1_000_000) if course.updated_at else 0
+        # Cards also show the author's name, which updated_at does not cover.
+        author = hashlib.sha256(course.author.username.encode()).hexdigest()[:12]
+        return f'{cls.PREFIX}:{variant}:{course.pk}:{version}:{author}'
+
+    @classmethod
+    def get(cls, course, variant):
+        html = cache.get(cls.key(course, variant))
+        cls._record('misses' if html is None else 'hits')
+        return html
+
+    @classmethod
+    def set(cls, course, variant, html):
+        cache.set(cls.key(course, variant), html, cls.timeout())
+
+    @classmethod
+    def invalidate(cls, course):
+        cache.delete_many([cls.key(course, variant) for variant in cls.VARIANTS])
+
+    @classmethod
+    def _record(cls, counter):
+        # Counters are batched per process so a page of cards does not cost
+        # one extra cache round trip per card.
+        with cls._lock:
+            cls._pending[counter] += 1
+            if cls._pending['hits'] + cls._pending['misses'] < cls.STATS_FLUSH_EVERY:
+                return
+            pending, cls._pending = cls._pending, {'hits': 0, 'misses': 0}
+        cls._flush(pending)
+
+    @classmethod
+    def _flush(cls, pending):
+        for counter, count in pending.items():
+            if not count:
+                continue
+            key = f'{cls.PREFIX}:stats:{counter}'
+            cache.add(key, 0, None)
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                cache.set(key, count, None)
+
+    @classmethod
+    def stats(cls):
+        """Return shared hit/miss totals across all worker processes."""
+        with cls._lock:
+            pending, cls._pending = cls._pending, {'hits': 0, 'misses': 0}
+        cls._flush(pending)
+        hits = cache.get(f'{cls.PREFIX}:stats:hits', 0)
+        misses = cache.get(f'{cls.PREFIX}:stats:misses', 0)
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+        }
+
+    @classmethod
+    def reset_stats(cls):
+        with cls._lock:
+            cls._pending = {'hits': 0, 'misses': 0}
+        cache.delete_many([f'{cls.PREFIX}:stats:hits', f'{cls.PREFIX}:stats:misses'])
+
+
+class VersionedCache:
+    """A value per owner (a user, a course), stored under the owner's
+    version token.
+
+    ``invalidate`` drops the token, so a reader that loaded the value just
+    before a change can only ever write to the retired key. Subclasses set
+    ``PREFIX`` and ``CONTAINER`` (what the loaded rows are kept as) and
+    define ``timeout()``; a timeout of 0 disables caching.
+    """
+
+    PREFIX = None
+    CONTAINER = tuple
+
+    @classmethod
+    def timeout(cls):
+        raise NotImplementedError
+
+    @classmethod
+    def version_key(cls, owner_id):
+        return f'{cls.PREFIX}:version:{owner_id}'
+
+    @classmethod
+    def key(cls, owner_id, version):
+        return f'{cls.PREFIX}:{owner_id}:{version}'
+
+    @classmethod
+    def version(cls, owner_id):
+        """The owner's current token; it changes whenever the value does."""
+        version_key = cls.version_key(owner_id)
+        version = cache.get(version_key)
+        if version is None:
+            cache.add(version_key, uuid.uuid4().hex, None)
+            version = cache.get(version_key)
+        return version
+
+    @classmethod
+    async def aversion(cls, owner_id):
+        version_key = cls.version_key(owner_id)
+        version = await cache.aget(version_key)
+        if version is None:
+            await cache.aadd(version_key, uuid.uuid4().hex, None)
+            version = await cache.aget(version_key)
+        return version
+
+    @classmethod
+    def get(cls, owner_id, loader):
+        timeout = cls.timeout()
+        if not timeout:
+            return cls.CONTAINER(loader())
+        key = cls.key(owner_id, cls.version(owner_id))
+        value = cache.get(key)
+        if value is None:
+            value = cls.CONTAINER(loader())
+            cache.set(key, value, timeout)
+        return value
+
+    @classmethod
+    async def aget(cls, owner_id, loader):
+        timeout = cls.timeout()
+        if not timeout:
+            return cls.CONTAINER(await loader())
+        key = cls.key(owner_id, await cls.aversion(owner_id))
+        value = await cache.aget(key)
+        if value is None:
+            value = cls.CONTAINER(await loader())
+            await cache.aset(key, value, timeout)
+        return value
+
+    @classmethod
+    def invalidate(cls, *owner_ids):
+        cache.delete_many([cls.version_key(owner_id) for owner_id in owner_ids])
+
+
+class EnrollmentCache(VersionedCache):
+    """The set of course ids each user is enrolled in.
+
+    The set decides access to lessons and materials, so it is only cached
+    when the cache is shared; otherwise every call runs the loader.
+    """
+
+    PREFIX = 'enrollments'
+    CONTAINER = frozenset
+
+    @classmethod
+    def timeout(cls):
+        if not cache_is_shared():
+            return 0
+        return getattr(settings, 'ENROLLMENT_CACHE_TIMEOUT', 24 * 60 * 60)
+
+    @classmethod
+    def get_course_ids(cls, user_id, loader):
+        return cls.get(user_id, loader)
+
+    @classmethod
+    async def aget_course_ids(cls, user_id, loader):
+        return await cls.aget(user_id, loader)
+
+
+class LessonOutlineCache(VersionedCache):
+    """The ``(id, title, order)`` of each course's lessons, in display order.
+
+    Lesson saves and deletes invalidate the course's entry once their
+    transaction commits. That only reaches every process through a shared
+    cache, so a per-process one keeps outlines for
+    ``LESSON_OUTLINE_LOCAL_CACHE_TIMEOUT`` seconds instead.
+    """
+
+    PREFIX = 'lesson_outline'
+
+    @classmethod
+    def timeout(cls):
+        if not cache_is_shared():
+            return getattr(settings, 'LESSON_OUTLINE_LOCAL_CACHE_TIMEOUT', 5)
+        return getattr(settings, 'LESSON_OUTLINE_CACHE_TIMEOUT', 24 * 60 * 60)
+
+    @classmethod
+    def get_entries(cls, course_id, loader):
+        return cls.get(course_id, loader)
+
+    @classmethod
+    async def aget_entries(cls, course_id, loader):
+        return await cls.aget(course_id, loader)
@@ -0,0 +1,300 @@
+"""Export and import of courses with their lessons and materials.
+
+An archive is a directory that can be copied between environments::
+
+    catalog.jsonl                      one JSON record per line
+    files/3f/3fa2...e9.pdf             material files and thumbnails,
+                                       named after their SHA-256
+
+The first record describes the archive. The courses follow in batches,
+each batch followed by the lessons and then the materials of its courses.
+Records refer to each other by the ids of the exporting database; the
+import gives them new ids, and numbered slugs where the exported ones are
+taken (see ``slugs.py``), so an archive can even be imported next to the
+courses it came from.
+
+Both sides stream: the export reads rows with ``.iterator()`` and copies
+files in chunks, the import reads a line at a time and inserts rows with
+``bulk_create``. Only the maps from old to new ids grow with the archive.
+"""
+import hashlib
+import itertools
+import json
+import os
+import posixpath
+import re
+import tempfile
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from . import images, markup, progress, search, slugs
+from .cache import LessonOutlineCache
+from .models import Course, Lesson, Material
+from .storage import READ_SIZE, is_blob_name, material_storage
+
+FORMAT = 'e-learning-catalog'
+VERSION = 1
+CATALOG_NAME = 'catalog.jsonl'
+FILES_DIR = 'files'
+
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class CatalogError(ValueError):
+    pass
+
+
+def archive_name(sha256, extension=''):
+    return posixpath.join(FILES_DIR, sha256[:2], sha256 + extension.lower())
+
+
+def export_catalog(courses, directory, batch_size=500):
+    """Write the courses of the ``courses`` queryset to an archive in
+    ``directory``. Returns the number of records written per type."""
+    os.makedirs(directory, exist_ok=True)
+    totals = Counter()
+    with open(os.path.join(directory, CATALOG_NAME), 'w', encoding='utf-8') as out:
+        def write(record):
+            out.write(json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+            totals[record['type']] += 1
+
+        write({'type': 'archive', 'format': FORMAT, 'version': VERSION, 'exported_at': timezone.now()})
+        rows = courses.select_related('author').order_by('pk').iterator(chunk_size=batch_size)
+        while batch := list(itertools.islice(rows, batch_size)):
+            course_ids = [course.pk for course in batch]
+            for course in batch:
+                write(course_record(course, directory))
+            lessons = Lesson.objects.filter(course_id__in=course_ids).order_by('course_id', 'order', 'created_at', 'pk')
+            for lesson in lessons.iterator(chunk_size=batch_size):
+                write({
+                    'type': 'lesson', 'id': lesson.pk, 'course': lesson.course_id,
+                    'title': lesson.title, 'content': lesson.content, 'order': lesson.order,
+                })
+            materials = Material.objects.filter(lesson__course_id__in=course_ids).order_by('pk')
+            for material in materials.iterator(chunk_size=batch_size):
+                write({
+                    'type': 'material', 'id': material.pk, 'lesson': material.lesson_id,
+                    'title': material.title, 'material_type': material.material_type,
+                    'description': material.description, 'filename': material.download_filename,
+                    **copy_to_archive(material.file, directory),
+                })
+    return totals
+
+
+def course_record(course, directory):
+    record = {
+        'type': 'course', 'id': course.pk, 'slug': course.slug, 'title': course.title,
+        'description': course.description, 'difficulty': course.difficulty,
+        'is_published': course.is_published, 'author': course.author.username,
+        'created_at': course.created_at, 'thumbnail': None,
+    }
+    if course.thumbnail:
+        record['thumbnail'] = {
+            'filename': posixpath.basename(course.thumbnail.name),
+            **copy_to_archive(course.thumbnail, directory),
+        }
+    return record
+
+
+def copy_to_archive(fieldfile, directory):
+    """Copy a stored file into the archive unless its content is already
+    there. Returns the ``file`` and ``sha256`` entries of its record."""
+    name = fieldfile.name
+    extension = posixpath.splitext(name)[1][:16].lower()
+    if is_blob_name(name):
+        # Blob names are their hash: files shared by many materials are
+        # neither read nor copied twice.
+        sha256 = posixpath.basename(name)[:64]
+        if os.path.exists(os.path.join(directory, archive_name(sha256, extension))):
+            return {'file': archive_name(sha256, extension), 'sha256': sha256}
+    if not fieldfile.storage.exists(name):
+        raise CatalogError(f'{name} is missing from storage')
+
+    files_dir = os.path.join(directory, FILES_DIR)
+    os.makedirs(files_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, temporary = tempfile.mkstemp(dir=files_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out, fieldfile.storage.open(name, 'rb') as source:
+            for chunk in source.chunks(READ_SIZE):
+                digest.update(chunk)
+                out.write(chunk)
+        sha256 = digest.hexdigest()
+        target = os.path.join(directory, archive_name(sha256, extension))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(temporary, target)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+        raise
+    return {'file': archive_name(sha256, extension), 'sha256': sha256}
+
+
+def import_catalog(directory, author=None, batch_size=1000):
+    """Import the archive in ``directory`` in one transaction. Every course
+    is given to ``author``, or else to the user with the exported author's
+    username. Returns the number of records imported per type."""
+    path = os.path.join(directory, CATALOG_NAME)
+    if not os.path.exists(path):
+        raise CatalogError(f'{directory} has no {CATALOG_NAME}')
+    importer = CatalogImporter(directory, author, batch_size)
+    with open(path, encoding='utf-8') as lines, transaction.atomic():
+        importer.run(lines)
+    return importer.totals
+
+
+class CatalogImporter:
+    def __init__(self, directory, author=None, batch_size=1000):
+        self.directory = directory
+        self.author = author
+        self.batch_size = batch_size
+        self.authors = {}
+        self.course_ids = {}
+        self.lesson_ids = {}
+        self.thumbnails = []
+        # Courses are new, so their lessons take progress slots from 0.
+        self.progress_slots = Counter()
+        self.totals = Counter()
+        self.courses, self.lessons, self.materials = [], [], []
+
+    def run(self, lines):
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if line_number == 1:
+                    self.check_header(record)
+                    continue
+                self.add(record)
+            except CatalogError as exc:
+                raise CatalogError(f'Line {line_number}: {exc}') from exc
+            except (KeyError, TypeError, ValueError) as exc:
+                raise CatalogError(f'Line {line_number}: invalid record ({exc!r})') from exc
+            if len(self.courses) + len(self.lessons) + len(self.materials) >= self.batch_size:
+                self.flush()
+        self.flush()
+        self.finish()
+
+    def check_header(self, record):
+        if record.get('type') != 'archive' or record.get('format') != FORMAT:
+            raise CatalogError('not a course catalog archive')
+        if record.get('version', 0) > VERSION:
+            raise CatalogError(f'archive version {record["version"]} is newer than {VERSION}')
+
+    def add(self, record):
+        kind = record['type']
+        if kind == 'course':
+            course = Course(
+                title=record['title'],
+                slug=record.get('slug') or slugs.base_for(record['title']),
+                description=record['description'],
+                difficulty=record['difficulty'],
+                is_published=record['is_published'],
+                author=self.author or self.get_author(record['author']),
+            )
+            if record.get('thumbnail'):
+                with open(self.archive_path(record['thumbnail']), 'rb') as handle:
+                    course.thumbnail.save(record['thumbnail']['filename'], File(handle), save=False)
+            self.courses.append((record['id'], course))
+        elif kind == 'lesson':
+            lesson = Lesson(title=record['title'], content=record['content'], order=record['order'])
+            markup.compile_lesson(lesson)
+            self.lessons.append((record['id'], record['course'], lesson))
+        elif kind == 'material':
+            self.archive_path(record)
+            material = Material(
+                title=record['title'],
+                material_type=record['material_type'],
+                description=record['description'],
+                original_filename=record['filename'],
+            )
+            self.materials.append((record['lesson'], record, material))
+        else:
+            raise CatalogError(f'unknown record type {kind!r}')
+
+    def get_author(self, username):
+        if username not in self.authors:
+            author = get_user_model().objects.filter(username=username).first()
+            if author is None:
+                raise CatalogError(f'no user is called {username!r}; choose an author for the import')
+            self.authors[username] = author
+        return self.authors[username]
+
+    def archive_path(self, entry):
+        # Build the path from the hash rather than trusting ``file``, so a
+        # crafted archive cannot point outside its directory.
+        sha256, name = entry['sha256'], entry['file']
+        if not SHA256_RE.match(sha256) or name != archive_name(sha256, posixpath.splitext(name)[1]):
+            raise CatalogError(f'invalid file entry {name!r}')
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            raise CatalogError(f'{name} is missing from the archive')
+        return path
+
+    def flush(self):
+        if self.courses:
+            courses = [course for _, course in self.courses]
+            # The exported slug where it is free here, else a numbered one.
+            for course, slug in zip(courses, slugs.claim([course.slug for course in courses])):
+                course.slug = slug
+            Course.objects.bulk_create(courses)
+            for old_id, course in self.courses:
+                self.course_ids[old_id] = course.pk
+            self.thumbnails.extend(course for course in courses if course.thumbnail)
+            self.totals['course'] += len(courses)
+            self.courses = []
+
+        if self.lessons:
+            for _, course_id, lesson in self.lessons:
+                lesson.course_id = self.resolve(self.course_ids, course_id, 'course')
+                lesson.progress_slot = self.progress_slots[lesson.course_id]
+                self.progress_slots[lesson.course_id] += 1
+            Lesson.objects.bulk_create([lesson for _, _, lesson in self.lessons])
+            for old_id, _, lesson in self.lessons:
+                self.lesson_ids[old_id] = lesson.pk
+            self.totals['lesson'] += len(self.lessons)
+            self.lessons = []
+
+        if self.materials:
+            # One StoredBlob update per distinct file rather than per material.
+            references = Counter((record['sha256'], record['file']) for _, record, _ in self.materials)
+            names = {}
+            for (sha256, name), count in references.items():
+                path = os.path.join(self.directory, name)
+                names[sha256, name] = material_storage.add_file(path, sha256, posixpath.splitext(name)[1], count)
+            for lesson_id, record, material in self.materials:
+                material.lesson_id = self.resolve(self.lesson_ids, lesson_id, 'lesson')
+                material.file.name = names[record['sha256'], record['file']]
+            Material.objects.bulk_create([material for _, _, material in self.materials])
+            self.totals['material'] += len(self.materials)
+            self.materials = []
+
+    def resolve(self, ids, old_id, kind):
+        if old_id not in ids:
+            raise CatalogError(f'a record refers to {kind} {old_id}, which comes later or not at all')
+        return ids[old_id]
+
+    def finish(self):
+        # bulk_create skips save() and its signals: fill in the counters,
+        # the progress slot counters, the search index, the lesson outlines,
+        # the cached catalog pages and the thumbnail derivatives here.
+        from . import http_cache, page_cache
+        from .services import CourseService
+
+        course_ids = sorted(self.course_ids.values())
+        backend = search.get_backend()
+        for start in range(0, len(course_ids), 500):
+            batch = Course.objects.filter(pk__in=course_ids[start:start + 500])
+            CourseService.reconcile_counters(batch)
+            progress.reserve_existing(batch)
+            backend.index_courses(batch.prefetch_related('lessons'))
+        transaction.on_commit(lambda: LessonOutlineCache.invalidate(*course_ids))
+        transaction.on_commit(lambda: page_cache.purge(http_cache.CATALOG_KEY))
+        for course in self.thumbnails:
+            images.schedule(course, 'thumbnail')
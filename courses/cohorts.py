@@ -0,0 +1,51 @@
+"""CSV files of cohorts for ``EnrollmentService.bulk_enroll``.
+
+A cohort file has a header row with a ``username`` column and a ``course``
+column holding the course slug::
+
+    username,course
+    alice,python-programming-for-beginners
+    bob,python-programming-for-beginners
+
+When the courses are chosen elsewhere (the admin action, ``--course``) the
+``course`` column is not needed and every user is enrolled in each of them.
+Files are read row by row, so their size does not matter.
+"""
+import csv
+from collections import Counter, namedtuple
+
+STATUSES = ('enrolled', 'already_enrolled', 'duplicate', 'unknown_user', 'unknown_course', 'invalid')
+
+RowResult = namedtuple('RowResult', 'line username course status')
+
+
+class CohortFileError(ValueError):
+    pass
+
+
+def read_csv(stream, courses=None):
+    """Yield ``(line, username, course_slug)`` from a text stream."""
+    reader = csv.DictReader(stream)
+    fields = reader.fieldnames or []
+    required = ['username'] if courses else ['username', 'course']
+    missing = [field for field in required if field not in fields]
+    if missing:
+        raise CohortFileError(f'The CSV header has no {" or ".join(missing)} column.')
+    for row in reader:
+        username = (row.get('username') or '').strip()
+        if courses:
+            for slug in courses:
+                yield reader.line_num, username, slug
+        else:
+            yield reader.line_num, username, (row.get('course') or '').strip()
+
+
+def summarize(results, on_result=None):
+    """Consume ``results``, calling ``on_result`` for each, and return the
+    number of rows per status."""
+    totals = Counter(dict.fromkeys(STATUSES, 0))
+    for result in results:
+        totals[result.status] += 1
+        if on_result is not None:
+            on_result(result)
+    return totals
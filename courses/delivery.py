@@ -0,0 +1,162 @@
+"""File delivery for protected course materials.
+
+``serve_file`` runs after the caller's permission check. It answers
+conditional requests (``If-None-Match``/``If-Modified-Since``) with 304 and
+single byte ranges with 206, so clients can seek in videos and resume
+interrupted downloads.
+
+When ``MATERIAL_DELIVERY_MODE`` is ``"x-accel-redirect"`` (nginx) or
+``"x-sendfile"`` (Apache, lighttpd) the transfer itself is handed off to the
+front proxy and the worker is released as soon as the headers are built.
+"""
+import mimetypes
+import re
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+MODE_PYTHON = 'python'
+MODE_X_ACCEL = 'x-accel-redirect'
+MODE_X_SENDFILE = 'x-sendfile'
+
+
+def get_mode():
+    return getattr(settings, 'MATERIAL_DELIVERY_MODE', MODE_PYTHON)
+
+
+def file_validators(fieldfile):
+    """Return ``(size, etag, last_modified)`` without opening the file."""
+    storage = fieldfile.storage
+    try:
+        size = storage.size(fieldfile.name)
+        modified = storage.get_modified_time(fieldfile.name)
+    except (FileNotFoundError, NotImplementedError):
+        raise Http404('File not found')
+    last_modified = int(modified.timestamp())
+    etag = f'"{size:x}-{int(modified.timestamp() * 1_000_000):x}"'
+    return size, etag, last_modified
+
+
+def not_modified(request, etag, last_modified):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+def parse_range(request, size, etag, last_modified):
+    """Return ``(start, end)`` for a satisfiable single range, ``None`` for the
+    whole file, or ``False`` if the range cannot be satisfied."""
+    header = request.headers.get('Range')
+    if not header or request.method not in ('GET', 'HEAD'):
+        return None
+
+    if_range = request.headers.get('If-Range')
+    if if_range:
+        if if_range.startswith('"') or if_range.startswith('W/'):
+            if if_range != etag:
+                return None
+        elif parse_http_date_safe(if_range) != last_modified:
+            return None
+
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        # Multiple ranges or malformed headers: serve the whole file.
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def ranged_iterator(fieldfile, start, length):
+    with fieldfile.storage.open(fieldfile.name, 'rb') as handle:
+        handle.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = handle.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def aranged_iterator(fieldfile, start, length):
+    # File reads run in a thread pool so the event loop keeps serving other
+    # clients while a slow one drains a large video.
+    handle = await sync_to_async(fieldfile.storage.open, thread_sensitive=False)(fieldfile.name, 'rb')
+    try:
+        await sync_to_async(handle.seek, thread_sensitive=False)(start)
+        remaining = length
+        while remaining > 0:
+            chunk = await sync_to_async(handle.read, thread_sensitive=False)(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await sync_to_async(handle.close, thread_sensitive=False)()
+
+
+def offload_response(fieldfile, mode):
+    response = HttpResponse()
+    if mode == MODE_X_ACCEL:
+        prefix = getattr(settings, 'MATERIAL_X_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix + quote(fieldfile.name)
+    else:
+        response['X-Sendfile'] = fieldfile.path
+    # Let the proxy fill in the real content type and length.
+    del response['Content-Type']
+    return response
+
+
+def serve_file(request, fieldfile, filename, as_attachment=True, asynchronous=False):
+    """Build the download response. Pass ``asynchronous=True`` from async
+    views so the body is an async iterator that ASGI servers can stream."""
+    size, etag, last_modified = file_validators(fieldfile)
+    mode = get_mode()
+
+    if not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+    elif mode in (MODE_X_ACCEL, MODE_X_SENDFILE):
+        # The proxy handles Range and If-Range itself.
+        response = offload_response(fieldfile, mode)
+    else:
+        byte_range = parse_range(request, size, etag, last_modified)
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        elif byte_range is None and not asynchronous:
+            response = FileResponse(fieldfile.storage.open(fieldfile.name, 'rb'), content_type=content_type)
+        else:
+            start, end = byte_range or (0, size - 1)
+            length = end - start + 1
+            iterator = (aranged_iterator if asynchronous else ranged_iterator)(fieldfile, start, length)
+            response = StreamingHttpResponse(iterator, content_type=content_type)
+            if byte_range:
+                response.status_code = 206
+                response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(length)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    if response.status_code in (200, 206):
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    return response
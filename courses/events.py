@@ -0,0 +1,131 @@
+"""Buffered writes of ``AccessEvent`` rows (lesson views and downloads).
+
+Recording an event only appends it to a per-process buffer. The buffer is
+written with one ``bulk_create`` when it holds ``ACCESS_EVENT_BUFFER_SIZE``
+events, when the oldest one is ``ACCESS_EVENT_FLUSH_INTERVAL`` seconds old
+(checked whenever a request finishes), and when the process exits (``atexit``
+and gunicorn's ``worker_exit`` hook). A worker killed with SIGKILL loses at
+most one buffer of events.
+
+Events keep the time they happened, not the time they were written. Rows
+get their ids when they are flushed, and flushes take a lock so their ids
+commit in order; rollups count by id (see ``analytics.py``), so a row that
+commits after a higher id was counted would be skipped for good.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import connection, transaction
+
+from .models import AccessEvent
+
+logger = logging.getLogger(__name__)
+
+
+# Key of the PostgreSQL advisory lock held while a flush inserts its rows.
+FLUSH_LOCK_ID = 0x61636365
+
+
+def get_buffer_size():
+    return getattr(settings, 'ACCESS_EVENT_BUFFER_SIZE', 200)
+
+
+def get_flush_interval():
+    return getattr(settings, 'ACCESS_EVENT_FLUSH_INTERVAL', 10)
+
+
+class EventBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = []
+        self._oldest = None
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, event):
+        """Buffer ``event``; returns True if the buffer is due to be flushed."""
+        with self._lock:
+            if not self._events:
+                self._oldest = time.monotonic()
+            self._events.append(event)
+        return self.is_due()
+
+    def is_due(self):
+        if not self._events:
+            return False
+        return len(self._events) >= get_buffer_size() or time.monotonic() - self._oldest >= get_flush_interval()
+
+    def take(self):
+        with self._lock:
+            events, self._events, self._oldest = self._events, [], None
+        return events
+
+    def reset(self):
+        """Discard the buffered events without writing them (for tests)."""
+        self.take()
+
+    def flush(self):
+        """Write every buffered event. Returns the number written."""
+        events = self.take()
+        if not events:
+            return 0
+        try:
+            with transaction.atomic():
+                lock_inserts()
+                AccessEvent.objects.bulk_create(events, batch_size=1000)
+        except Exception:
+            # Analytics must never break a request; drop the batch.
+            logger.exception('Dropped %s access events', len(events))
+            return 0
+        return len(events)
+
+    def flush_if_due(self):
+        return self.flush() if self.is_due() else 0
+
+
+def lock_inserts():
+    # PostgreSQL hands out ids as rows are inserted but shows them only when
+    # the transaction commits. One flush at a time keeps both in the same
+    # order. SQLite already lets only one transaction write at a time.
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [FLUSH_LOCK_ID])
+
+
+buffer = EventBuffer()
+
+
+def record(event):
+    if buffer.add(event):
+        buffer.flush()
+
+
+async def arecord(event):
+    if buffer.add(event):
+        await sync_to_async(buffer.flush)()
+
+
+def flush():
+    return buffer.flush()
+
+
+def flush_when_due(**kwargs):
+    # request_finished fires after the response has been sent, so a flush
+    # here does not delay it. Django's close_old_connections() has already
+    # run by then, so a connection opened for the flush is closed here.
+    if not buffer.is_due():
+        return
+    was_closed = connection.connection is None
+    buffer.flush()
+    if was_closed:
+        connection.close()
+
+
+request_finished.connect(flush_when_due, dispatch_uid='courses.events.flush_when_due')
+atexit.register(flush)
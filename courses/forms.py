@@ -1,4 +1,5 @@
 from django import forms
+from .cache import CourseFragmentCache
 from .models import Course, Lesson, Material
 
 class CourseForm(forms.ModelForm):
@@ -9,6 +10,11 @@ class CourseForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'rows': 5}),
         }
 
+    def save(self, commit=True):
+        if self.instance.pk:
+            CourseFragmentCache.invalidate(self.instance)
+        return super().save(commit)
+
 class LessonForm(forms.ModelForm):
     class Meta:
         model = Lesson
@@ -24,3 +30,19 @@ class MaterialForm(forms.ModelForm):
         widgets = {
             'description': forms.Textarea(attrs={'rows': 3}),
         }
+
+class ChunkedUploadForm(forms.Form):
+    """Metadata sent to start a chunked material upload."""
+    title = forms.CharField(max_length=200)
+    material_type = forms.ChoiceField(choices=Material.MATERIAL_TYPES, initial='document')
+    description = forms.CharField(required=False)
+    filename = forms.CharField(max_length=255)
+    size = forms.IntegerField(min_value=0)
+    sha256 = forms.RegexField(regex=r'^[0-9a-fA-F]{64}$', required=False)
+
+    def clean_filename(self):
+        # Keep only the base name; the storage decides the directory.
+        name = self.cleaned_data['filename'].replace('\\', '/').rsplit('/', 1)[-1]
+        if not name or name in ('.', '..'):
+            raise forms.ValidationError('Invalid file name.')
+        return name
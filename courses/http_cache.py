@@ -0,0 +1,203 @@
+"""HTTP caching policy for the public catalog pages.
+
+``catalog_page(validator)`` wraps ``home``, ``course_list``,
+``course_detail`` and ``author_profile`` (sync or async). The validator
+gets the view's arguments and returns a ``Validator`` computed from the few
+columns the page depends on: ``updated_at``, the counters and the author
+names of the courses shown (and the author, on a profile), read with one
+or two indexed queries. When the
+request's ``If-None-Match`` still matches, the response is a 304 and the
+view never runs: no other query and no template.
+
+- Anonymous responses are ``public`` with ``max-age=CATALOG_MAX_AGE`` and
+  ``s-maxage=CATALOG_SHARED_MAX_AGE``, so a CDN in front of gunicorn can
+  serve them, and ``Vary: Cookie`` keeps logged-in pages out of its cache.
+- Authenticated responses are ``private, no-cache``. Their ETag also covers
+  the user, the ids of the courses they are enrolled in, which the
+  navigation and the "Enrolled" badges show, and the CSRF secret that the
+  page's forms carry.
+- Pages that show flash messages are rendered normally and kept private.
+
+``Last-Modified`` is the newest ``updated_at`` shown, but 304s are only
+answered from the ETag: a course that leaves a page does not make it newer.
+
+With ``CATALOG_SURROGATE_KEY_HEADER`` set (``Surrogate-Key`` for Fastly,
+``Cache-Tag`` for Cloudflare) anonymous responses list keys such as
+``course-12`` and ``author-3``; purge ``course_keys(course)`` when a course
+changes to drop every cached page that shows it. ``page_cache.py`` stores
+these pages for anonymous visitors under the same keys.
+"""
+import hashlib
+from collections import namedtuple
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.messages import get_messages
+from django.db.models import Count, Q
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .models import Course
+from .pagination import KeysetPaginator
+from .services import CourseService, EnrollmentService
+
+CATALOG_KEY = 'catalog'
+# What a course card or the course page shows besides what updated_at covers.
+COURSE_FIELDS = ('pk', 'updated_at', 'lesson_count', 'enrollment_count', 'thumbnail_derivatives', 'author__username')
+AUTHOR_FIELDS = (
+    'pk', 'username', 'first_name', 'last_name', 'role', 'bio', 'profile_picture', 'profile_picture_derivatives',
+)
+
+Validator = namedtuple('Validator', 'etag last_modified keys')
+
+
+def course_key(course_id):
+    return f'course-{course_id}'
+
+
+def author_key(author_id):
+    return f'author-{author_id}'
+
+
+def course_keys(course):
+    """The surrogate keys of every page that shows ``course``."""
+    return [CATALOG_KEY, course_key(course.pk), author_key(course.author_id)]
+
+
+def for_courses(rows, *extra, keys=()):
+    """A ``Validator`` for a page showing ``rows`` of ``COURSE_FIELDS``
+    and whatever else is in ``extra``."""
+    rows = list(rows)
+    return Validator(
+        digest(repr((rows, extra))),
+        max((row[1] for row in rows), default=None),
+        [*keys, *(course_key(row[0]) for row in rows)],
+    )
+
+
+def digest(text):
+    return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+
+def home_validator(request):
+    rows = CourseService.get_published_courses()[:settings.HOME_FEATURED_COURSES]
+    return for_courses(rows.values_list(*COURSE_FIELDS), keys=[CATALOG_KEY])
+
+
+def course_list_validator(request):
+    if request.GET.get('q'):
+        # Searching twice would cost more than rendering.
+        return None
+    paginator = KeysetPaginator(CourseService.get_published_courses(), settings.COURSES_PER_PAGE)
+    rows = paginator.page_values(*COURSE_FIELDS, after=request.GET.get('after'), before=request.GET.get('before'))
+    return for_courses(rows, keys=[CATALOG_KEY])
+
+
+def course_detail_validator(request, slug):
+    rows = list(Course.objects.published().filter(slug=slug).values_list(*COURSE_FIELDS))
+    # Leave a missing course to the view's 404.
+    return for_courses(rows) if rows else None
+
+
+def author_values(username):
+    """The author's ``AUTHOR_FIELDS`` and number of published courses."""
+    published = Count('courses', filter=Q(courses__is_published=True))
+    authors = get_user_model().objects.filter(username=username).annotate(published=published)
+    return authors.values_list(*AUTHOR_FIELDS, 'published')
+
+
+def author_profile_validator(request, username):
+    author = author_values(username).first()
+    if author is None:
+        return None
+    courses = Course.objects.filter(author_id=author[0]).published().for_listing()
+    paginator = KeysetPaginator(courses, settings.COURSES_PER_PAGE)
+    rows = paginator.page_values(*COURSE_FIELDS, after=request.GET.get('after'), before=request.GET.get('before'))
+    return for_courses(rows, author, keys=[author_key(author[0])])
+
+
+def user_variant(request):
+    user = request.user
+    if not user.is_authenticated:
+        return 'anonymous'
+    # From the enrolled ids themselves, which the view reuses: a cache token
+    # could differ between workers.
+    enrolled = sorted(EnrollmentService.get_enrolled_course_ids(user))
+    # The pages hold forms with the CSRF token, which login rotates; a page
+    # kept from before it would fail its POST.
+    get_token(request)
+    csrf_secret = request.META['CSRF_COOKIE']
+    return f'{user.pk}:{user.username}:{user.role}:{digest(repr(enrolled))}:{csrf_secret}'
+
+
+class Policy:
+    def __init__(self, request, validator, shared=True):
+        self.request = request
+        self.public = shared and not request.user.is_authenticated
+        self.validator = validator
+        self.etag = None
+        if validator is not None:
+            self.etag = quote_etag(digest(f'{validator.etag}:{user_variant(request)}'))
+
+    def conditional_response(self):
+        if self.etag is None:
+            return None
+        return get_conditional_response(self.request, etag=self.etag)
+
+    def apply(self, response):
+        if response.status_code not in (200, 304):
+            return response
+        if self.etag:
+            response.headers.setdefault('ETag', self.etag)
+            if response.status_code == 200 and self.validator.last_modified:
+                response.headers.setdefault('Last-Modified', http_date(self.validator.last_modified.timestamp()))
+        # A response that sets a cookie (a CSRF token, say) is never shared.
+        sets_cookie = response.cookies or self.request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        if self.public and not sets_cookie:
+            patch_cache_control(
+                response, public=True, max_age=settings.CATALOG_MAX_AGE, s_maxage=settings.CATALOG_SHARED_MAX_AGE,
+            )
+            # Kept on the response for the page cache (page_cache.py).
+            response.surrogate_keys = list(dict.fromkeys(self.validator.keys)) if self.validator else []
+            header = settings.CATALOG_SURROGATE_KEY_HEADER
+            if header and response.surrogate_keys:
+                response.headers[header] = ' '.join(response.surrogate_keys)
+        else:
+            patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Cookie'])
+        return response
+
+
+def catalog_page(validator):
+    """Apply the catalog caching policy to a view, using ``validator`` for
+    its ETag; see the module docstring."""
+    def prepare(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None, None
+        if len(get_messages(request)):
+            # Messages are shown once, so the page is neither reused nor shared.
+            return None, Policy(request, None, shared=False)
+        policy = Policy(request, validator(request, *args, **kwargs))
+        return policy.conditional_response(), policy
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                # The validator, the session and the user are sync lookups.
+                response, policy = await sync_to_async(prepare)(request, *args, **kwargs)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return policy.apply(response) if policy else response
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                response, policy = prepare(request, *args, **kwargs)
+                if response is None:
+                    response = view(request, *args, **kwargs)
+                return policy.apply(response) if policy else response
+        return wrapper
+    return decorator
@@ -0,0 +1,145 @@
+"""Resized, re-encoded derivatives of uploaded images.
+
+Course thumbnails and profile pictures are rendered at each width in
+``IMAGE_DERIVATIVE_WIDTHS`` as JPEG and WebP, stored under
+``derivatives/`` with a content hash in the name so they can be cached
+forever. The model keeps a manifest of them in ``<field>_derivatives``::
+
+    {"source": "course_thumbnails/photo.jpg", "width": 3000, "height": 2000,
+     "jpeg": [[160, 107, "derivatives/course_thumbnails/photo-160w-1a2b3c4d5e6f.jpg"], ...],
+     "webp": [[160, 107, "derivatives/course_thumbnails/photo-160w-6f5e4d3c2b1a.webp"], ...]}
+
+Derivatives are generated by a background job (see ``jobs.py``) queued when
+the upload is saved. A manifest whose ``source`` differs from the field is
+stale and the templates fall back to the original file until it is rebuilt.
+"""
+import hashlib
+import io
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 75, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 80, 'optimize': True, 'progressive': True},
+}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+# Width of the plain ``src`` fallback for browsers without srcset support.
+DEFAULT_WIDTH = 640
+
+
+def get_widths():
+    return getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', (160, 320, 640, 1280))
+
+
+def manifest_field(field_name):
+    return f'{field_name}_derivatives'
+
+
+def is_current(fieldfile):
+    """Whether the manifest stored next to ``fieldfile`` was built from it."""
+    manifest = getattr(fieldfile.instance, manifest_field(fieldfile.field.name)) or {}
+    return bool(fieldfile) and manifest.get('source') == fieldfile.name
+
+
+def encode(image, fmt):
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, **FORMATS[fmt])
+    return buffer.getvalue()
+
+
+def render_derivatives(fieldfile):
+    """Write every derivative of ``fieldfile`` and return its manifest."""
+    storage = fieldfile.storage
+    with storage.open(fieldfile.name, 'rb') as handle:
+        source = Image.open(handle)
+        source = ImageOps.exif_transpose(source)
+        source.load()
+    if source.mode not in ('RGB', 'RGBA'):
+        source = source.convert('RGBA' if 'transparency' in source.info or 'A' in source.getbands() else 'RGB')
+
+    directory, filename = posixpath.split(fieldfile.name)
+    stem = posixpath.splitext(filename)[0]
+    manifest = {'source': fieldfile.name, 'width': source.width, 'height': source.height}
+    # Never upscale: widths above the original collapse into the original width.
+    widths = sorted({min(width, source.width) for width in get_widths()})
+    for fmt in FORMATS:
+        manifest[fmt] = []
+    for width in widths:
+        height = max(1, round(source.height * width / source.width))
+        resized = source if width == source.width else source.resize((width, height), Image.Resampling.LANCZOS)
+        for fmt in FORMATS:
+            data = encode(resized, fmt)
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            name = posixpath.join('derivatives', directory, f'{stem}-{width}w-{digest}.{EXTENSIONS[fmt]}')
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(data))
+            manifest[fmt].append([width, height, name])
+    return manifest
+
+
+def derivative_names(manifest):
+    return {name for fmt in FORMATS for _, _, name in (manifest or {}).get(fmt, [])}
+
+
+def generate(model, pk, field_name, force=False):
+    """Bring the derivatives of ``model(pk).<field_name>`` up to date.
+
+    Returns True if the manifest was rewritten.
+    """
+    instance = model._default_manager.filter(pk=pk).first()
+    if instance is None:
+        return False
+    fieldfile = getattr(instance, field_name)
+    manifest_name = manifest_field(field_name)
+    old = getattr(instance, manifest_name) or {}
+    if not force and (is_current(fieldfile) or (not fieldfile and not old)):
+        return False
+
+    new = render_derivatives(fieldfile) if fieldfile else {}
+    # Only store the manifest if the image was not replaced in the meantime.
+    if fieldfile:
+        unchanged = Q(**{field_name: fieldfile.name})
+    else:
+        unchanged = Q(**{field_name: ''}) | Q(**{f'{field_name}__isnull': True})
+    updated = model._default_manager.filter(unchanged, pk=pk).update(**{manifest_name: new})
+    stale = derivative_names(old if updated else new) - derivative_names(new if updated else old)
+    for name in stale:
+        fieldfile.storage.delete(name)
+    if updated:
+        setattr(instance, manifest_name, new)
+        on_manifest_changed(instance)
+    return bool(updated)
+
+
+def on_manifest_changed(instance):
+    from django.utils import timezone
+    from . import http_cache, page_cache
+    from .models import Course
+
+    if isinstance(instance, Course):
+        # This runs in a job worker, whose cache may be its own. The course
+        # card keys and the ETags go by updated_at, which every process reads
+        # from the database; update() leaves it alone, so bump it here.
+        Course.objects.filter(pk=instance.pk).update(updated_at=timezone.now())
+        page_cache.purge(*http_cache.course_keys(instance))
+
+
+def schedule(instance, field_name):
+    """Queue derivative generation for ``instance`` on the job queue."""
+    from .tasks import generate_image_derivatives
+
+    generate_image_derivatives.enqueue(model=instance._meta.label, pk=instance.pk, field_name=field_name)
+
+
+def needs_update(instance, field_name):
+    fieldfile = getattr(instance, field_name)
+    manifest = getattr(instance, manifest_field(field_name)) or {}
+    return manifest.get('source', '') != (fieldfile.name or '')
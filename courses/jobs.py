@@ -0,0 +1,159 @@
+"""Database-backed background jobs.
+
+Slow side effects (deleting files from storage, image processing) are
+queued as ``Job`` rows and run by ``manage.py run_worker`` processes, so no
+message broker is needed. Register a function with ``@task`` and queue it
+with ``.enqueue(**payload)``::
+
+    @task(max_attempts=3)
+    def delete_files(names):
+        ...
+
+    delete_files.enqueue(names=['course_materials/a.pdf'])
+
+The job row is written in the caller's transaction, so a job only becomes
+visible to workers if that transaction commits. Workers claim a job with a
+conditional UPDATE, so any number of them can poll the same table. A failed
+job is retried with exponential backoff until ``max_attempts`` is reached,
+then kept with status ``failed`` for inspection. Jobs whose worker died are
+picked up again after ``JOB_LOCK_TIMEOUT`` seconds, so tasks must be safe
+to run twice.
+
+With ``JOBS_EAGER`` on, jobs run in-process as soon as the transaction
+commits instead (useful for tests and a development server without a
+worker).
+"""
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class Task:
+    def __init__(self, func, name, max_attempts, retry_delay):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+    def __call__(self, **payload):
+        return self.func(**payload)
+
+    def enqueue(self, delay=0, **payload):
+        return enqueue(self.name, payload, delay=delay)
+
+
+def task(name=None, max_attempts=5, retry_delay=30):
+    """Register a function as a background task. Its arguments must be
+    JSON-serializable keyword arguments."""
+    def decorator(func):
+        registered = Task(func, name or f'{func.__module__}.{func.__name__}', max_attempts, retry_delay)
+        _registry[registered.name] = registered
+        return registered
+    return decorator
+
+
+def get_task(name):
+    return _registry[name]
+
+
+def is_eager():
+    return getattr(settings, 'JOBS_EAGER', False)
+
+
+def get_lock_timeout():
+    return getattr(settings, 'JOB_LOCK_TIMEOUT', 10 * 60)
+
+
+def enqueue(name, payload, delay=0):
+    registered = get_task(name)
+    if is_eager():
+        transaction.on_commit(lambda: registered(**payload))
+        return None
+    return Job.objects.create(
+        name=name,
+        payload=payload,
+        max_attempts=registered.max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def claimable(now):
+    stale = now - timedelta(seconds=get_lock_timeout())
+    return Job.objects.filter(
+        Q(status='queued', run_at__lte=now) | Q(status='running', locked_at__lt=stale)
+    )
+
+
+def claim(worker_id):
+    """Atomically take the next due job, or return None if there is none."""
+    while True:
+        now = timezone.now()
+        candidate = claimable(now).order_by('run_at', 'id').values_list('pk', 'status', 'locked_at').first()
+        if candidate is None:
+            return None
+        pk, status, locked_at = candidate
+        # Compare-and-swap: only one worker's UPDATE matches the old state.
+        claimed = Job.objects.filter(pk=pk, status=status, locked_at=locked_at).update(
+            status='running', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome. Returns True on success."""
+    try:
+        registered = get_task(job.name)
+        registered(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Job %s (%s) failed on attempt %s', job.pk, job.name, job.attempts)
+        owned = Job.objects.filter(pk=job.pk, locked_by=job.locked_by)
+        if job.attempts >= job.max_attempts or job.name not in _registry:
+            owned.update(status='failed', last_error=error, locked_at=None)
+        else:
+            retry_delay = _registry[job.name].retry_delay * 2 ** (job.attempts - 1)
+            owned.update(
+                status='queued', last_error=error, locked_at=None,
+                run_at=timezone.now() + timedelta(seconds=retry_delay),
+            )
+        return False
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).delete()
+    return True
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def work(worker_id=None, burst=False, idle_sleep=1.0, should_stop=lambda: False):
+    """Run jobs until ``should_stop()`` returns True, or until the queue is
+    empty when ``burst`` is set. Returns the number of jobs processed."""
+    worker_id = worker_id or default_worker_id()
+    processed = 0
+    while not should_stop():
+        close_old_connections()
+        job = claim(worker_id)
+        if job is None:
+            if burst:
+                break
+            time.sleep(idle_sleep)
+            continue
+        run_job(job)
+        processed += 1
+    close_old_connections()
+    return processed
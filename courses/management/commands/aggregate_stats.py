@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from courses import analytics
+
+
+class Command(BaseCommand):
+    help = 'Adds enrollments and downloads since the last run to the daily course rollups; run it periodically'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lag-minutes', type=float, default=analytics.DEFAULT_LAG.total_seconds() / 60,
+            help='Leave rows younger than this for the next run (default: 5)',
+        )
+        parser.add_argument('--batch-size', type=int, default=50000, help='Source row ids per transaction')
+        parser.add_argument('--rebuild', action='store_true', help='Drop the rollups and recount every row')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            analytics.rebuild()
+        counted = analytics.aggregate(timedelta(minutes=options['lag_minutes']), options['batch_size'])
+        summary = ', '.join(f'{count} {column}' for column, count in counted.items())
+        self.stdout.write(self.style.SUCCESS(f'Aggregated {summary}'))
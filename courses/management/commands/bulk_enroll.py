@@ -0,0 +1,46 @@
+import csv
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from courses.cohorts import CohortFileError, read_csv, summarize
+from courses.services import EnrollmentService
+
+
+class Command(BaseCommand):
+    help = 'Enrolls a cohort from a CSV file with username and course (slug) columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='Path to the CSV file, or - for standard input')
+        parser.add_argument(
+            '--course', action='append', dest='courses', metavar='SLUG',
+            help='Enroll every user in this course instead of reading a course column (repeatable)',
+        )
+        parser.add_argument('--report', help='Write the result of every row to this CSV file')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per batch (default: 5000)')
+
+    def handle(self, *args, **options):
+        source = sys.stdin if options['csv_file'] == '-' else open(options['csv_file'], newline='', encoding='utf-8-sig')
+        report = open(options['report'], 'w', newline='', encoding='utf-8') if options['report'] else None
+        started = time.monotonic()
+        try:
+            writer = None
+            if report:
+                writer = csv.writer(report)
+                writer.writerow(['line', 'username', 'course', 'status'])
+            results = EnrollmentService.bulk_enroll(read_csv(source, options['courses']), options['batch_size'])
+            totals = summarize(results, writer.writerow if writer else None)
+        except CohortFileError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if report:
+                report.close()
+
+        elapsed = time.monotonic() - started
+        rows = sum(totals.values())
+        self.stdout.write(', '.join(f'{status}: {count}' for status, count in totals.items()))
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)'
+        ))
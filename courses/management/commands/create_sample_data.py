@@ -1,96 +1,43 @@
-from django.core.management.base import BaseCommand
+import itertools
+import random
+
 from django.contrib.auth import get_user_model
-from courses.models import Course, Lesson, Material
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from courses import http_cache, markup, page_cache, progress, slugs
+from courses.cache import EnrollmentCache, LessonOutlineCache
+from courses.models import Course, Enrollment, Lesson
+from courses.search import get_backend
+from courses.services import CourseService
 
 User = get_user_model()
 
-class Command(BaseCommand):
-    help = 'Creates sample data for testing the e-learning platform'
+DEMO_USERS = [
+    ('admin', 'admin123', {
+        'email': 'admin@example.com', 'role': 'admin', 'is_staff': True, 'is_superuser': True,
+    }),
+    ('john_doe', 'author123', {
+        'email': 'john@example.com', 'role': 'author', 'first_name': 'John', 'last_name': 'Doe',
+        'bio': 'Experienced software developer and educator with 10+ years of experience.',
+    }),
+    ('jane_smith', 'author123', {
+        'email': 'jane@example.com', 'role': 'author', 'first_name': 'Jane', 'last_name': 'Smith',
+        'bio': 'Data science expert passionate about teaching machine learning.',
+    }),
+    ('student', 'student123', {
+        'email': 'student@example.com', 'role': 'student', 'first_name': 'Test', 'last_name': 'Student',
+    }),
+]
 
-    def handle(self, *args, **kwargs):
-        self.stdout.write(self.style.SUCCESS('Creating sample data...'))
-
-        # Create sample users
-        admin_user = User.objects.create_superuser(
-            username='admin',
-            email='admin@example.com',
-            password='admin123',
-            role='admin'
-        )
-        self.stdout.write(self.style.SUCCESS(f'Created admin user: admin/admin123'))
-
-        author1 = User.objects.create_user(
-            username='john_doe',
-            email='john@example.com',
-            password='author123',
-            role='author',
-            first_name='John',
-            last_name='Doe',
-            bio='Experienced software developer and educator with 10+ years of experience.'
-        )
-        self.stdout.write(self.style.SUCCESS(f'Created author: john_doe/author123'))
-
-        author2 = User.objects.create_user(
-            username='jane_smith',
-            email='jane@example.com',
-            password='author123',
-            role='author',
-            first_name='Jane',
-            last_name='Smith',
-            bio='Data science expert passionate about teaching machine learning.'
-        )
-        self.stdout.write(self.style.SUCCESS(f'Created author: jane_smith/author123'))
-
-        student = User.objects.create_user(
-            username='student',
-            email='student@example.com',
-            password='student123',
-            role='student',
-            first_name='Test',
-            last_name='Student'
-        )
-        self.stdout.write(self.style.SUCCESS(f'Created student: student/student123'))
-
-        # Create sample courses
-        course1 = Course.objects.create(
-            title='Python Programming for Beginners',
-            description='Learn Python programming from scratch. This comprehensive course covers all the basics of Python, including variables, data types, control structures, functions, and object-oriented programming.',
-            author=author1,
-            difficulty='beginner',
-            is_published=True
-        )
-        
-        course2 = Course.objects.create(
-            title='Advanced Django Web Development',
-            description='Master Django framework and build production-ready web applications. Learn about models, views, templates, authentication, REST APIs, and deployment.',
-            author=author1,
-            difficulty='advanced',
-            is_published=True
-        )
-        
-        course3 = Course.objects.create(
-            title='Introduction to Machine Learning',
-            description='Dive into the world of machine learning. Learn about supervised and unsupervised learning, neural networks, and practical applications.',
-            author=author2,
-            difficulty='intermediate',
-            is_published=True
-        )
-        
-        course4 = Course.objects.create(
-            title='Data Science with Python',
-            description='Learn data analysis, visualization, and machine learning with Python. Master pandas, numpy, matplotlib, and scikit-learn.',
-            author=author2,
-            difficulty='intermediate',
-            is_published=False
-        )
-
-        self.stdout.write(self.style.SUCCESS('Created 4 sample courses'))
-
-        # Create lessons for course 1
-        lesson1_1 = Lesson.objects.create(
-            course=course1,
-            title='Introduction to Python',
-            content='''Welcome to Python Programming!
+DEMO_COURSES = [
+    {
+        'title': 'Python Programming for Beginners',
+        'description': 'Learn Python programming from scratch. This comprehensive course covers all the basics of Python, including variables, data types, control structures, functions, and object-oriented programming.',
+        'author': 'john_doe',
+        'difficulty': 'beginner',
+        'is_published': True,
+        'lessons': [
+            ('Introduction to Python', '''Welcome to Python Programming!
 
 In this lesson, you'll learn:
 - What is Python?
@@ -98,14 +45,8 @@ In this lesson, you'll learn:
 - Setting up your development environment
 - Your first Python program
 
-Python is a powerful, versatile programming language that's perfect for beginners and professionals alike. Let's get started!''',
-            order=1
-        )
-
-        lesson1_2 = Lesson.objects.create(
-            course=course1,
-            title='Variables and Data Types',
-            content='''Understanding Variables and Data Types
+Python is a powerful, versatile programming language that's perfect for beginners and professionals alike. Let's get started!'''),
+            ('Variables and Data Types', '''Understanding Variables and Data Types
 
 Topics covered:
 - Variables and naming conventions
@@ -114,14 +55,8 @@ Topics covered:
 - Boolean values
 - Type conversion
 
-Variables are containers for storing data. Let's learn how to use them effectively!''',
-            order=2
-        )
-
-        lesson1_3 = Lesson.objects.create(
-            course=course1,
-            title='Control Structures',
-            content='''Control Flow in Python
+Variables are containers for storing data. Let's learn how to use them effectively!'''),
+            ('Control Structures', '''Control Flow in Python
 
 Learn about:
 - If statements
@@ -130,15 +65,17 @@ Learn about:
 - While loops
 - Break and continue
 
-Control structures allow you to control the flow of your program's execution.''',
-            order=3
-        )
-
-        # Create lessons for course 2
-        lesson2_1 = Lesson.objects.create(
-            course=course2,
-            title='Django Project Setup',
-            content='''Setting Up Your Django Project
+Control structures allow you to control the flow of your program's execution.'''),
+        ],
+    },
+    {
+        'title': 'Advanced Django Web Development',
+        'description': 'Master Django framework and build production-ready web applications. Learn about models, views, templates, authentication, REST APIs, and deployment.',
+        'author': 'john_doe',
+        'difficulty': 'advanced',
+        'is_published': True,
+        'lessons': [
+            ('Django Project Setup', '''Setting Up Your Django Project
 
 What you'll learn:
 - Installing Django
@@ -147,14 +84,8 @@ What you'll learn:
 - Django settings configuration
 - Running the development server
 
-Let's set up your first Django project!''',
-            order=1
-        )
-
-        lesson2_2 = Lesson.objects.create(
-            course=course2,
-            title='Models and Databases',
-            content='''Working with Django Models
+Let's set up your first Django project!'''),
+            ('Models and Databases', '''Working with Django Models
 
 Topics:
 - Creating models
@@ -163,15 +94,17 @@ Topics:
 - QuerySets and database queries
 - Model relationships
 
-Models are the foundation of your Django application's data layer.''',
-            order=2
-        )
-
-        # Create lessons for course 3
-        lesson3_1 = Lesson.objects.create(
-            course=course3,
-            title='What is Machine Learning?',
-            content='''Introduction to Machine Learning
+Models are the foundation of your Django application's data layer.'''),
+        ],
+    },
+    {
+        'title': 'Introduction to Machine Learning',
+        'description': 'Dive into the world of machine learning. Learn about supervised and unsupervised learning, neural networks, and practical applications.',
+        'author': 'jane_smith',
+        'difficulty': 'intermediate',
+        'is_published': True,
+        'lessons': [
+            ('What is Machine Learning?', '''Introduction to Machine Learning
 
 Overview:
 - Definition of machine learning
@@ -180,24 +113,236 @@ Overview:
 - ML workflow
 - Getting started with ML
 
-Machine learning is revolutionizing technology. Let's understand the basics!''',
-            order=1
+Machine learning is revolutionizing technology. Let's understand the basics!'''),
+        ],
+    },
+    {
+        'title': 'Data Science with Python',
+        'description': 'Learn data analysis, visualization, and machine learning with Python. Master pandas, numpy, matplotlib, and scikit-learn.',
+        'author': 'jane_smith',
+        'difficulty': 'intermediate',
+        'is_published': False,
+        'lessons': [],
+    },
+]
+
+DEMO_ENROLLMENTS = [
+    ('student', 'Python Programming for Beginners'),
+    ('student', 'Introduction to Machine Learning'),
+]
+
+# Generated rows are recognised by these prefixes, which is what makes
+# reruns skip the rows that already exist.
+USER_PREFIX = 'sample_user'
+COURSE_PREFIX = 'sample-course-'
+SAMPLE_PASSWORD = 'sample123'
+
+TOPICS = [
+    'Python', 'Django', 'JavaScript', 'SQL', 'Statistics', 'Machine Learning', 'Rust', 'Go',
+    'Linux', 'Networking', 'Docker', 'Kubernetes', 'React', 'Algorithms', 'Data Structures',
+    'Cryptography', 'Calculus', 'Linear Algebra', 'Photography', 'Music Theory',
+]
+ADJECTIVES = ['Practical', 'Modern', 'Applied', 'Complete', 'Hands-on', 'Essential', 'Advanced', 'Intro to']
+WORDS = (
+    'learn build understand practice example exercise project data model function value '
+    'system design pattern test deploy query index cache server client request response '
+    'performance memory network file stream error debug review chapter summary'
+).split()
+DIFFICULTIES = [choice for choice, _ in Course.DIFFICULTY_CHOICES]
+
+
+class Command(BaseCommand):
+    help = 'Creates sample data for testing the e-learning platform; add --users/--courses for load-test datasets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=0, help='Generated users, authors included')
+        parser.add_argument('--authors', type=int, help='How many generated users are authors (default: users / 50)')
+        parser.add_argument('--courses', type=int, default=0, help='Generated courses')
+        parser.add_argument('--lessons-per-course', type=int, default=10)
+        parser.add_argument('--enrollments', type=int, default=0, help='Enrollments to attempt; duplicates are skipped')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for generated content (default: 0)')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per INSERT (default: 2000)')
+        parser.add_argument('--no-demo', action='store_true', help='Skip the demo accounts and courses')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.seed = options['seed']
+
+        if not options['no_demo']:
+            self.create_demo_data()
+
+        if options['users']:
+            authors = options['authors']
+            if authors is None:
+                authors = max(1, options['users'] // 50)
+            self.generate_users(options['users'], min(authors, options['users']))
+        if options['courses']:
+            self.generate_courses(options['courses'])
+        if options['courses'] and options['lessons_per_course']:
+            self.generate_lessons(options['lessons_per_course'])
+        if options['enrollments']:
+            self.generate_enrollments(options['enrollments'])
+        if options['courses'] or options['enrollments']:
+            # bulk_create bypasses the services that maintain the counters,
+            # and the signals that purge the cached catalog pages.
+            CourseService.reconcile_counters(Course.objects.filter(slug__startswith=COURSE_PREFIX))
+            page_cache.purge(http_cache.CATALOG_KEY)
+
+    def create_demo_data(self):
+        users = {}
+        for username, password, fields in DEMO_USERS:
+            user = User.objects.filter(username=username).first()
+            if user is None:
+                user = User.objects.create_user(username=username, password=password, **fields)
+                self.stdout.write(self.style.SUCCESS(f'Created {user.role} user: {username}/{password}'))
+            users[username] = user
+
+        courses = {}
+        for data in DEMO_COURSES:
+            course = Course.objects.filter(title=data['title'], author=users[data['author']]).first()
+            if course is None:
+                course = Course.objects.create(
+                    title=data['title'],
+                    description=data['description'],
+                    author=users[data['author']],
+                    difficulty=data['difficulty'],
+                    is_published=data['is_published'],
+                )
+                for order, (title, content) in enumerate(data['lessons'], start=1):
+                    Lesson.objects.create(course=course, title=title, content=content, order=order)
+                self.stdout.write(self.style.SUCCESS(f'Created course: {course.title}'))
+            courses[data['title']] = course
+
+        for username, title in DEMO_ENROLLMENTS:
+            Enrollment.objects.get_or_create(user=users[username], course=courses[title])
+        EnrollmentCache.invalidate(*[user.pk for user in users.values()])
+        CourseService.reconcile_counters(Course.objects.filter(pk__in=[course.pk for course in courses.values()]))
+
+        self.stdout.write(self.style.SUCCESS('Demo data is in place. Logins:'))
+        for username, password, _ in DEMO_USERS:
+            self.stdout.write(f'  {username}/{password}')
+
+    def insert(self, model, objects):
+        """Insert ``objects`` (any iterable) in batches, skipping rows that
+        conflict with existing ones. Returns the number of rows added."""
+        before = model.objects.count()
+        while batch := list(itertools.islice(objects, self.batch_size)):
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+        return model.objects.count() - before
+
+    def rng(self, name):
+        return random.Random(f'{self.seed}-{name}')
+
+    def text(self, rng, words):
+        return ' '.join(rng.choices(WORDS, k=words)).capitalize() + '.'
+
+    def generate_users(self, count, authors):
+        # Hashing is deliberately slow, so every generated user shares one hash.
+        password = make_password(SAMPLE_PASSWORD)
+
+        def users():
+            for i in range(count):
+                username = f'{USER_PREFIX}{i}'
+                yield User(
+                    username=username,
+                    email=f'{username}@example.com',
+                    password=password,
+                    role='author' if i < authors else 'student',
+                )
+
+        added = self.insert(User, users())
+        self.stdout.write(self.style.SUCCESS(
+            f'Users: {added} added, {count} requested ({authors} authors, password {SAMPLE_PASSWORD})'
+        ))
+
+    def generate_courses(self, count):
+        author_ids = list(
+            User.objects.filter(username__startswith=USER_PREFIX, role='author').order_by('pk').values_list('pk', flat=True)
+        )
+        if not author_ids:
+            raise CommandError('No generated authors exist yet; pass --users as well.')
+        rng = self.rng('courses')
+
+        def courses():
+            for i in range(count):
+                yield Course(
+                    title=f'{rng.choice(ADJECTIVES)} {rng.choice(TOPICS)} {i}',
+                    slug=f'{COURSE_PREFIX}{i}',
+                    description=self.text(rng, 40),
+                    author_id=rng.choice(author_ids),
+                    difficulty=rng.choice(DIFFICULTIES),
+                    is_published=rng.random() < 0.9,
+                )
+
+        # The slugs are chosen here, so keep slug allocation from handing them out.
+        for start in range(0, count, self.batch_size):
+            slugs.reserve(f'{COURSE_PREFIX}{i}' for i in range(start, min(count, start + self.batch_size)))
+        last_pk = Course.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        added = self.insert(Course, courses())
+        self.stdout.write(self.style.SUCCESS(f'Courses: {added} added, {count} requested'))
+
+        # bulk_create skips the signal that indexes new courses. Index them
+        # here, so courses that get no lessons can be found too.
+        new_ids = list(
+            Course.objects.filter(slug__startswith=COURSE_PREFIX, pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)
+        )
+        backend = get_backend()
+        for start in range(0, len(new_ids), 500):
+            backend.index_courses(Course.objects.filter(pk__in=new_ids[start:start + 500]).prefetch_related('lessons'))
+
+    def generate_lessons(self, per_course):
+        # Only courses without lessons get them, so reruns add nothing.
+        courses = dict(
+            Course.objects.filter(slug__startswith=COURSE_PREFIX, lessons__isnull=True)
+            .order_by('pk').values_list('pk', 'progress_slots')
         )
+        course_ids = list(courses)
+        rng = self.rng('lessons')
+
+        def lessons():
+            for course_id, first_slot in courses.items():
+                for order in range(1, per_course + 1):
+                    lesson = Lesson(
+                        course_id=course_id,
+                        title=f'Lesson {order}: {self.text(rng, 4)[:-1]}',
+                        content='\n\n'.join(self.text(rng, 60) for _ in range(3)),
+                        order=order,
+                        progress_slot=first_slot + order - 1,
+                    )
+                    markup.compile_lesson(lesson)
+                    yield lesson
+
+        added = self.insert(Lesson, lessons())
+        self.stdout.write(self.style.SUCCESS(f'Lessons: {added} added to {len(course_ids)} courses'))
+
+        # bulk_create skips save() and its signals, so move the progress slot
+        # counters, reindex the courses with their lessons and drop their
+        # (empty) cached outlines here.
+        backend = get_backend()
+        for start in range(0, len(course_ids), 500):
+            ids = course_ids[start:start + 500]
+            progress.reserve_existing(Course.objects.filter(pk__in=ids))
+            backend.index_courses(Course.objects.filter(pk__in=ids).prefetch_related('lessons'))
+            LessonOutlineCache.invalidate(*ids)
+
+    def generate_enrollments(self, count):
+        student_ids = list(
+            User.objects.filter(username__startswith=USER_PREFIX, role='student').order_by('pk').values_list('pk', flat=True)
+        )
+        course_ids = list(
+            Course.objects.filter(slug__startswith=COURSE_PREFIX, is_published=True).order_by('pk').values_list('pk', flat=True)
+        )
+        if not student_ids or not course_ids:
+            raise CommandError('Enrollments need generated students and published courses; pass --users and --courses.')
+        rng = self.rng('enrollments')
+
+        def enrollments():
+            for _ in range(count):
+                # Squaring skews enrollments towards the first courses, so a
+                # few are popular and most are not.
+                course_id = course_ids[int(len(course_ids) * rng.random() ** 2)]
+                yield Enrollment(user_id=rng.choice(student_ids), course_id=course_id)
 
-        self.stdout.write(self.style.SUCCESS('Created sample lessons'))
-
-        # Enroll student in courses
-        from courses.models import Enrollment
-        Enrollment.objects.create(user=student, course=course1)
-        Enrollment.objects.create(user=student, course=course3)
-        
-        self.stdout.write(self.style.SUCCESS('Enrolled student in sample courses'))
-        
-        self.stdout.write(self.style.SUCCESS('\n================================='))
-        self.stdout.write(self.style.SUCCESS('Sample data created successfully!'))
-        self.stdout.write(self.style.SUCCESS('================================='))
-        self.stdout.write(self.style.SUCCESS('\nLogin credentials:'))
-        self.stdout.write(self.style.SUCCESS('Admin: admin/admin123'))
-        self.stdout.write(self.style.SUCCESS('Author 1: john_doe/author123'))
-        self.stdout.write(self.style.SUCCESS('Author 2: jane_smith/author123'))
-        self.stdout.write(self.style.SUCCESS('Student: student/student123'))
+        added = self.insert(Enrollment, enrollments())
+        EnrollmentCache.invalidate(*student_ids)
+        self.stdout.write(self.style.SUCCESS(f'Enrollments: {added} added, {count} attempted'))
@@ -0,0 +1,98 @@
+import os
+import posixpath
+import shutil
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from courses.models import Material, StoredBlob
+from courses.storage import BLOB_DIR, blob_name, material_storage
+
+
+def link_or_copy(source, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+class Command(BaseCommand):
+    help = 'Moves material files into content-addressed storage, merging duplicates, and reports the bytes reclaimed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be reclaimed')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        seen = set()
+        moved = merged = reclaimed = 0
+
+        legacy = Material.objects.exclude(file__startswith=f'{BLOB_DIR}/').exclude(file='').order_by('pk')
+        for material in legacy.iterator():
+            old_name = material.file.name
+            if not material_storage.exists(old_name):
+                self.stdout.write(self.style.WARNING(f'Missing file for material {material.pk}: {old_name}'))
+                continue
+            old_path = material_storage.path(old_name)
+            size = os.path.getsize(old_path)
+            digest = material_storage.hash_path(old_path)
+            name = blob_name(digest, posixpath.splitext(old_name)[1][:16])
+            duplicate = name in seen or material_storage.exists(name)
+            seen.add(name)
+            if duplicate:
+                merged += 1
+                reclaimed += size
+            else:
+                moved += 1
+            if dry_run:
+                continue
+
+            if not material_storage.exists(name):
+                # Link first and delete the old name only after the row points
+                # at the new one, so an interruption never loses a file.
+                link_or_copy(old_path, material_storage.path(name))
+            with transaction.atomic():
+                StoredBlob.objects.get_or_create(name=name, defaults={'sha256': digest, 'size': size})
+                Material.objects.filter(pk=material.pk, original_filename='').update(
+                    original_filename=posixpath.basename(old_name)
+                )
+                Material.objects.filter(pk=material.pk).update(file=name)
+            material_storage.delete(old_name)
+
+        if not dry_run:
+            reclaimed += self.reconcile()
+
+        verb = 'Would reclaim' if dry_run else 'Reclaimed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{moved} files moved into blob storage, {merged} duplicates merged. {verb} {reclaimed} bytes.'
+        ))
+
+    def reconcile(self):
+        """Recount references from the materials and delete unused blobs.
+        Returns the bytes freed."""
+        counts = dict(
+            Material.objects.filter(file__startswith=f'{BLOB_DIR}/').order_by()
+            .values_list('file').annotate(total=Count('pk'))
+        )
+        freed = 0
+        for blob in StoredBlob.objects.order_by('pk').iterator():
+            references = counts.get(blob.name, 0)
+            if references != blob.ref_count:
+                StoredBlob.objects.filter(pk=blob.pk).update(ref_count=references)
+            if not references:
+                freed += self.delete_unused(blob)
+        return freed
+
+    def delete_unused(self, blob):
+        with transaction.atomic():
+            # A material may have been attached since the recount.
+            if not StoredBlob.objects.select_for_update().filter(pk=blob.pk, ref_count=0).exists():
+                return 0
+            references = Material.objects.filter(file=blob.name).count()
+            if references:
+                StoredBlob.objects.filter(pk=blob.pk).update(ref_count=references)
+                return 0
+            material_storage.delete(blob.name)
+            blob.delete()
+        return blob.size
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from courses.services import UploadService
+
+
+class Command(BaseCommand):
+    help = 'Removes chunked uploads that were abandoned before completion'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=float, default=settings.CHUNKED_UPLOAD_EXPIRY_HOURS,
+            help='Remove uploads idle for this many hours (default: CHUNKED_UPLOAD_EXPIRY_HOURS)',
+        )
+
+    def handle(self, *args, **options):
+        count = UploadService.expire_sessions(timezone.now() - timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'Removed {count} abandoned uploads'))
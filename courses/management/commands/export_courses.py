@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from courses.catalog import CatalogError, export_catalog
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Exports courses with their lessons and material files to an archive directory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Archive directory; created if missing')
+        parser.add_argument('--course', action='append', dest='courses', metavar='SLUG', help='Export this course (repeatable)')
+        parser.add_argument('--author', help='Export the courses of this username')
+        parser.add_argument('--batch-size', type=int, default=500, help='Courses per batch (default: 500)')
+
+    def handle(self, *args, **options):
+        courses = Course.objects.all()
+        if options['courses']:
+            courses = courses.filter(slug__in=options['courses'])
+            missing = set(options['courses']) - set(courses.values_list('slug', flat=True))
+            if missing:
+                raise CommandError(f'No course with slug {", ".join(sorted(missing))}')
+        if options['author']:
+            author = get_user_model().objects.filter(username=options['author']).first()
+            if author is None:
+                raise CommandError(f'No user is called {options["author"]}')
+            courses = courses.filter(author=author)
+
+        try:
+            totals = export_catalog(courses, options['directory'], options['batch_size'])
+        except CatalogError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {totals["course"]} courses, {totals["lesson"]} lessons and '
+            f'{totals["material"]} materials to {options["directory"]}'
+        ))
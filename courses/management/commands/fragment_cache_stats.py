@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from courses.cache import CourseFragmentCache
+
+
+class Command(BaseCommand):
+    help = 'Shows hit/miss counters for the course card fragment cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them')
+
+    def handle(self, *args, **options):
+        stats = CourseFragmentCache.stats()
+        self.stdout.write(f"Hits:     {stats['hits']}")
+        self.stdout.write(f"Misses:   {stats['misses']}")
+        self.stdout.write(f"Hit rate: {stats['hit_rate']:.1%}")
+        if options['reset']:
+            CourseFragmentCache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from courses import images
+from courses.models import Course
+from users.models import User
+
+IMAGE_FIELDS = [
+    (Course, 'thumbnail'),
+    (User, 'profile_picture'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Generates missing or stale resized derivatives for course thumbnails and profile pictures'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate derivatives that are already up to date')
+
+    def handle(self, *args, **options):
+        for model, field_name in IMAGE_FIELDS:
+            manifest_name = images.manifest_field(field_name)
+            # Rows with an image, plus rows whose image was removed but still have derivatives.
+            has_image = ~Q(**{field_name: ''}) & Q(**{f'{field_name}__isnull': False})
+            queryset = model._default_manager.filter(has_image | ~Q(**{manifest_name: {}}))
+            ids = queryset.order_by('pk').values_list('pk', flat=True)
+
+            updated = failed = 0
+            for pk in ids.iterator():
+                try:
+                    if images.generate(model, pk, field_name, force=options['force']):
+                        updated += 1
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'{model.__name__} {pk}: {exc}')
+            self.stdout.write(self.style.SUCCESS(
+                f'{model.__name__}.{field_name}: {updated} updated, {failed} failed'
+            ))
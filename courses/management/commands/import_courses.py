@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from courses.catalog import CatalogError, import_catalog
+
+
+class Command(BaseCommand):
+    help = 'Imports courses, lessons and material files from an archive written by export_courses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Archive directory')
+        parser.add_argument('--author', help='Give every imported course to this username instead of the exported authors')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per INSERT (default: 1000)')
+
+    def handle(self, *args, **options):
+        author = None
+        if options['author']:
+            author = get_user_model().objects.filter(username=options['author']).first()
+            if author is None:
+                raise CommandError(f'No user is called {options["author"]}')
+
+        try:
+            totals = import_catalog(options['directory'], author, options['batch_size'])
+        except CatalogError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {totals["course"]} courses, {totals["lesson"]} lessons and {totals["material"]} materials'
+        ))
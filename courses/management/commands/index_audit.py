@@ -0,0 +1,111 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+
+from courses import http_cache
+from courses.models import Course, DailyCourseStats, Enrollment, Lesson, Material
+from courses.pagination import KeysetPaginator
+from courses.search import rank_expression
+from courses.services import CourseService, EnrollmentService, LessonService, MaterialService
+from users.models import User
+
+# Plan fragments that mean a full table scan or a sort outside an index.
+SQLITE_FLAGS = ('SCAN ', 'USE TEMP B-TREE')
+POSTGRES_FLAGS = ('Seq Scan', 'Sort')
+
+
+def view_queries():
+    """Yield ``(view, description, queryset, expected)`` for the queries the
+    course views issue. ``expected`` lists flags that are known and accepted."""
+    author = User(pk=1, role='author')
+    course = Course(pk=1, author=author, created_at=datetime.datetime.now(datetime.UTC))
+    lesson = Lesson(pk=1, course=course)
+
+    def pages(queryset):
+        paginator = KeysetPaginator(queryset, settings.COURSES_PER_PAGE)
+        yield 'first page', paginator._page_queryset(None, None)[0]
+        yield 'next page', paginator._page_queryset(paginator.encode(course), None)[0]
+
+    listing = CourseService.get_published_courses()
+    yield 'home', 'featured courses', listing[:settings.HOME_FEATURED_COURSES], ()
+    for description, queryset in pages(listing):
+        yield 'course_list', description, queryset, ()
+    # Search results are ordered by rank, so sorting the (bounded) result
+    # set is unavoidable.
+    ids = [3, 1, 2]
+    search = listing.filter(pk__in=ids).annotate(search_rank=rank_expression(ids)).order_by('search_rank')
+    yield 'course_list', 'search results', search, ('USE TEMP B-TREE', 'Sort')
+    yield 'course_detail', 'course', Course.objects.published().for_detail().filter(slug='slug'), ()
+    yield 'course_detail', 'lesson outline', LessonService.outline_rows(course.pk), ()
+    lesson_query = Lesson.objects.select_related('course').filter(id=1, course__slug='slug', course__is_published=True)
+    yield 'lesson_detail', 'lesson', lesson_query, ()
+    yield 'lesson_detail', 'materials', MaterialService.get_lesson_materials(lesson), ()
+    yield 'enroll_course', 'enrolled course ids', Enrollment.objects.filter(user=author).values_list('course_id'), ()
+    yield 'my_courses', 'enrollments', EnrollmentService.get_user_enrollments(author), ()
+    for description, queryset in pages(CourseService.get_author_courses(author)):
+        yield 'author_dashboard', description, queryset, ()
+    # Grouping the bounded rollup rows needs a temporary sort.
+    start = datetime.date.today() - datetime.timedelta(days=settings.AUTHOR_STATS_DAYS - 1)
+    daily = DailyCourseStats.objects.filter(course__author=author, day__gte=start).values('day').annotate(Sum('enrollments'))
+    yield 'author_dashboard', 'daily stats', daily, ('USE TEMP B-TREE', 'Sort')
+    per_course = DailyCourseStats.objects.filter(course__in=[1, 2], day__gte=start).values('course_id').annotate(Sum('enrollments'))
+    yield 'author_dashboard', 'course stats', per_course, ()
+    yield 'manage_lessons', 'lessons', LessonService.get_course_lessons(course).with_material_count(), ()
+    yield 'manage_materials', 'materials', MaterialService.get_lesson_materials(lesson), ()
+    yield 'download_material', 'material', Material.objects.select_related('lesson__course').filter(id=1), ()
+    for description, queryset in pages(author.courses.published().for_listing()):
+        yield 'author_profile', description, queryset, ()
+    # ETag validators of the catalog pages (http_cache.py).
+    yield 'home', 'etag', listing[:settings.HOME_FEATURED_COURSES].values_list(*http_cache.COURSE_FIELDS), ()
+    detail = Course.objects.published().filter(slug='slug').values_list(*http_cache.COURSE_FIELDS)
+    yield 'course_detail', 'etag', detail, ()
+    yield 'author_profile', 'etag author', http_cache.author_values('author'), ()
+
+
+def plan_problems(plan, expected):
+    flags = SQLITE_FLAGS if connection.vendor == 'sqlite' else POSTGRES_FLAGS
+    problems = []
+    for line in plan.splitlines():
+        for flag in flags:
+            if flag in line and flag not in expected and 'CONSTANT ROW' not in line:
+                problems.append(line.strip())
+                break
+    return problems
+
+
+class Command(BaseCommand):
+    help = 'Runs EXPLAIN on the queries the course views issue and reports full scans and sorts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every query plan')
+        parser.add_argument('--fail', action='store_true', help='Exit with an error if any plan is flagged')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f'index_audit does not support the {connection.vendor} backend.')
+
+        flagged = 0
+        for view, description, queryset, expected in view_queries():
+            plan = queryset.explain()
+            problems = plan_problems(plan, expected)
+            label = f'{view}: {description}'
+            if problems:
+                flagged += 1
+                self.stdout.write(self.style.WARNING(f'{label}'))
+                for line in problems:
+                    self.stdout.write(f'    {line}')
+            else:
+                self.stdout.write(f'{label}: ok')
+            if options['verbose_plans']:
+                self.stdout.write('\n'.join(f'    | {line}' for line in plan.splitlines()))
+
+        if flagged:
+            message = f'{flagged} queries fall back to a full scan or a sort'
+            if options['fail']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS('Every query uses an index'))
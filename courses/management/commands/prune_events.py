@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from courses.models import AccessEvent, RollupWatermark
+
+EVENT_SOURCES = ('downloads', 'lesson_views')
+
+
+class Command(BaseCommand):
+    help = 'Deletes access events older than the retention period once they are counted in the daily rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.ACCESS_EVENT_RETENTION_DAYS,
+            help='Keep events from this many days (default: ACCESS_EVENT_RETENTION_DAYS)',
+        )
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows per DELETE (default: 10000)')
+        parser.add_argument('--vacuum', action='store_true', help='Compact the table afterwards')
+
+    def handle(self, *args, **options):
+        # Never delete rows aggregate_stats has not counted yet.
+        watermarks = dict(RollupWatermark.objects.filter(name__in=EVENT_SOURCES).values_list('name', 'last_id'))
+        counted_up_to = min(watermarks.get(name, 0) for name in EVENT_SOURCES)
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        expired = AccessEvent.objects.filter(pk__lte=counted_up_to, created_at__lt=cutoff).order_by('pk')
+
+        deleted = 0
+        while ids := list(expired.values_list('pk', flat=True)[:options['batch_size']]):
+            deleted += AccessEvent.objects.filter(pk__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} access events older than {options["days"]} days'))
+
+        if options['vacuum']:
+            with connection.cursor() as cursor:
+                if connection.vendor == 'sqlite':
+                    cursor.execute('VACUUM')
+                elif connection.vendor == 'postgresql':
+                    cursor.execute(f'VACUUM ANALYZE {AccessEvent._meta.db_table}')
+            self.stdout.write('Compacted the event table')
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from courses.models import Course
+from courses.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text course search index from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Courses indexed per batch (default: 500)')
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        if not backend.supports_index:
+            self.stdout.write(self.style.WARNING('The current database has no full-text index; nothing to do.'))
+            return
+
+        batch_size = options['batch_size']
+        total = 0
+        with transaction.atomic():
+            backend.clear()
+            ids = Course.objects.order_by('pk').values_list('pk', flat=True)
+            batch = []
+            for pk in ids.iterator(chunk_size=batch_size):
+                batch.append(pk)
+                if len(batch) >= batch_size:
+                    total += self.index_batch(backend, batch)
+                    batch = []
+            if batch:
+                total += self.index_batch(backend, batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} courses'))
+
+    def index_batch(self, backend, ids):
+        courses = Course.objects.filter(pk__in=ids).prefetch_related('lessons')
+        rows = list(backend.document_rows(courses))
+        if rows:
+            backend.insert_rows(rows)
+        return len(rows)
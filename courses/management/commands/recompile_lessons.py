@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from courses import markup
+from courses.models import Lesson
+
+
+class Command(BaseCommand):
+    help = 'Recompiles lesson content whose stored HTML is out of date, e.g. after a renderer version bump'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompile every lesson, not only stale ones')
+        parser.add_argument('--batch-size', type=int, default=500, help='Lessons per UPDATE (default: 500)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = ['id', 'content', *Lesson.COMPILED_FIELDS]
+        checked = recompiled = 0
+        last_id = 0
+        started = time.monotonic()
+        while True:
+            # Walk the table by primary key so each batch is an index range.
+            batch = list(Lesson.objects.filter(pk__gt=last_id).order_by('pk').only(*fields)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].pk
+            checked += len(batch)
+            if options['all']:
+                for lesson in batch:
+                    lesson.renderer_version = 0
+            stale = [lesson for lesson in batch if markup.compile_lesson(lesson)]
+            if stale:
+                Lesson.objects.bulk_update(stale, Lesson.COMPILED_FIELDS)
+                recompiled += len(stale)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Recompiled {recompiled} of {checked} lessons in {time.monotonic() - started:.1f}s '
+            f'(renderer version {markup.RENDERER_VERSION})'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from courses.services import CourseService
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the lesson, material and enrollment counters on courses and fixes any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Courses per UPDATE (default: 1000)')
+
+    def handle(self, *args, **options):
+        fixed = CourseService.reconcile_counters(batch_size=options['batch_size'])
+        if fixed:
+            self.stdout.write(self.style.WARNING(f'Fixed the counters of {fixed} courses'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All course counters are correct'))
@@ -0,0 +1,34 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from courses import jobs
+
+
+class Command(BaseCommand):
+    help = 'Runs background jobs from the database queue; start one process per worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty (default: 1)')
+        parser.add_argument('--worker-id', help='Name recorded on claimed jobs (default: host:pid)')
+
+    def handle(self, *args, **options):
+        stopping = False
+
+        def stop(signum, frame):
+            # Finish the job in progress, then exit.
+            nonlocal stopping
+            stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        worker_id = options['worker_id'] or jobs.default_worker_id()
+        self.stdout.write(f'Worker {worker_id} started')
+        processed = jobs.work(
+            worker_id=worker_id,
+            burst=options['burst'],
+            idle_sleep=options['sleep'],
+            should_stop=lambda: stopping,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker_id} stopped after {processed} jobs'))
@@ -0,0 +1,187 @@
+"""Lesson content: a Markdown subset compiled to HTML when a lesson is saved.
+
+Authors write headings (``#`` to ``######``), paragraphs, ``-``/``*`` and
+numbered lists, ``>`` quotes, fenced code blocks, ``---`` rules, and inline
+``code``, ``**bold**``, ``*italics*`` and ``[links](https://...)``. A single
+newline inside a paragraph is kept as a line break, as the ``linebreaks``
+filter used to do.
+
+The text is HTML-escaped before any Markdown is applied, so the only tags
+in the output are the ones the renderer writes, and link targets are
+limited to http(s), mailto and relative URLs: nothing an author types can
+inject markup or script.
+
+``compile_lesson()`` stores the HTML, a table of contents and the SHA-256
+of the source on the lesson, and skips the work when neither the content
+nor ``RENDERER_VERSION`` changed. Bump the version whenever the output
+changes and run ``manage.py recompile_lessons``; until then views render
+stale lessons on the fly (``lesson_content()``).
+"""
+import hashlib
+import html
+import re
+
+from asgiref.sync import sync_to_async
+from django.utils.html import escape
+from django.utils.text import slugify
+
+RENDERER_VERSION = 1
+# Markdown levels listed in the table of contents (h2 to h4 on the page,
+# under the lesson title's h1).
+TOC_LEVELS = 3
+
+FENCE_RE = re.compile(r'^\s*```\s*([\w+-]*)\s*$')
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+RULE_RE = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+QUOTE_RE = re.compile(r'^\s*>\s?(.*)$')
+BULLET_RE = re.compile(r'^\s*[-*+]\s+(.*)$')
+NUMBER_RE = re.compile(r'^\s*\d{1,9}[.)]\s+(.*)$')
+
+CODE_RE = re.compile(r'`([^`]+)`')
+LINK_RE = re.compile(r'\[([^\]]+)\]\(([^)\s]+)\)')
+STRONG_RE = re.compile(r'(\*\*|__)(?=\S)(.+?)(?<=\S)\1')
+EM_RE = re.compile(r'(?<![\w*])\*(?=\S)(.+?)(?<=\S)\*(?![\w*])|(?<!\w)_(?=\S)(.+?)(?<=\S)_(?!\w)')
+STASHED_RE = re.compile('\x00(\\d+)\x00')
+SCHEME_RE = re.compile(r'^([a-zA-Z][a-zA-Z0-9+.-]*):')
+SAFE_SCHEMES = ('http', 'https', 'mailto')
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def is_current(lesson):
+    return lesson.renderer_version == RENDERER_VERSION and lesson.content_hash == content_hash(lesson.content)
+
+
+def compile_lesson(lesson):
+    """Render ``lesson.content`` into the compiled fields unless they are
+    current. Returns True if they changed."""
+    if is_current(lesson):
+        return False
+    lesson.content_html, lesson.content_toc = render(lesson.content)
+    lesson.content_hash = content_hash(lesson.content)
+    lesson.renderer_version = RENDERER_VERSION
+    return True
+
+
+def lesson_content(lesson):
+    """The ``(html, toc)`` to show for ``lesson``. Only lessons saved before
+    the last renderer change are rendered here."""
+    if lesson.renderer_version == RENDERER_VERSION:
+        return lesson.content_html, lesson.content_toc
+    return render(lesson.content)
+
+
+async def alesson_content(lesson):
+    if lesson.renderer_version == RENDERER_VERSION:
+        return lesson.content_html, lesson.content_toc
+    # Loading the deferred content is a sync query.
+    return await sync_to_async(lesson_content)(lesson)
+
+
+def render(text):
+    """Return ``(html, toc)`` for Markdown ``text``. ``toc`` is a list of
+    ``{'level', 'id', 'title'}`` entries, one per heading."""
+    return Renderer().render(text)
+
+
+class Renderer:
+    def __init__(self):
+        self.toc = []
+        self.ids = set()
+
+    def render(self, text):
+        lines = text.replace('\r\n', '\n').replace('\r', '\n').replace('\x00', '').split('\n')
+        return '\n'.join(self.blocks(lines)), self.toc
+
+    def blocks(self, lines):
+        i = 0
+        while i < len(lines):
+            line = lines[i]
+            if not line.strip():
+                i += 1
+            elif match := FENCE_RE.match(line):
+                end = next((j for j in range(i + 1, len(lines)) if lines[j].strip() == '```'), len(lines))
+                language = f' class="language-{match[1]}"' if match[1] else ''
+                yield f'<pre><code{language}>{escape(chr(10).join(lines[i + 1:end]))}</code></pre>'
+                i = end + 1
+            elif match := HEADING_RE.match(line):
+                yield self.heading(len(match[1]), match[2])
+                i += 1
+            elif RULE_RE.match(line):
+                yield '<hr>'
+                i += 1
+            elif QUOTE_RE.match(line):
+                quoted = []
+                while i < len(lines) and (match := QUOTE_RE.match(lines[i])):
+                    quoted.append(match[1])
+                    i += 1
+                yield '<blockquote>\n' + '\n'.join(self.blocks(quoted)) + '\n</blockquote>'
+            elif BULLET_RE.match(line) or NUMBER_RE.match(line):
+                pattern, tag = (BULLET_RE, 'ul') if BULLET_RE.match(line) else (NUMBER_RE, 'ol')
+                items = []
+                while i < len(lines):
+                    if match := pattern.match(lines[i]):
+                        items.append([match[1]])
+                    elif lines[i].strip() and lines[i][:1].isspace() and not self.starts_block(lines[i]):
+                        items[-1].append(lines[i].strip())
+                    else:
+                        break
+                    i += 1
+                body = ''.join(f'<li>{self.inline(chr(10).join(item))}</li>' for item in items)
+                yield f'<{tag}>{body}</{tag}>'
+            else:
+                paragraph = []
+                while i < len(lines) and lines[i].strip() and not self.starts_block(lines[i]):
+                    paragraph.append(lines[i].strip())
+                    i += 1
+                yield f'<p>{self.inline(chr(10).join(paragraph))}</p>'
+
+    def starts_block(self, line):
+        return any(
+            pattern.match(line) for pattern in (FENCE_RE, HEADING_RE, RULE_RE, QUOTE_RE, BULLET_RE, NUMBER_RE)
+        )
+
+    def heading(self, level, text):
+        title = re.sub(r'[`*_]|\[([^\]]*)\]\([^)]*\)', r'\1', text).strip()
+        base = slugify(title) or 'section'
+        anchor, number = base, 1
+        while anchor in self.ids:
+            number += 1
+            anchor = f'{base}-{number}'
+        self.ids.add(anchor)
+        if level <= TOC_LEVELS:
+            self.toc.append({'level': level, 'id': anchor, 'title': title})
+        tag = f'h{min(level + 1, 6)}'
+        return f'<{tag} id="{anchor}">{self.inline(text)}</{tag}>'
+
+    def inline(self, text):
+        # Code spans and links are set aside first, so the emphasis rules
+        # never touch their contents.
+        stash = []
+
+        def keep(markup):
+            stash.append(markup)
+            return f'\x00{len(stash) - 1}\x00'
+
+        text = escape(text)
+        text = CODE_RE.sub(lambda match: keep(f'<code>{match[1]}</code>'), text)
+        text = LINK_RE.sub(lambda match: keep(self.link(match[1], match[2])), text)
+        text = self.emphasis(text)
+        text = text.replace('\n', '<br>\n')
+        while '\x00' in text:
+            text = STASHED_RE.sub(lambda match: stash[int(match[1])], text)
+        return text
+
+    def emphasis(self, text):
+        text = STRONG_RE.sub(r'<strong>\2</strong>', text)
+        return EM_RE.sub(lambda match: f'<em>{match[1] or match[2]}</em>', text)
+
+    def link(self, label, url):
+        target = html.unescape(url)
+        scheme = SCHEME_RE.match(target)
+        if (scheme and scheme[1].lower() not in SAFE_SCHEMES) or any(ord(char) < 32 for char in target):
+            return self.emphasis(label)
+        rel = ' rel="nofollow noopener"' if scheme and scheme[1].lower() != 'mailto' else ''
+        return f'<a href="{escape(target)}"{rel}>{self.emphasis(label)}</a>'
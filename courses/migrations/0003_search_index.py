@@ -0,0 +1,77 @@
+from django.db import migrations
+
+SQLITE_CREATE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS courses_search_index USING fts5(
+    title, description, lesson_titles, lesson_content,
+    tokenize = 'porter unicode61 remove_diacritics 2'
+)
+"""
+
+POSTGRES_CREATE = [
+    """
+    CREATE TABLE IF NOT EXISTS courses_search_index (
+        course_id bigint PRIMARY KEY
+            REFERENCES courses_course (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+        document tsvector NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS courses_search_index_document_gin ON courses_search_index USING GIN (document)",
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+    elif vendor == 'postgresql':
+        for statement in POSTGRES_CREATE:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE IF EXISTS courses_search_index")
+
+
+def populate_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        sql = (
+            "INSERT INTO courses_search_index (rowid, title, description, lesson_titles, lesson_content) "
+            "VALUES (%s, %s, %s, %s, %s)"
+        )
+    elif vendor == 'postgresql':
+        sql = (
+            "INSERT INTO courses_search_index (course_id, document) VALUES (%s, "
+            "setweight(to_tsvector('english', %s), 'A') || setweight(to_tsvector('english', %s), 'B') || "
+            "setweight(to_tsvector('english', %s), 'B') || setweight(to_tsvector('english', %s), 'C'))"
+        )
+    else:
+        return
+
+    Course = apps.get_model('courses', 'Course')
+    rows = []
+    for course in Course.objects.prefetch_related('lessons').iterator(chunk_size=500):
+        lessons = sorted(course.lessons.all(), key=lambda lesson: (lesson.order, lesson.created_at))
+        rows.append((
+            course.pk,
+            course.title,
+            course.description,
+            ' '.join(lesson.title for lesson in lessons),
+            '\n'.join(lesson.content for lesson in lessons),
+        ))
+    if rows:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.1.2 on 2026-10-18 12:07
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='course',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 6.1.2 on 2026-10-18 12:39
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_for_course(model, course_field='course'):
+    rows = model.objects.filter(**{course_field: OuterRef('pk')}).order_by().values(course_field)
+    return Coalesce(Subquery(rows.annotate(total=Count('pk')).values('total')), 0)
+
+
+def populate_counters(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Course.objects.update(
+        lesson_count=count_for_course(apps.get_model('courses', 'Lesson')),
+        material_count=count_for_course(apps.get_model('courses', 'Material'), 'lesson__course'),
+        enrollment_count=count_for_course(apps.get_model('courses', 'Enrollment')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_content_addressed_materials'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='enrollment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='lesson_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='material_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.1.2 on 2026-10-18 12:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailycoursestats',
+            name='lesson_views',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='accessevent',
+            name='kind',
+            field=models.CharField(choices=[('lesson_view', 'Lesson view'), ('download', 'Material download')], max_length=20),
+        ),
+    ]
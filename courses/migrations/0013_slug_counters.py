@@ -0,0 +1,41 @@
+# Generated by Django 6.1.2 on 2026-10-18 13:00
+
+import re
+
+from django.db import migrations, models
+
+NUMBERED_RE = re.compile(r'^(.+)-([1-9][0-9]*)$')
+
+
+def reserve_existing_slugs(apps, schema_editor):
+    # The same counting as slugs.counts_for(), frozen for this migration.
+    Course = apps.get_model('courses', 'Course')
+    SlugCounter = apps.get_model('courses', 'SlugCounter')
+    values = {}
+    for slug in Course.objects.values_list('slug', flat=True).iterator():
+        values[slug] = max(values.get(slug, 0), 1)
+        match = NUMBERED_RE.match(slug)
+        if match and int(match[2]) >= 2:
+            values[match[1]] = max(values.get(match[1], 0), int(match[2]))
+    SlugCounter.objects.bulk_create(
+        [SlugCounter(base=base, last=last) for base, last in values.items()], batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_lesson_view_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlugCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('base', models.CharField(max_length=50, unique=True)),
+                ('last', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(reserve_existing_slugs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.1.2 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+def assign_progress_slots(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Lesson = apps.get_model('courses', 'Lesson')
+    for course_id in Course.objects.values_list('pk', flat=True).iterator():
+        lessons = list(Lesson.objects.filter(course_id=course_id).order_by('order', 'created_at', 'pk').only('pk'))
+        for slot, lesson in enumerate(lessons):
+            lesson.progress_slot = slot
+        Lesson.objects.bulk_update(lessons, ['progress_slot'], batch_size=500)
+        Course.objects.filter(pk=course_id).update(progress_slots=len(lessons))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0014_compiled_lesson_content'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='progress_slots',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='progress',
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='progress_slot',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(assign_progress_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='lesson',
+            constraint=models.UniqueConstraint(fields=('course', 'progress_slot'), name='lesson_course_progress_slot_uniq'),
+        ),
+    ]
@@ -1,6 +1,54 @@
+import uuid
+
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.conf import settings
-from django.utils.text import slugify
+from django.utils import timezone
+
+from . import markup, progress, slugs
+from .storage import get_material_storage
+
+
+def _count_for_course(model, course_field='course'):
+    rows = model.objects.filter(**{course_field: OuterRef('pk')}).order_by().values(course_field)
+    return Coalesce(Subquery(rows.annotate(total=Count('pk')).values('total')), 0)
+
+
+class CourseQuerySet(models.QuerySet):
+    LISTING_FIELDS = (
+        'id', 'title', 'slug', 'description', 'difficulty', 'thumbnail', 'thumbnail_derivatives',
+        'is_published', 'created_at', 'updated_at', 'author__id', 'author__username',
+        'lesson_count', 'material_count', 'enrollment_count',
+    )
+
+    def published(self):
+        return self.filter(is_published=True)
+
+    def with_actual_counts(self):
+        """Annotate the counts the counter columns should hold."""
+        return self.annotate(
+            actual_lesson_count=_count_for_course(Lesson),
+            actual_material_count=_count_for_course(Material, 'lesson__course'),
+            actual_enrollment_count=_count_for_course(Enrollment),
+        )
+
+    def for_listing(self):
+        """Only the columns a course card renders, with its author and counts."""
+        return self.select_related('author').only(*self.LISTING_FIELDS)
+
+    def for_detail(self):
+        return self.select_related('author')
+
+
+class LessonQuerySet(models.QuerySet):
+    def with_material_count(self):
+        return self.annotate(material_count=Count('materials'))
+
+    def without_content(self):
+        """Skip the (large) content columns, for lesson lists."""
+        return self.defer(*Lesson.CONTENT_FIELDS)
+
 
 class Course(models.Model):
     DIFFICULTY_CHOICES = (
@@ -15,16 +63,41 @@ class Course(models.Model):
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='courses')
     difficulty = models.CharField(max_length=20, choices=DIFFICULTY_CHOICES, default='beginner')
     thumbnail = models.ImageField(upload_to='course_thumbnails/', null=True, blank=True)
+    thumbnail_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     is_published = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained with F() updates by the services; reconcile_counters fixes drift.
+    lesson_count = models.PositiveIntegerField(default=0, editable=False)
+    material_count = models.PositiveIntegerField(default=0, editable=False)
+    enrollment_count = models.PositiveIntegerField(default=0, editable=False)
+    # Lesson progress slots handed out so far (see progress.py).
+    progress_slots = models.PositiveIntegerField(default=0, editable=False)
+
+    COUNTER_FIELDS = ('lesson_count', 'material_count', 'enrollment_count', 'progress_slots')
+
+    objects = CourseQuerySet.as_manager()
     
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Published listings and author pages in Meta.ordering order.
+            models.Index(fields=['is_published', '-created_at', '-id'], name='course_published_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='course_author_created_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.title)
+            self.slug = slugs.allocate([slugs.base_for(self.title)])[0]
+        elif self._state.adding:
+            slugs.reserve([self.slug])
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # The counters in memory may be stale; never write them back.
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS and field.attname not in deferred
+            ]
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -37,10 +110,43 @@ class Lesson(models.Model):
     order = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Compiled from content on save (see markup.py).
+    content_html = models.TextField(blank=True, editable=False)
+    content_toc = models.JSONField(default=list, blank=True, editable=False)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+    renderer_version = models.PositiveSmallIntegerField(default=0, editable=False)
+    # This lesson's bit in Enrollment.progress; never reused within a course.
+    progress_slot = models.PositiveIntegerField(null=True, editable=False)
+
+    CONTENT_FIELDS = ('content', 'content_html', 'content_toc')
+    COMPILED_FIELDS = ('content_html', 'content_toc', 'content_hash', 'renderer_version')
+
+    objects = LessonQuerySet.as_manager()
     
     class Meta:
         ordering = ['order', 'created_at']
+        indexes = [
+            models.Index(fields=['course', 'order', 'created_at'], name='lesson_course_order_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'progress_slot'], name='lesson_course_progress_slot_uniq'),
+        ]
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        lesson = super().from_db(db, field_names, values)
+        # What the search document was built from (see signals.py).
+        lesson._indexed = (lesson.__dict__.get('title'), lesson.__dict__.get('content_hash'))
+        return lesson
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.progress_slot is None:
+            self.progress_slot = progress.allocate(self.course_id)
+        if 'content' not in self.get_deferred_fields() and markup.compile_lesson(self):
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], *self.COMPILED_FIELDS}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.course.title} - {self.title}"
 
@@ -54,21 +160,188 @@ class Material(models.Model):
     
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='materials')
     title = models.CharField(max_length=200)
-    file = models.FileField(upload_to='course_materials/')
+    file = models.FileField(upload_to='course_materials/', storage=get_material_storage, max_length=255)
+    original_filename = models.CharField(max_length=255, blank=True)
     material_type = models.CharField(max_length=20, choices=MATERIAL_TYPES, default='document')
     description = models.TextField(blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['uploaded_at', 'id']
+        indexes = [
+            models.Index(fields=['lesson', 'uploaded_at', 'id'], name='material_lesson_uploaded_idx'),
+        ]
     
     def __str__(self):
         return self.title
 
+    @property
+    def download_filename(self):
+        return self.original_filename or self.file.name.rsplit('/', 1)[-1]
+
 class Enrollment(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='enrollments')
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='enrollments')
     enrolled_at = models.DateTimeField(auto_now_add=True)
+    # Bit n is set once the lesson with progress_slot n is completed; kept in
+    # step by progress.compare_and_set().
+    progress = models.BinaryField(default=bytes)
+    completed_count = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         unique_together = ['user', 'course']
     
     def __str__(self):
         return f"{self.user.username} enrolled in {self.course.title}"
+
+    @property
+    def percent_complete(self):
+        if not self.course.lesson_count:
+            return 0
+        return min(100, round(100 * self.completed_count / self.course.lesson_count))
+
+
+class Job(models.Model):
+    """A unit of background work, run by ``manage.py run_worker``."""
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+    )
+
+    name = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['run_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_at', 'id'], name='job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+class UploadSession(models.Model):
+    """A chunked material upload in progress (see ``courses/uploads.py``)."""
+    STATUS_CHOICES = (
+        ('uploading', 'Uploading'),
+        ('completing', 'Completing'),
+        ('complete', 'Complete'),
+    )
+
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='upload_sessions')
+    title = models.CharField(max_length=200)
+    material_type = models.CharField(max_length=20, choices=Material.MATERIAL_TYPES, default='document')
+    description = models.TextField(blank=True)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='uploading')
+    material = models.OneToOneField(Material, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    def chunk_length(self, index):
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    def __str__(self):
+        return f"{self.filename} ({self.status})"
+
+
+class UploadChunk(models.Model):
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ['session', 'index']
+
+
+class StoredBlob(models.Model):
+    """A deduplicated material file and the number of materials using it."""
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class SlugCounter(models.Model):
+    """The highest number used with a base slug (see ``slugs.py``)."""
+    base = models.CharField(max_length=50, unique=True)
+    last = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.base} at {self.last}"
+
+
+class AccessEvent(models.Model):
+    """A lesson view or material download, counted into ``DailyCourseStats``
+    by ``aggregate_stats``. Written in batches by ``events.py``.
+
+    The foreign keys carry no database constraint, so deleting a course or
+    a user never has to touch the (large) event table.
+    """
+    KIND_CHOICES = (
+        ('lesson_view', 'Lesson view'),
+        ('download', 'Material download'),
+    )
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    course = models.ForeignKey(Course, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    lesson = models.ForeignKey(Lesson, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    material = models.ForeignKey(Material, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+'
+    )
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} of course {self.course_id} at {self.created_at}"
+
+
+class DailyCourseStats(models.Model):
+    """Per-course, per-day totals rolled up from the raw rows."""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    enrollments = models.PositiveIntegerField(default=0)
+    downloads = models.PositiveIntegerField(default=0)
+    lesson_views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'day'], name='daily_course_stats_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.course_id} on {self.day}"
+
+
+class RollupWatermark(models.Model):
+    """The highest source row id already counted into the rollups."""
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at {self.last_id}"
@@ -0,0 +1,222 @@
+"""Full-page cache of the catalog pages for anonymous visitors.
+
+``anonymous_page`` wraps ``home``, ``course_list`` and ``course_detail``
+(sync or async) outside ``http_cache.catalog_page``. A request without a
+session cookie or pending messages is answered from the cache: no query,
+no view and no template. Entries are keyed on the path and the normalized
+query string: parameters sorted by name, empty values and tracking
+parameters (``utm_*``, ``gclid``...) dropped. A matching ``If-None-Match``
+gets a 304 from the stored ETag. Only responses that ``catalog_page`` made
+``public`` are stored, so a page that sets a cookie or shows a message is
+never reused.
+
+Each entry records the version tokens of its surrogate keys (``catalog``,
+``course-<id>``; see ``http_cache``). ``purge(*keys)`` drops those tokens,
+which retires every page showing a course without knowing their URLs;
+``signals.py`` purges once a course or lesson write commits. A purge also
+bumps a counter, and a render that overlapped one is not stored, so a page
+read before a commit is never cached after it. Enrollment counts are not
+purged and may lag by up to ``PAGE_CACHE_TIMEOUT`` seconds.
+
+Misses are coalesced: the first request takes a lock with ``cache.add()``
+and renders. The others serve the previous copy of the page if there is
+one, or else wait up to ``PAGE_CACHE_LOCK_WAIT`` seconds for the first to
+store it.
+"""
+import asyncio
+import hashlib
+import time
+import uuid
+from functools import wraps
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from .http_cache import CATALOG_KEY
+
+PREFIX = 'page'
+PURGES_KEY = f'{PREFIX}:purges'
+STATUS_HEADER = 'X-Page-Cache'
+TRACKING_PARAMS = frozenset(['fbclid', 'gclid', 'msclkid'])
+POLL_INTERVAL = 0.02
+
+
+def normalized_query(query):
+    """``query`` (a QueryDict) without empty or tracking parameters, sorted
+    by name. Repeated parameters keep their order, as the views read the
+    last one."""
+    params = [
+        (name, value.strip())
+        for name, values in query.lists()
+        if name not in TRACKING_PARAMS and not name.startswith('utm_')
+        for value in values
+        if value.strip()
+    ]
+    return urlencode(sorted(params, key=lambda param: param[0]))
+
+
+def page_key(request):
+    url = f'{request.path}?{normalized_query(request.GET)}'
+    return f'{PREFIX}:{hashlib.sha256(url.encode()).hexdigest()[:32]}'
+
+
+def lock_key(key):
+    return f'{key}:lock'
+
+
+def version_key(surrogate_key):
+    return f'{PREFIX}:version:{surrogate_key}'
+
+
+def purge(*keys):
+    """Retire every cached page tagged with one of the surrogate ``keys``."""
+    # The counter moves first: a render still in flight sees it change
+    # whether it reads the tokens before or after they are dropped.
+    try:
+        cache.incr(PURGES_KEY)
+    except ValueError:
+        cache.set(PURGES_KEY, 1, None)
+    cache.delete_many([version_key(key) for key in keys])
+
+
+def is_cacheable_request(request):
+    # Without a session cookie there is no user and no session to look up;
+    # messages can then only come from their cookie.
+    return (
+        settings.PAGE_CACHE_TIMEOUT > 0
+        and request.method in ('GET', 'HEAD')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and not len(get_messages(request))
+    )
+
+
+def is_cacheable_response(request, response):
+    return (
+        request.method == 'GET'
+        and response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and 'public' in response.get('Cache-Control', '')
+    )
+
+
+def surrogate_keys(response):
+    return getattr(response, 'surrogate_keys', None) or [CATALOG_KEY]
+
+
+def make_entry(response, versions):
+    expires = time.time() + settings.PAGE_CACHE_TIMEOUT
+    return expires, versions, list(response.items()), response.content
+
+
+def is_fresh(entry, tokens):
+    expires, versions = entry[:2]
+    return expires > time.time() and all(tokens.get(version_key(key)) == token for key, token in versions.items())
+
+
+def entry_response(request, entry, status):
+    _, _, headers, content = entry
+    response = HttpResponse(content, headers=headers)
+    response = get_conditional_response(request, etag=response.get('ETag'), response=response)
+    response[STATUS_HEADER] = status
+    return response
+
+
+def entry_token_keys(entry):
+    return [version_key(key) for key in entry[1]]
+
+
+def current_versions(keys):
+    names = {version_key(key): key for key in dict.fromkeys(keys)}
+    tokens = cache.get_many(names)
+    for name in names.keys() - tokens.keys():
+        cache.add(name, uuid.uuid4().hex, None)
+        tokens[name] = cache.get(name)
+    return {names[name]: token for name, token in tokens.items()}
+
+
+async def acurrent_versions(keys):
+    names = {version_key(key): key for key in dict.fromkeys(keys)}
+    tokens = await cache.aget_many(names)
+    for name in names.keys() - tokens.keys():
+        await cache.aadd(name, uuid.uuid4().hex, None)
+        tokens[name] = await cache.aget(name)
+    return {names[name]: token for name, token in tokens.items()}
+
+
+def entry_timeout():
+    # Kept past expiry so concurrent misses have a copy to serve meanwhile.
+    return settings.PAGE_CACHE_TIMEOUT * 2
+
+
+def anonymous_page(view):
+    """Serve ``view`` from the page cache for anonymous visitors; see the
+    module docstring."""
+    if iscoroutinefunction(view):
+        async def render(request, key, args, kwargs):
+            purges = await cache.aget(PURGES_KEY)
+            response = await view(request, *args, **kwargs)
+            if is_cacheable_response(request, response):
+                versions = await acurrent_versions(surrogate_keys(response))
+                if await cache.aget(PURGES_KEY) == purges:
+                    await cache.aset(key, make_entry(response, versions), entry_timeout())
+            response[STATUS_HEADER] = 'miss'
+            return response
+
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if not is_cacheable_request(request):
+                return await view(request, *args, **kwargs)
+            key = page_key(request)
+            deadline = time.monotonic() + settings.PAGE_CACHE_LOCK_WAIT
+            while True:
+                entry = await cache.aget(key)
+                if entry is not None and is_fresh(entry, await cache.aget_many(entry_token_keys(entry))):
+                    return entry_response(request, entry, 'hit')
+                if await cache.aadd(lock_key(key), 1, settings.PAGE_CACHE_LOCK_TIMEOUT):
+                    try:
+                        return await render(request, key, args, kwargs)
+                    finally:
+                        await cache.adelete(lock_key(key))
+                if entry is not None:
+                    return entry_response(request, entry, 'stale')
+                if time.monotonic() >= deadline:
+                    return await render(request, key, args, kwargs)
+                await asyncio.sleep(POLL_INTERVAL)
+    else:
+        def render(request, key, args, kwargs):
+            purges = cache.get(PURGES_KEY)
+            response = view(request, *args, **kwargs)
+            if is_cacheable_response(request, response):
+                versions = current_versions(surrogate_keys(response))
+                if cache.get(PURGES_KEY) == purges:
+                    cache.set(key, make_entry(response, versions), entry_timeout())
+            response[STATUS_HEADER] = 'miss'
+            return response
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable_request(request):
+                return view(request, *args, **kwargs)
+            key = page_key(request)
+            deadline = time.monotonic() + settings.PAGE_CACHE_LOCK_WAIT
+            while True:
+                entry = cache.get(key)
+                if entry is not None and is_fresh(entry, cache.get_many(entry_token_keys(entry))):
+                    return entry_response(request, entry, 'hit')
+                if cache.add(lock_key(key), 1, settings.PAGE_CACHE_LOCK_TIMEOUT):
+                    try:
+                        return render(request, key, args, kwargs)
+                    finally:
+                        cache.delete(lock_key(key))
+                if entry is not None:
+                    return entry_response(request, entry, 'stale')
+                if time.monotonic() >= deadline:
+                    return render(request, key, args, kwargs)
+                time.sleep(POLL_INTERVAL)
+    return wrapper
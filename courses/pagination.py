@@ -0,0 +1,170 @@
+"""Keyset (cursor) pagination.
+
+Unlike ``django.core.paginator.Paginator`` no ``COUNT(*)`` or ``OFFSET`` is
+issued: each page filters on the ordering values of the last row it showed,
+so page 1000 costs the same as page 1 when an index matches the ordering.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder rounds datetimes to milliseconds, which would make
+    # the cursor skip or repeat rows created within the same millisecond.
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Paginate ``queryset`` by its ordering.
+
+    The ordering is taken from the queryset (or the model's ``Meta.ordering``)
+    and ``pk`` is appended as a tie-breaker, so cursors always identify a
+    single row.
+    """
+
+    def __init__(self, queryset, per_page, ordering=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        ordering = list(ordering or queryset.query.order_by or queryset.model._meta.ordering)
+        if not any(field.lstrip('-') in ('pk', 'id') for field in ordering):
+            descending = ordering[-1].startswith('-') if ordering else False
+            ordering.append('-pk' if descending else 'pk')
+        self.ordering = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+
+    def page(self, after=None, before=None):
+        queryset, reverse = self._page_queryset(after, before)
+        return self._build_page(list(queryset), after, reverse)
+
+    async def apage(self, after=None, before=None):
+        queryset, reverse = self._page_queryset(after, before)
+        return self._build_page([obj async for obj in queryset], after, reverse)
+
+    def _page_queryset(self, after, before):
+        if after and before:
+            raise InvalidCursor('Pass either after or before, not both.')
+        queryset = self.queryset
+        reverse = bool(before)
+        cursor = after or before
+        if cursor:
+            queryset = queryset.filter(self._seek_filter(self.decode(cursor), reverse))
+        queryset = queryset.order_by(*self._order_by(reverse))
+        return queryset[:self.per_page + 1], reverse
+
+    def _build_page(self, rows, after, reverse):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            # Paging backwards means there are rows after this page, and
+            # paging forwards from a cursor means there are rows before it.
+            if has_more or reverse:
+                next_cursor = self.encode(rows[-1])
+            if (reverse and has_more) or (not reverse and after):
+                previous_cursor = self.encode(rows[0])
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    def get_page(self, after=None, before=None):
+        """Like ``page()``, but fall back to the first page on a bad cursor."""
+        try:
+            return self.page(after=after, before=before)
+        except InvalidCursor:
+            return self.page()
+
+    async def aget_page(self, after=None, before=None):
+        try:
+            return await self.apage(after=after, before=before)
+        except InvalidCursor:
+            return await self.apage()
+
+    def page_values(self, *fields, after=None, before=None):
+        """``values_list(*fields)`` of the rows ``get_page()`` reads (one
+        more than a page), for callers that only need a few columns."""
+        try:
+            queryset, _ = self._page_queryset(after, before)
+        except InvalidCursor:
+            queryset, _ = self._page_queryset(None, None)
+        return queryset.values_list(*fields)
+
+    def encode(self, obj):
+        values = [getattr(obj, name) for name, _ in self.ordering]
+        data = json.dumps(values, cls=CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+            raise InvalidCursor(cursor) from exc
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise InvalidCursor(cursor)
+        return [self._to_python(name, value) for (name, _), value in zip(self.ordering, values)]
+
+    def _to_python(self, name, value):
+        try:
+            field = self.queryset.model._meta.pk if name == 'pk' else self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return value
+        try:
+            return field.to_python(value)
+        except ValidationError as exc:
+            raise InvalidCursor(value) from exc
+
+    def _order_by(self, reverse):
+        return [
+            f'-{name}' if descending != reverse else name
+            for name, descending in self.ordering
+        ]
+
+    def _seek_filter(self, values, reverse):
+        # (a, b) after (x, y) in descending order is: a < x OR (a = x AND b < y)
+        condition = Q()
+        for index, (name, descending) in enumerate(self.ordering):
+            lookup = 'lt' if descending != reverse else 'gt'
+            term = Q(**{f'{name}__{lookup}': values[index]})
+            for previous_index in range(index):
+                term &= Q(**{self.ordering[previous_index][0]: values[previous_index]})
+            condition |= term
+        # Repeat the bound on the leading column on its own so the database
+        # can turn it into an index range scan.
+        name, descending = self.ordering[0]
+        lookup = 'lte' if descending != reverse else 'gte'
+        return Q(**{f'{name}__{lookup}': values[0]}) & condition
@@ -0,0 +1,106 @@
+"""Lesson completion, stored as a bitmap on each enrollment.
+
+Every lesson gets a ``progress_slot`` when it is created: the next number
+from its course's ``progress_slots`` counter. Bit ``slot`` of
+``Enrollment.progress`` (least significant bit first in each byte) is set
+once the student completes that lesson, and ``Enrollment.completed_count``
+holds the number of set bits, so a percentage is read from the row itself.
+A course with 200 lessons costs at most 25 bytes per enrollment, instead of
+a row per completed lesson.
+
+Slots are never reused. Reordering lessons leaves the bitmaps alone, and
+deleting a lesson clears its bit from the course's enrollments in a
+background job (``clear_slot()``); its slot is never handed out again, so
+the new lesson cannot inherit the old completions before the job has run.
+"""
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+def has(bitmap, slot):
+    byte = slot // 8
+    return byte < len(bitmap) and bool(bitmap[byte] & (1 << slot % 8))
+
+
+def with_slot(bitmap, slot):
+    bitmap = bytearray(bitmap)
+    if len(bitmap) <= slot // 8:
+        bitmap.extend(bytes(slot // 8 + 1 - len(bitmap)))
+    bitmap[slot // 8] |= 1 << slot % 8
+    return bytes(bitmap)
+
+
+def without_slot(bitmap, slot):
+    bitmap = bytearray(bitmap)
+    if slot // 8 < len(bitmap):
+        bitmap[slot // 8] &= ~(1 << slot % 8) & 0xFF
+    # Trailing zero bytes are dropped, so equal progress is equal bytes.
+    return bytes(bitmap).rstrip(b'\0')
+
+
+def count(bitmap):
+    return int.from_bytes(bitmap, 'little').bit_count()
+
+
+def slots(bitmap):
+    """The set slots of ``bitmap``, in ascending order."""
+    return [byte * 8 + bit for byte, value in enumerate(bitmap) for bit in range(8) if value & (1 << bit)]
+
+
+def allocate(course_id, count=1):
+    """Hand out ``count`` new slots of a course; returns the first one."""
+    from .models import Course
+
+    with transaction.atomic():
+        # The UPDATE locks the course row until the transaction ends.
+        Course.objects.filter(pk=course_id).update(progress_slots=F('progress_slots') + count)
+        return Course.objects.filter(pk=course_id).values_list('progress_slots', flat=True).get() - count
+
+
+def reserve_existing(courses):
+    """Move the slot counter of each course in the queryset past the slots
+    of its lessons, for lessons inserted with ``bulk_create``."""
+    from .models import Lesson
+
+    highest = Lesson.objects.filter(course=OuterRef('pk')).order_by().values('course')
+    highest = highest.annotate(top=Max('progress_slot') + 1).values('top')
+    courses.update(progress_slots=Greatest(F('progress_slots'), Coalesce(Subquery(highest), 0)))
+
+
+def clear_slot(course_id, slot, batch_size=1000):
+    """Clear bit ``slot`` on every enrollment of a course. Returns the number
+    of enrollments that had it set."""
+    from .models import Enrollment
+
+    def clear(bitmap):
+        return without_slot(bitmap, slot) if has(bitmap, slot) else None
+
+    cleared, last_pk = 0, 0
+    rows = Enrollment.objects.filter(course_id=course_id, completed_count__gt=0).order_by('pk')
+    while batch := list(rows.filter(pk__gt=last_pk).values_list('pk', 'progress')[:batch_size]):
+        last_pk = batch[-1][0]
+        cleared += sum(compare_and_set(pk, bytes(bitmap), clear) for pk, bitmap in batch)
+    return cleared
+
+
+def compare_and_set(pk, bitmap, change):
+    """Replace the progress of enrollment ``pk`` with ``change(bitmap)``,
+    starting from the ``bitmap`` read earlier.
+
+    The UPDATE only matches while the stored bitmap is still the one
+    ``change`` saw, so concurrent writers never lose each other's bits; on a
+    mismatch the row is read again and ``change`` reapplied. ``change``
+    returns None to leave the row alone. Returns True if the row changed.
+    """
+    from .models import Enrollment
+
+    while bitmap is not None:
+        updated = change(bitmap)
+        if updated is None:
+            return False
+        if Enrollment.objects.filter(pk=pk, progress=bitmap).update(progress=updated, completed_count=count(updated)):
+            return True
+        bitmap = Enrollment.objects.filter(pk=pk).values_list('progress', flat=True).first()
+        bitmap = None if bitmap is None else bytes(bitmap)
+    return False
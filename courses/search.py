@@ -0,0 +1,213 @@
+"""Full-text search index for courses.
+
+Each course is stored as one document made of its title, description and the
+titles and content of its lessons. SQLite databases use an FTS5 virtual table
+ranked with ``bm25()``; PostgreSQL uses a weighted ``tsvector`` column with a
+GIN index ranked with ``ts_rank()``. Any other backend falls back to
+``icontains`` scans.
+
+New courses are indexed when they are saved. Later course and lesson
+changes rebuild the document from the job queue (``schedule_course()``).
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import IntegerField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Course
+
+INDEX_TABLE = 'courses_search_index'
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def get_max_results():
+    return getattr(settings, 'SEARCH_MAX_RESULTS', 1000)
+
+
+class BaseSearchBackend:
+    supports_index = True
+
+    def document_rows(self, courses):
+        """Yield ``(course_id, title, description, lesson_titles, lesson_content)``."""
+        for course in courses:
+            lessons = list(course.lessons.all())
+            yield (
+                course.pk,
+                course.title,
+                course.description,
+                ' '.join(lesson.title for lesson in lessons),
+                '\n'.join(lesson.content for lesson in lessons),
+            )
+
+    def index_courses(self, courses):
+        rows = list(self.document_rows(courses))
+        if rows:
+            self.remove_courses([row[0] for row in rows])
+            self.insert_rows(rows)
+        return len(rows)
+
+    def insert_rows(self, rows):
+        raise NotImplementedError
+
+    def remove_courses(self, course_ids):
+        raise NotImplementedError
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {INDEX_TABLE}')
+
+    def search_ids(self, query, limit):
+        raise NotImplementedError
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    # bm25 weights for title, description, lesson_titles, lesson_content
+    WEIGHTS = (10.0, 3.0, 4.0, 1.0)
+
+    def insert_rows(self, rows):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {INDEX_TABLE} '
+                f'(rowid, title, description, lesson_titles, lesson_content) '
+                f'VALUES (%s, %s, %s, %s, %s)',
+                rows,
+            )
+
+    def remove_courses(self, course_ids):
+        if not course_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(course_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {INDEX_TABLE} WHERE rowid IN ({placeholders})', list(course_ids))
+
+    def build_match(self, query):
+        # Quote every token so user input never reaches the FTS5 query syntax.
+        # Only the last word is matched as a prefix, for partially typed terms.
+        words = TOKEN_RE.findall(query)
+        tokens = ['"%s"' % word for word in words]
+        if words and len(words[-1]) >= 3:
+            tokens[-1] += '*'
+        return ' '.join(tokens)
+
+    def search_ids(self, query, limit):
+        match = self.build_match(query)
+        if not match:
+            return []
+        weights = ', '.join(str(weight) for weight in self.WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT c.id FROM {INDEX_TABLE} s '
+                f'JOIN courses_course c ON c.id = s.rowid '
+                f'WHERE {INDEX_TABLE} MATCH %s AND c.is_published '
+                f'ORDER BY bm25({INDEX_TABLE}, {weights}), c.created_at DESC '
+                f'LIMIT %s',
+                [match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    CONFIG = 'english'
+
+    def insert_rows(self, rows):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {INDEX_TABLE} (course_id, document) VALUES (%s, '
+                f"setweight(to_tsvector('{self.CONFIG}', %s), 'A') || "
+                f"setweight(to_tsvector('{self.CONFIG}', %s), 'B') || "
+                f"setweight(to_tsvector('{self.CONFIG}', %s), 'B') || "
+                f"setweight(to_tsvector('{self.CONFIG}', %s), 'C')) "
+                f'ON CONFLICT (course_id) DO UPDATE SET document = EXCLUDED.document',
+                rows,
+            )
+
+    def remove_courses(self, course_ids):
+        if not course_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {INDEX_TABLE} WHERE course_id = ANY(%s)', [list(course_ids)])
+
+    def search_ids(self, query, limit):
+        if not TOKEN_RE.search(query):
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT c.id FROM {INDEX_TABLE} s, websearch_to_tsquery('{self.CONFIG}', %s) q, courses_course c "
+                f'WHERE c.id = s.course_id AND s.document @@ q AND c.is_published '
+                f'ORDER BY ts_rank(s.document, q) DESC, c.created_at DESC '
+                f'LIMIT %s',
+                [query, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class ScanSearchBackend(BaseSearchBackend):
+    supports_index = False
+
+    def index_courses(self, courses):
+        return 0
+
+    def remove_courses(self, course_ids):
+        pass
+
+    def clear(self):
+        pass
+
+
+def get_backend():
+    if connection.vendor == 'sqlite':
+        return SQLiteSearchBackend()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return ScanSearchBackend()
+
+
+def index_course(course_id):
+    courses = Course.objects.filter(pk=course_id).prefetch_related('lessons')
+    get_backend().index_courses(courses)
+
+
+def schedule_course(course_id):
+    """Rebuild a course's document on the job queue after
+    ``SEARCH_REINDEX_DELAY`` seconds, so a burst of lesson edits costs one
+    rebuild instead of reading every lesson of the course on each save."""
+    from .jobs import is_eager
+    from .models import Job
+    from .tasks import reindex_course
+
+    queued = Job.objects.filter(name=reindex_course.name, status='queued', payload__course_id=course_id)
+    if is_eager() or not queued.exists():
+        reindex_course.enqueue(delay=getattr(settings, 'SEARCH_REINDEX_DELAY', 10), course_id=course_id)
+
+
+def remove_course(course_id):
+    get_backend().remove_courses([course_id])
+
+
+def search(query, limit=None):
+    """Return published courses matching ``query``, most relevant first.
+
+    Results are annotated with ``search_rank`` (0 for the best match).
+    """
+    backend = get_backend()
+    if not backend.supports_index:
+        return Course.objects.filter(
+            Q(title__icontains=query) | Q(description__icontains=query),
+            is_published=True
+        )
+
+    ids = backend.search_ids(query, limit or get_max_results())
+    if not ids:
+        return Course.objects.none()
+    return Course.objects.filter(pk__in=ids, is_published=True).annotate(
+        search_rank=rank_expression(ids)
+    ).order_by('search_rank')
+
+
+def rank_expression(ids):
+    # The ids come straight from the index as integers, so they are inlined
+    # rather than compiled into one When() per result.
+    whens = ' '.join(f'WHEN {int(pk)} THEN {position}' for position, pk in enumerate(ids))
+    return RawSQL(f'CASE "courses_course"."id" {whens} END', [], output_field=IntegerField())
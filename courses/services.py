@@ -1,5 +1,39 @@
-from django.db.models import Q
-from .models import Course, Lesson, Material, Enrollment
+import itertools
+import os
+from collections import Counter, namedtuple
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import images, progress, search, uploads
+from .cohorts import RowResult
+from .cache import CourseFragmentCache, EnrollmentCache, LessonOutlineCache, cache_is_shared
+from .models import (
+    Course, CourseQuerySet, DailyCourseStats, Lesson, Material, Enrollment, UploadChunk, UploadSession,
+)
+from .tasks import delete_files
+
+
+def _delete_files_later(names):
+    # Storage deletes can be slow (hundreds of files, remote storage), so
+    # they run on the job queue once the rows are gone.
+    names = [name for name in names if name]
+    if names:
+        delete_files.enqueue(names=names)
+
+
+def _adjust_counters(course_id, **deltas):
+    # A single UPDATE in the caller's transaction, so concurrent writers
+    # never lose each other's increments.
+    changes = {name: Greatest(F(name) + delta, 0) for name, delta in deltas.items() if delta}
+    if changes:
+        Course.objects.filter(pk=course_id).update(**changes)
+
 
 class CourseService:
     @staticmethod
@@ -15,6 +49,7 @@ class CourseService:
     
     @staticmethod
     def update_course(course, **kwargs):
+        CourseFragmentCache.invalidate(course)
         for key, value in kwargs.items():
             if hasattr(course, key):
                 setattr(course, key, value)
@@ -23,11 +58,36 @@ class CourseService:
     
     @staticmethod
     def delete_course(course):
-        course.delete()
+        CourseFragmentCache.invalidate(course)
+        with transaction.atomic():
+            names = [course.thumbnail.name, *images.derivative_names(course.thumbnail_derivatives)]
+            course.delete()
+            _delete_files_later(names)
     
+    @staticmethod
+    def reconcile_counters(courses=None, batch_size=1000):
+        """Recompute the counter columns of the courses (all by default)
+        whose counters have drifted. Returns the number of courses fixed."""
+        courses = Course.objects.all() if courses is None else courses
+        drifted = list(
+            courses.with_actual_counts().exclude(
+                lesson_count=F('actual_lesson_count'),
+                material_count=F('actual_material_count'),
+                enrollment_count=F('actual_enrollment_count'),
+            ).order_by('pk').values_list('pk', flat=True)
+        )
+        for start in range(0, len(drifted), batch_size):
+            batch = Course.objects.filter(pk__in=drifted[start:start + batch_size]).with_actual_counts()
+            batch.update(
+                lesson_count=F('actual_lesson_count'),
+                material_count=F('actual_material_count'),
+                enrollment_count=F('actual_enrollment_count'),
+            )
+        return len(drifted)
+
     @staticmethod
     def get_published_courses():
-        return Course.objects.filter(is_published=True)
+        return Course.objects.published().for_listing()
     
     @staticmethod
     def get_author_courses(author):
@@ -35,20 +95,55 @@ class CourseService:
     
     @staticmethod
     def search_courses(query):
-        return Course.objects.filter(
-            Q(title__icontains=query) | Q(description__icontains=query),
-            is_published=True
-        )
+        return search.search(query).for_listing()
+
+    @staticmethod
+    async def asearch_courses(query):
+        # The ranked ids come from a raw cursor query, which is sync-only.
+        return await sync_to_async(CourseService.search_courses)(query)
+
+    @staticmethod
+    async def aget_featured_courses(limit):
+        return [course async for course in CourseService.get_published_courses()[:limit]]
+
+OutlineEntry = namedtuple('OutlineEntry', 'id title order')
+
+
+class LessonOutline:
+    """A course's lessons in display order, for navigation between them."""
+
+    def __init__(self, entries):
+        self.entries = [OutlineEntry(*entry) for entry in entries]
+        self.positions = {entry.id: i for i, entry in enumerate(self.entries)}
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def neighbours(self, lesson_id):
+        """Return the ``(previous, next)`` entries around a lesson; either
+        is None at the ends of the course."""
+        position = self.positions.get(lesson_id)
+        if position is None:
+            return None, None
+        previous = self.entries[position - 1] if position else None
+        following = self.entries[position + 1] if position + 1 < len(self.entries) else None
+        return previous, following
+
 
 class LessonService:
     @staticmethod
     def create_lesson(course, title, content, order=0):
-        lesson = Lesson.objects.create(
-            course=course,
-            title=title,
-            content=content,
-            order=order
-        )
+        with transaction.atomic():
+            lesson = Lesson.objects.create(
+                course=course,
+                title=title,
+                content=content,
+                order=order
+            )
+            _adjust_counters(course.pk, lesson_count=1)
         return lesson
     
     @staticmethod
@@ -61,47 +156,360 @@ class LessonService:
     
     @staticmethod
     def delete_lesson(lesson):
-        lesson.delete()
+        with transaction.atomic():
+            material_count = lesson.materials.count()
+            lesson.delete()
+            _adjust_counters(lesson.course_id, lesson_count=-1, material_count=-material_count)
     
     @staticmethod
     def get_course_lessons(course):
-        return Lesson.objects.filter(course=course)
+        return Lesson.objects.filter(course=course).without_content()
+
+    @staticmethod
+    async def aget_course_lessons(course):
+        return [lesson async for lesson in LessonService.get_course_lessons(course)]
+
+    @staticmethod
+    def outline_rows(course_id):
+        return Lesson.objects.filter(course_id=course_id).values_list('id', 'title', 'order')
+
+    @staticmethod
+    def get_outline(course_id):
+        rows = LessonService.outline_rows(course_id)
+        return LessonOutline(LessonOutlineCache.get_entries(course_id, lambda: list(rows)))
+
+    @staticmethod
+    async def aget_outline(course_id):
+        rows = LessonService.outline_rows(course_id)
+
+        async def load():
+            return [row async for row in rows]
+
+        return LessonOutline(await LessonOutlineCache.aget_entries(course_id, load))
 
 class MaterialService:
     @staticmethod
     def create_material(lesson, title, file, material_type='document', description=''):
-        material = Material.objects.create(
-            lesson=lesson,
-            title=title,
-            file=file,
-            material_type=material_type,
-            description=description
-        )
+        with transaction.atomic():
+            material = Material.objects.create(
+                lesson=lesson,
+                title=title,
+                file=file,
+                original_filename=os.path.basename(file.name or '')[:255],
+                material_type=material_type,
+                description=description
+            )
+            _adjust_counters(lesson.course_id, material_count=1)
         return material
     
     @staticmethod
     def delete_material(material):
-        material.file.delete()
-        material.delete()
+        with transaction.atomic():
+            material.delete()
+            _adjust_counters(material.lesson.course_id, material_count=-1)
     
     @staticmethod
     def get_lesson_materials(lesson):
         return Material.objects.filter(lesson=lesson)
 
+    @staticmethod
+    async def aget_lesson_materials(lesson):
+        return [material async for material in MaterialService.get_lesson_materials(lesson)]
+
+class UploadService:
+    @staticmethod
+    def initiate_upload(user, lesson, filename, size, title, material_type='document', description='', sha256=''):
+        if size > uploads.get_max_size():
+            raise uploads.UploadError('The file is too large.', status=413)
+        session = UploadSession.objects.create(
+            user=user,
+            lesson=lesson,
+            filename=filename,
+            size=size,
+            chunk_size=uploads.get_chunk_size(),
+            sha256=sha256.lower(),
+            title=title,
+            material_type=material_type,
+            description=description
+        )
+        uploads.preallocate(uploads.part_path(session), size)
+        return session
+
+    @staticmethod
+    def receive_chunk(session, index, stream, length, sha256=''):
+        """Write chunk ``index`` from ``stream``. Re-sending a chunk overwrites it."""
+        if session.status != 'uploading':
+            raise uploads.UploadError('This upload is no longer accepting chunks.', status=409)
+        if not 0 <= index < session.chunk_count:
+            raise uploads.UploadError(f'Chunk index must be between 0 and {session.chunk_count - 1}.')
+        expected = session.chunk_length(index)
+        if length != expected:
+            raise uploads.UploadError(f'Chunk {index} must be {expected} bytes, got {length}.')
+
+        digest = uploads.write_at(uploads.part_path(session), index * session.chunk_size, stream, expected)
+        if sha256 and sha256.lower() != digest:
+            raise uploads.UploadError(f'Checksum mismatch for chunk {index}.', status=422)
+        UploadChunk.objects.update_or_create(
+            session=session, index=index, defaults={'size': expected, 'sha256': digest}
+        )
+        UploadSession.objects.filter(pk=session.pk).update(updated_at=timezone.now())
+        return digest
+
+    @staticmethod
+    def missing_chunks(session):
+        received = set(session.chunks.values_list('index', flat=True))
+        return [index for index in range(session.chunk_count) if index not in received]
+
+    @staticmethod
+    def complete_upload(session):
+        """Verify the assembled file and turn it into a Material."""
+        # Only one request may complete a session.
+        if not UploadSession.objects.filter(pk=session.pk, status='uploading').update(status='completing'):
+            raise uploads.UploadError('This upload is already being completed.', status=409)
+        path = uploads.part_path(session)
+        try:
+            missing = UploadService.missing_chunks(session)
+            if missing:
+                raise uploads.UploadError(f'{len(missing)} chunks are missing, starting with {missing[0]}.', status=409)
+            digest = uploads.file_sha256(path)
+            if session.sha256 and digest != session.sha256:
+                # Every chunk matched its own checksum, so the client declared
+                # the wrong file; start over.
+                session.chunks.all().delete()
+                raise uploads.UploadError('Checksum mismatch for the assembled file.', status=422)
+            with transaction.atomic():
+                with uploads.AssembledFile(path, session.filename, sha256=digest) as assembled:
+                    material = MaterialService.create_material(
+                        lesson=session.lesson,
+                        title=session.title,
+                        file=assembled,
+                        material_type=session.material_type,
+                        description=session.description
+                    )
+                session.chunks.all().delete()
+                UploadSession.objects.filter(pk=session.pk).update(status='complete', material=material, sha256=digest)
+        except BaseException:
+            UploadSession.objects.filter(pk=session.pk, status='completing').update(status='uploading')
+            raise
+        # Left behind if the content was already stored.
+        path.unlink(missing_ok=True)
+        session.status, session.material, session.sha256 = 'complete', material, digest
+        return material
+
+    @staticmethod
+    def expire_sessions(before):
+        """Delete unfinished sessions not touched since ``before`` and their part files."""
+        stale = UploadSession.objects.exclude(status='complete').filter(updated_at__lt=before)
+        count = 0
+        for session in stale.iterator():
+            uploads.part_path(session).unlink(missing_ok=True)
+            session.delete()
+            count += 1
+        return count
+
 class EnrollmentService:
     @staticmethod
     def enroll_user(user, course):
-        enrollment, created = Enrollment.objects.get_or_create(user=user, course=course)
+        with transaction.atomic():
+            enrollment, created = Enrollment.objects.get_or_create(user=user, course=course)
+            if created:
+                _adjust_counters(course.pk, enrollment_count=1)
+        # Even when nothing changed, so a stale cached set heals on retry.
+        EnrollmentService._invalidate(user)
         return enrollment
     
     @staticmethod
     def unenroll_user(user, course):
-        Enrollment.objects.filter(user=user, course=course).delete()
+        with transaction.atomic():
+            deleted, _ = Enrollment.objects.filter(user=user, course=course).delete()
+            if deleted:
+                _adjust_counters(course.pk, enrollment_count=-deleted)
+        EnrollmentService._invalidate(user)
+
+    @staticmethod
+    def bulk_enroll(rows, batch_size=5000):
+        """Enroll ``(line, username, course_slug)`` rows, e.g. from
+        ``cohorts.read_csv``. Yields a ``cohorts.RowResult`` per row, in order.
+
+        Rows are consumed lazily in batches; each batch costs a fixed number
+        of queries and commits on its own. The enrollment counters of the
+        courses enrolled in are recounted once, after the last batch.
+        """
+        course_ids, enrolled_courses = {}, set()
+        rows = iter(rows)
+        while batch := list(itertools.islice(rows, batch_size)):
+            yield from EnrollmentService._enroll_batch(batch, course_ids, enrolled_courses)
+        if enrolled_courses:
+            # Rows skipped as conflicts were counted by the batches.
+            CourseService.reconcile_counters(Course.objects.filter(pk__in=enrolled_courses))
+
+    @staticmethod
+    def _enroll_batch(batch, course_ids, enrolled_courses):
+        usernames = {username for _, username, _ in batch if username}
+        user_ids = dict(get_user_model().objects.filter(username__in=usernames).values_list('username', 'pk'))
+        # Course ids are remembered across batches; cohorts reuse a few courses.
+        unseen = {slug for _, _, slug in batch if slug and slug not in course_ids}
+        if unseen:
+            course_ids.update(dict.fromkeys(unseen))
+            course_ids.update(Course.objects.filter(slug__in=unseen).values_list('slug', 'pk'))
+
+        wanted = {
+            (user_ids[username], course_ids[slug]) for _, username, slug in batch
+            if username in user_ids and course_ids.get(slug)
+        }
+        existing = set(
+            Enrollment.objects.filter(
+                user_id__in={user_id for user_id, _ in wanted}, course_id__in={course_id for _, course_id in wanted},
+            ).values_list('user_id', 'course_id')
+        ) if wanted else set()
+
+        results, new = [], set()
+        for line, username, slug in batch:
+            if not username or not slug:
+                status = 'invalid'
+            elif username not in user_ids:
+                status = 'unknown_user'
+            elif not course_ids.get(slug):
+                status = 'unknown_course'
+            else:
+                pair = (user_ids[username], course_ids[slug])
+                if pair in new:
+                    status = 'duplicate'
+                elif pair in existing:
+                    status = 'already_enrolled'
+                else:
+                    status = 'enrolled'
+                    new.add(pair)
+            results.append(RowResult(line, username, slug, status))
+
+        if new:
+            with transaction.atomic():
+                # ignore_conflicts covers rows enrolled concurrently since the check.
+                Enrollment.objects.bulk_create(
+                    [Enrollment(user_id=user_id, course_id=course_id) for user_id, course_id in new],
+                    ignore_conflicts=True,
+                )
+                for course_id, count in Counter(course_id for _, course_id in new).items():
+                    _adjust_counters(course_id, enrollment_count=count)
+                enrolled_courses.update(course_id for _, course_id in new)
+                enrolled_users = sorted({user_id for user_id, _ in new})
+                transaction.on_commit(lambda: EnrollmentCache.invalidate(*enrolled_users))
+        return results
+
+    @staticmethod
+    def _invalidate(user):
+        user._enrolled_course_ids = None
+        transaction.on_commit(lambda: EnrollmentCache.invalidate(user.pk))
     
+    @staticmethod
+    def get_enrolled_course_ids(user):
+        """Return a frozenset of the ids of every course ``user`` is enrolled in.
+
+        The set comes from the shared cache and is kept on the user object for
+        the rest of the request.
+        """
+        if not user.is_authenticated:
+            return frozenset()
+        if getattr(user, '_enrolled_course_ids', None) is None:
+            user._enrolled_course_ids = EnrollmentCache.get_course_ids(
+                user.pk, lambda: Enrollment.objects.filter(user=user).values_list('course_id', flat=True)
+            )
+        return user._enrolled_course_ids
+
+    @staticmethod
+    async def aget_enrolled_course_ids(user):
+        if not user.is_authenticated:
+            return frozenset()
+        if getattr(user, '_enrolled_course_ids', None) is None:
+            async def load():
+                return [pk async for pk in Enrollment.objects.filter(user=user).values_list('course_id', flat=True)]
+            user._enrolled_course_ids = await EnrollmentCache.aget_course_ids(user.pk, load)
+        return user._enrolled_course_ids
+
     @staticmethod
     def is_enrolled(user, course):
-        return Enrollment.objects.filter(user=user, course=course).exists()
+        if not user.is_authenticated:
+            return False
+        if getattr(user, '_enrolled_course_ids', None) is None and not cache_is_shared():
+            # Without a shared cache, one indexed EXISTS beats loading the set.
+            return Enrollment.objects.filter(user=user, course=course).exists()
+        return course.pk in EnrollmentService.get_enrolled_course_ids(user)
+
+    @staticmethod
+    async def ais_enrolled(user, course):
+        if not user.is_authenticated:
+            return False
+        if getattr(user, '_enrolled_course_ids', None) is None and not cache_is_shared():
+            return await Enrollment.objects.filter(user=user, course=course).aexists()
+        return course.pk in await EnrollmentService.aget_enrolled_course_ids(user)
+
+    @staticmethod
+    def filter_enrolled(user, courses):
+        """Return the ids of ``courses`` that ``user`` is enrolled in, for
+        marking listing cards without a query per card."""
+        enrolled = EnrollmentService.get_enrolled_course_ids(user)
+        return {course.pk for course in courses if course.pk in enrolled}
     
     @staticmethod
     def get_user_enrollments(user):
-        return Enrollment.objects.filter(user=user).select_related('course')
+        return Enrollment.objects.filter(user=user).select_related('course__author').only(
+            'id', 'enrolled_at', 'user_id', 'completed_count',
+            *[f'course__{field}' for field in CourseQuerySet.LISTING_FIELDS],
+        )
+
+class ProgressService:
+    """Lesson completion per enrollment, kept as a bitmap (see progress.py)."""
+
+    @staticmethod
+    def mark_complete(user, lesson):
+        """Record that ``user`` completed ``lesson``. Returns False if the
+        user is not enrolled in its course or had already completed it."""
+        row = Enrollment.objects.filter(user=user, course_id=lesson.course_id).values_list('pk', 'progress').first()
+        if row is None or lesson.progress_slot is None:
+            return False
+        slot = lesson.progress_slot
+        return progress.compare_and_set(
+            row[0], bytes(row[1]), lambda bitmap: None if progress.has(bitmap, slot) else progress.with_slot(bitmap, slot)
+        )
+
+class AnalyticsService:
+    """Reads the daily rollups kept by ``analytics.aggregate``; never the raw rows."""
+
+    @staticmethod
+    def get_author_daily_stats(author, days=30):
+        """Enrollments and downloads per day across ``author``'s courses for
+        the last ``days`` days, oldest first, including days without any."""
+        today = timezone.localdate()
+        start = today - timedelta(days=days - 1)
+        totals = {
+            row['day']: row
+            for row in DailyCourseStats.objects.filter(course__author=author, day__gte=start)
+            .values('day').annotate(
+                total_enrollments=Sum('enrollments'), total_downloads=Sum('downloads'), total_views=Sum('lesson_views'),
+            )
+        }
+        series = []
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            row = totals.get(day, {})
+            series.append({
+                'day': day,
+                'enrollments': row.get('total_enrollments', 0),
+                'downloads': row.get('total_downloads', 0),
+                'lesson_views': row.get('total_views', 0),
+            })
+        return series
+
+    @staticmethod
+    def get_course_stats(courses, days=30):
+        """Return ``{course_id: (enrollments, downloads, lesson_views)}`` over the last ``days`` days."""
+        start = timezone.localdate() - timedelta(days=days - 1)
+        rows = (
+            DailyCourseStats.objects.filter(course__in=[course.pk for course in courses], day__gte=start)
+            .values('course_id').annotate(
+                total_enrollments=Sum('enrollments'), total_downloads=Sum('downloads'), total_views=Sum('lesson_views'),
+            )
+        )
+        return {
+            row['course_id']: (row['total_enrollments'], row['total_downloads'], row['total_views']) for row in rows
+        }
@@ -0,0 +1,124 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import http_cache, images, page_cache, search, storage
+from .cache import EnrollmentCache, LessonOutlineCache
+from .models import Course, Enrollment, Lesson, Material
+from .tasks import clear_progress_slot, delete_unreferenced_materials
+
+
+@receiver(post_save, sender=Course)
+def index_saved_course(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        # No lessons yet, so the document is cheap to build right away.
+        search.index_course(instance.pk)
+    else:
+        search.schedule_course(instance.pk)
+
+
+@receiver(post_save, sender=Course)
+def refresh_course_thumbnail(sender, instance, raw=False, **kwargs):
+    if not raw and images.needs_update(instance, 'thumbnail'):
+        images.schedule(instance, 'thumbnail')
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def refresh_profile_picture(sender, instance, raw=False, **kwargs):
+    if not raw and images.needs_update(instance, 'profile_picture'):
+        images.schedule(instance, 'profile_picture')
+
+
+@receiver(post_delete, sender=Course)
+def unindex_deleted_course(sender, instance, **kwargs):
+    search.remove_course(instance.pk)
+
+
+@receiver(post_save, sender=Lesson)
+def reindex_lesson_course(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    # Only the title and the content are indexed; reordering is not.
+    indexed = (instance.title, instance.content_hash)
+    if created or getattr(instance, '_indexed', None) != indexed:
+        search.schedule_course(instance.course_id)
+    instance._indexed = indexed
+
+
+@receiver(post_delete, sender=Lesson)
+def reindex_deleted_lesson_course(sender, instance, origin=None, **kwargs):
+    # Lessons removed as part of a course delete are dropped with the course.
+    if isinstance(origin, Course) or getattr(origin, 'model', None) is Course:
+        return
+    search.schedule_course(instance.course_id)
+
+
+@receiver(post_delete, sender=Lesson)
+def clear_deleted_lesson_progress(sender, instance, origin=None, **kwargs):
+    # Reordering keeps every lesson's progress slot; only a delete has to be
+    # removed from the students' bitmaps. A course delete drops them all.
+    if instance.progress_slot is None or isinstance(origin, Course) or getattr(origin, 'model', None) is Course:
+        return
+    clear_progress_slot.enqueue(course_id=instance.course_id, slot=instance.progress_slot)
+
+
+def release_material_files(names):
+    # Material files are shared between materials with the same content, so
+    # the job only deletes the ones no material references any more.
+    names = storage.release(names)
+    if names:
+        delete_unreferenced_materials.enqueue(names=names)
+
+
+@receiver(post_delete, sender=Material)
+def release_deleted_material_file(sender, instance, **kwargs):
+    # Covers the admin and cascades from lessons, courses and users too.
+    names = [instance.file.name]
+    transaction.on_commit(lambda: release_material_files(names))
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def invalidate_enrollment_cache(sender, instance, raw=False, **kwargs):
+    # Covers the admin and cascades from users and courses too.
+    if not raw:
+        transaction.on_commit(lambda: EnrollmentCache.invalidate(instance.user_id))
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_lesson_outline(sender, instance, raw=False, **kwargs):
+    # After the commit, so a reader cannot cache the outline from before it.
+    if not raw:
+        transaction.on_commit(lambda: LessonOutlineCache.invalidate(instance.course_id))
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def touch_lesson_course(sender, instance, raw=False, origin=None, **kwargs):
+    # The course page lists the lessons, and its ETag goes by updated_at.
+    if raw or isinstance(origin, Course) or getattr(origin, 'model', None) is Course:
+        return
+    Course.objects.filter(pk=instance.course_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def purge_course_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        keys = http_cache.course_keys(instance)
+        transaction.on_commit(lambda: page_cache.purge(*keys))
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def purge_lesson_course_pages(sender, instance, raw=False, origin=None, **kwargs):
+    # Course pages list the lessons and the cards show how many there are.
+    if raw or isinstance(origin, Course) or getattr(origin, 'model', None) is Course:
+        return
+    keys = [http_cache.CATALOG_KEY, http_cache.course_key(instance.course_id)]
+    transaction.on_commit(lambda: page_cache.purge(*keys))
@@ -0,0 +1,113 @@
+"""Unique course slugs, allocated without probing or retrying.
+
+``SlugCounter`` keeps, per base slug (the slugified title), the highest
+number used with it: the first course called "Python" gets ``python``, the
+next ``python-2``, then ``python-3``. ``allocate()`` locks the counters it
+needs, hands out the next numbers and raises the counters in a fixed number
+of queries however many slugs it allocates, so concurrent creates never
+pick the same slug and a popular title costs no more than a rare one.
+
+A slug such as ``python-3`` may also be a title of its own ("Python 3"),
+so every slug is counted under both readings and neither can be handed out
+again. Slugs chosen by hand (the admin, sample data, fixtures) must go
+through ``reserve()``, or ``claim()`` when a taken one should be numbered
+instead (imports); the migration that added the counters reserved every
+slug that existed then. Counters never go down, so the slug of a deleted
+course is not reused.
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils.text import slugify
+
+SLUG_LENGTH = 50
+# Leaves room for "-" and a seven-digit number.
+BASE_LENGTH = SLUG_LENGTH - 8
+FALLBACK_BASE = 'course'
+
+NUMBERED_RE = re.compile(r'^(.+)-([1-9][0-9]*)$')
+
+
+def base_for(title):
+    return slugify(title)[:BASE_LENGTH].strip('-') or FALLBACK_BASE
+
+
+def counts_for(slug):
+    """The counter values implied by ``slug`` being taken."""
+    counts = {slug: 1}
+    match = NUMBERED_RE.match(slug)
+    if match and int(match[2]) >= 2:
+        counts[match[1]] = int(match[2])
+    return counts
+
+
+def allocate(bases):
+    """Return a free slug for each base slug in ``bases``, in order."""
+    return claim([base[:BASE_LENGTH].strip('-') or FALLBACK_BASE for base in bases])
+
+
+def claim(slugs):
+    """Return each slug in ``slugs`` itself where it is free, else a
+    numbered one as ``allocate()`` would, in order. Unlike ``allocate()``,
+    a free slug longer than ``BASE_LENGTH`` is kept whole."""
+    if not slugs:
+        return []
+    bases = [slug[:BASE_LENGTH].strip('-') or FALLBACK_BASE for slug in slugs]
+    names = set()
+    for slug, base in zip(slugs, bases):
+        names.update(counts_for(slug))
+        names.update(counts_for(base))
+    with transaction.atomic():
+        last = lock(names)
+        claimed = []
+        for slug, base in zip(slugs, bases):
+            if last.get(slug):
+                number = last[base] + 1
+                slug = base if number == 1 else f'{base}-{number}'
+            for name, value in counts_for(slug).items():
+                last[name] = max(last.get(name, 0), value)
+            claimed.append(slug)
+        raise_counters(last)
+    return claimed
+
+
+def reserve(slugs):
+    """Count slugs chosen elsewhere, so that ``allocate()`` never hands
+    them out."""
+    values = {}
+    for slug in slugs:
+        for name, value in counts_for(slug).items():
+            values[name] = max(values.get(name, 0), value)
+    if values:
+        with transaction.atomic():
+            raise_counters(values)
+
+
+def lock(names):
+    """Lock the counters of ``names``, creating missing ones, and return
+    their values."""
+    from .models import SlugCounter
+
+    names = sorted(names)
+    SlugCounter.objects.bulk_create([SlugCounter(base=name) for name in names], ignore_conflicts=True)
+    # Rows are locked in base order, and a base sorts after its prefix, so
+    # two allocations always take shared locks in the same order.
+    rows = SlugCounter.objects.select_for_update().filter(base__in=names).order_by('base')
+    return dict(rows.values_list('base', 'last'))
+
+
+def raise_counters(values):
+    """Raise every counter in ``values`` to at least its value."""
+    from .models import SlugCounter
+
+    names = sorted(values)
+    SlugCounter.objects.bulk_create(
+        [SlugCounter(base=name, last=values[name]) for name in names], ignore_conflicts=True,
+    )
+    target = Case(
+        *[When(base=name, then=Value(values[name])) for name in names],
+        default=F('last'), output_field=PositiveIntegerField(),
+    )
+    SlugCounter.objects.filter(base__in=names).update(last=Greatest(F('last'), target))
@@ -0,0 +1,165 @@
+"""Content-addressed, deduplicating storage for course material files.
+
+Every file is stored once, named after the SHA-256 of its content::
+
+    blobs/3f/a2/3fa2...e9.pdf
+
+Saving a file whose content is already stored returns the existing name,
+so a PDF re-uploaded to ten lessons takes the space of one. A ``StoredBlob``
+row per file counts the materials that use it. ``release()`` drops
+references once material deletes commit; a blob is only removed from disk by
+``delete_if_unreferenced()`` once its count is zero. Both that and saving
+lock the blob row, so a file is never deleted while an upload of the same
+content is being attached to it.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+from collections import Counter
+
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+BLOB_DIR = 'blobs'
+READ_SIZE = 1024 * 1024
+
+
+def blob_name(sha256, extension=''):
+    return posixpath.join(BLOB_DIR, sha256[:2], sha256[2:4], sha256 + extension.lower())
+
+
+def is_blob_name(name):
+    return name.startswith(BLOB_DIR + '/')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from content in _save(), which never overwrites.
+        return name
+
+    def _save(self, name, content):
+        from .models import StoredBlob
+
+        extension = posixpath.splitext(name)[1][:16]
+        if hasattr(content, 'temporary_file_path'):
+            # Already on disk (large uploads, assembled chunked uploads):
+            # hash it in place and move it rather than copying it.
+            source, owned = content.temporary_file_path(), False
+            digest = getattr(content, 'sha256', None) or self.hash_path(source)
+        else:
+            source, digest = self.spool(content)
+            owned = True
+        size = os.path.getsize(source)
+        name = blob_name(digest, extension)
+
+        try:
+            with transaction.atomic():
+                blob, _ = StoredBlob.objects.select_for_update().get_or_create(
+                    name=name, defaults={'sha256': digest, 'size': size}
+                )
+                if not self.exists(name):
+                    path = self.path(name)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    file_move_safe(source, path)
+                    owned = False
+                    if self.file_permissions_mode is not None:
+                        os.chmod(path, self.file_permissions_mode)
+                StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+        finally:
+            if owned:
+                os.unlink(source)
+        return name
+
+    def spool(self, content):
+        """Copy ``content`` to a temporary file next to the blobs, hashing it
+        on the way. Returns ``(path, sha256)``."""
+        directory = self.path(BLOB_DIR)
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                for chunk in content.chunks(READ_SIZE):
+                    digest.update(chunk)
+                    handle.write(chunk)
+        except BaseException:
+            os.unlink(path)
+            raise
+        return path, digest.hexdigest()
+
+    def add_file(self, path, sha256, extension='', references=1):
+        """Store the file at ``path``, whose content hashes to ``sha256``,
+        with ``references`` more materials using it; the file is copied, not
+        moved, and only when its content is not stored yet. Returns the name."""
+        from .models import StoredBlob
+
+        name = blob_name(sha256, extension[:16])
+        with transaction.atomic():
+            blob, _ = StoredBlob.objects.select_for_update().get_or_create(
+                name=name, defaults={'sha256': sha256, 'size': os.path.getsize(path)}
+            )
+            if not self.exists(name):
+                with open(path, 'rb') as handle:
+                    source, digest = self.spool(File(handle))
+                if digest != sha256:
+                    os.unlink(source)
+                    raise ValueError(f'{path} does not match its SHA-256 {sha256}')
+                target = self.path(name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                file_move_safe(source, target)
+                if self.file_permissions_mode is not None:
+                    os.chmod(target, self.file_permissions_mode)
+            StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + references)
+        return name
+
+    def hash_path(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as handle:
+            while data := handle.read(READ_SIZE):
+                digest.update(data)
+        return digest.hexdigest()
+
+
+material_storage = ContentAddressedStorage()
+
+
+def get_material_storage():
+    return material_storage
+
+
+def release(names):
+    """Drop one reference per entry in ``names`` (``signals.py`` calls it
+    once a material delete commits). Returns the names that may now be unused."""
+    from .models import StoredBlob
+
+    counts = Counter(name for name in names if name)
+    for name, count in counts.items():
+        StoredBlob.objects.filter(name=name).update(ref_count=Greatest(F('ref_count') - count, 0))
+    return list(counts)
+
+
+def delete_if_unreferenced(name):
+    """Delete ``name`` from storage unless a material still uses it.
+    Returns the number of bytes freed."""
+    from .models import StoredBlob
+
+    with transaction.atomic():
+        blob = StoredBlob.objects.select_for_update().filter(name=name).first()
+        if blob is None:
+            if is_blob_name(name):
+                # Already removed by an earlier run.
+                return 0
+            # A file saved before deduplication; only one material used it.
+            size = material_storage.size(name) if material_storage.exists(name) else 0
+            material_storage.delete(name)
+            return size
+        if blob.ref_count > 0:
+            return 0
+        material_storage.delete(name)
+        blob.delete()
+        return blob.size
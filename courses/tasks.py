@@ -0,0 +1,34 @@
+from django.apps import apps
+from django.core.files.storage import default_storage
+
+from . import images, progress, search, storage
+from .jobs import task
+
+
+@task()
+def delete_files(names):
+    # Storage.delete() ignores files that are already gone, so a retried
+    # job finishes what the failed attempt started.
+    for name in names:
+        default_storage.delete(name)
+
+
+@task()
+def delete_unreferenced_materials(names):
+    for name in names:
+        storage.delete_if_unreferenced(name)
+
+
+@task(max_attempts=3)
+def generate_image_derivatives(model, pk, field_name):
+    images.generate(apps.get_model(model), pk, field_name)
+
+
+@task()
+def clear_progress_slot(course_id, slot):
+    progress.clear_slot(course_id, slot)
+
+
+@task()
+def reindex_course(course_id):
+    search.index_course(course_id)
@@ -0,0 +1,79 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from courses import images
+from courses.cache import CourseFragmentCache
+
+register = template.Library()
+
+
+class CourseFragmentNode(template.Node):
+    def __init__(self, nodelist, course, variant):
+        self.nodelist = nodelist
+        self.course = course
+        self.variant = variant
+
+    def render(self, context):
+        course = self.course.resolve(context)
+        variant = self.variant.resolve(context)
+        if variant not in CourseFragmentCache.VARIANTS:
+            raise template.TemplateSyntaxError(f'Unknown course fragment variant {variant!r}')
+
+        html = CourseFragmentCache.get(course, variant)
+        if html is None:
+            html = self.nodelist.render(context)
+            CourseFragmentCache.set(course, variant, html)
+        return html
+
+
+@register.tag
+def coursefragment(parser, token):
+    """
+    Cache the enclosed markup per course, e.g.::
+
+        {% coursefragment course "home" %} ... {% endcoursefragment %}
+
+    The fragment is reused until the course is saved or invalidated.
+    """
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a course and a variant name")
+    nodelist = parser.parse(('endcoursefragment',))
+    parser.delete_first_token()
+    return CourseFragmentNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
+
+
+@register.simple_tag
+def responsive_image(image, sizes='100vw', **attrs):
+    """
+    Render an image field with ``srcset`` from its derivatives, e.g.::
+
+        {% responsive_image course.thumbnail sizes="(max-width: 600px) 100vw, 350px" alt=course.title %}
+
+    Falls back to the original upload while derivatives are being generated.
+    """
+    if not image:
+        return ''
+    attrs.setdefault('alt', '')
+    if not images.is_current(image):
+        return format_html('<img src="{}"{}>', image.url, flatatt(attrs))
+
+    manifest = getattr(image.instance, images.manifest_field(image.field.name))
+    storage = image.storage
+
+    def srcset(fmt):
+        return ', '.join(f'{storage.url(name)} {width}w' for width, _, name in manifest[fmt])
+
+    # The src fallback is the largest JPEG up to the default width.
+    jpegs = manifest['jpeg']
+    width, height, name = next(
+        (entry for entry in reversed(jpegs) if entry[0] <= images.DEFAULT_WIDTH), jpegs[0]
+    )
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}"{}></picture>',
+        srcset('webp'), sizes, storage.url(name), srcset('jpeg'), sizes, width, height, flatatt(attrs),
+    )
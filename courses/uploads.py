@@ -0,0 +1,106 @@
+"""File handling for chunked, resumable material uploads.
+
+An upload session preallocates ``<CHUNKED_UPLOAD_ROOT>/<token>.part`` at
+its final size. Every chunk is streamed from the request straight to its
+offset in that file (``index * chunk_size``), so chunks can arrive in any
+order, in parallel, or again after a failure, and the file is never copied
+while it is assembled. On completion the part file is hashed once and moved
+into storage.
+"""
+import errno
+import hashlib
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def get_chunk_size():
+    return getattr(settings, 'CHUNKED_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+
+
+def get_max_size():
+    return getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', 5 * 1024 ** 3)
+
+
+def part_path(session):
+    root = Path(getattr(settings, 'CHUNKED_UPLOAD_ROOT', settings.BASE_DIR / '.uploads'))
+    return root / f'{session.token}.part'
+
+
+def preallocate(path, size):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_CREAT | os.O_WRONLY, 0o600)
+    try:
+        # Reserve the blocks up front so a full disk fails here, not
+        # halfway through the upload.
+        os.posix_fallocate(fd, 0, size)
+    except OSError as exc:
+        if exc.errno == errno.ENOSPC:
+            raise UploadError('Not enough disk space for this upload.', status=507)
+        # Zero-length files and file systems without fallocate support.
+        os.ftruncate(fd, size)
+    except AttributeError:
+        os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+
+def write_at(path, offset, stream, length):
+    """Copy ``length`` bytes from ``stream`` to ``path`` at ``offset`` and
+    return their SHA-256. Raise UploadError if the stream ends early."""
+    digest = hashlib.sha256()
+    written = 0
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        if not hasattr(os, 'pwrite'):
+            os.lseek(fd, offset, os.SEEK_SET)
+        while written < length:
+            data = stream.read(min(READ_SIZE, length - written))
+            if not data:
+                break
+            if hasattr(os, 'pwrite'):
+                # Positional writes never share a file offset, so parallel
+                # chunk requests cannot interleave.
+                os.pwrite(fd, data, offset + written)
+            else:
+                os.write(fd, data)
+            digest.update(data)
+            written += len(data)
+    finally:
+        os.close(fd)
+    if written != length:
+        raise UploadError(f'Chunk ended after {written} of {length} bytes.')
+    return digest.hexdigest()
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        while data := handle.read(1024 * 1024):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+class AssembledFile(File):
+    """The finished part file. File system storage moves it into place
+    instead of copying it, as it does for Django's temporary uploads.
+    ``sha256`` spares the material storage from hashing it again."""
+
+    def __init__(self, path, name, sha256=None):
+        super().__init__(open(path, 'rb'), name)
+        self.path = str(path)
+        self.size = os.path.getsize(path)
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.path
@@ -1,12 +1,17 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# Read-heavy catalog views have async versions for ASGI deployments.
+catalog = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
-    path('', views.home, name='home'),
-    path('courses/', views.course_list, name='course_list'),
-    path('courses/<slug:slug>/', views.course_detail, name='course_detail'),
+    path('', catalog.home, name='home'),
+    path('courses/', catalog.course_list, name='course_list'),
+    path('courses/<slug:slug>/', catalog.course_detail, name='course_detail'),
     path('courses/<slug:slug>/enroll/', views.enroll_course, name='enroll_course'),
-    path('courses/<slug:slug>/lessons/<int:lesson_id>/', views.lesson_detail, name='lesson_detail'),
+    path('courses/<slug:slug>/lessons/<int:lesson_id>/', catalog.lesson_detail, name='lesson_detail'),
+    path('courses/<slug:slug>/lessons/<int:lesson_id>/complete/', views.complete_lesson, name='complete_lesson'),
     path('my-courses/', views.my_courses, name='my_courses'),
     
     # Author dashboard
@@ -25,5 +30,11 @@ urlpatterns = [
     path('author/courses/<slug:slug>/lessons/<int:lesson_id>/materials/', views.manage_materials, name='manage_materials'),
     path('author/courses/<slug:slug>/lessons/<int:lesson_id>/materials/create/', views.create_material, name='create_material'),
     path('author/courses/<slug:slug>/lessons/<int:lesson_id>/materials/<int:material_id>/delete/', views.delete_material, name='delete_material'),
-    path('materials/<int:material_id>/download/', views.download_material, name='download_material'),
+    path('author/courses/<slug:slug>/lessons/<int:lesson_id>/materials/uploads/', views.initiate_upload, name='initiate_upload'),
+    path('materials/<int:material_id>/download/', catalog.download_material, name='download_material'),
+
+    # Chunked material uploads
+    path('uploads/<uuid:token>/', views.upload_status, name='upload_status'),
+    path('uploads/<uuid:token>/chunks/<int:index>/', views.upload_chunk, name='upload_chunk'),
+    path('uploads/<uuid:token>/complete/', views.complete_upload, name='complete_upload'),
 ]
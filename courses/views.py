@@ -1,26 +1,55 @@
+import json
+
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import FileResponse, Http404
-from .models import Course, Lesson, Material
-from .forms import CourseForm, LessonForm, MaterialForm
-from .services import CourseService, LessonService, MaterialService, EnrollmentService
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods
+from . import analytics, http_cache, markup, page_cache
+from .delivery import serve_file
+from .models import Course, Lesson, Material, UploadSession
+from .forms import ChunkedUploadForm, CourseForm, LessonForm, MaterialForm
+from .pagination import KeysetPaginator
+from .services import (
+    AnalyticsService, CourseService, LessonService, MaterialService, EnrollmentService, ProgressService, UploadService,
+)
+from .uploads import UploadError
+
+def paginate(request, queryset, per_page=None):
+    paginator = KeysetPaginator(queryset, per_page or settings.COURSES_PER_PAGE)
+    return paginator.get_page(after=request.GET.get('after'), before=request.GET.get('before'))
 
+@page_cache.anonymous_page
+@http_cache.catalog_page(http_cache.home_validator)
 def home(request):
-    courses = CourseService.get_published_courses()
-    return render(request, 'courses/home.html', {'courses': courses})
+    courses = list(CourseService.get_published_courses()[:settings.HOME_FEATURED_COURSES])
+    enrolled_ids = EnrollmentService.filter_enrolled(request.user, courses)
+    return render(request, 'courses/home.html', {'courses': courses, 'enrolled_ids': enrolled_ids})
 
+@page_cache.anonymous_page
+@http_cache.catalog_page(http_cache.course_list_validator)
 def course_list(request):
     query = request.GET.get('q', '')
     if query:
         courses = CourseService.search_courses(query)
     else:
         courses = CourseService.get_published_courses()
-    return render(request, 'courses/course_list.html', {'courses': courses, 'query': query})
+    page = paginate(request, courses)
+    enrolled_ids = EnrollmentService.filter_enrolled(request.user, page.object_list)
+    return render(request, 'courses/course_list.html', {
+        'courses': page.object_list,
+        'page': page,
+        'query': query,
+        'enrolled_ids': enrolled_ids,
+    })
 
+@page_cache.anonymous_page
+@http_cache.catalog_page(http_cache.course_detail_validator)
 def course_detail(request, slug):
-    course = get_object_or_404(Course, slug=slug, is_published=True)
-    lessons = LessonService.get_course_lessons(course)
+    course = get_object_or_404(Course.objects.published().for_detail(), slug=slug)
+    lessons = LessonService.get_outline(course.pk)
     is_enrolled = False
     if request.user.is_authenticated:
         is_enrolled = EnrollmentService.is_enrolled(request.user, course)
@@ -31,13 +60,16 @@ def course_detail(request, slug):
     })
 
 def lesson_detail(request, slug, lesson_id):
-    course = get_object_or_404(Course, slug=slug, is_published=True)
-    lesson = get_object_or_404(Lesson, id=lesson_id, course=course)
+    # The raw content is only read when the compiled HTML is stale.
+    lesson = get_object_or_404(
+        Lesson.objects.select_related('course').defer('content'),
+        id=lesson_id, course__slug=slug, course__is_published=True,
+    )
+    course = lesson.course
     
     if request.user.is_authenticated:
-        is_enrolled = EnrollmentService.is_enrolled(request.user, course)
-        is_author = course.author == request.user
-        if not (is_enrolled or is_author):
+        is_author = course.author_id == request.user.pk
+        if not (is_author or EnrollmentService.is_enrolled(request.user, course)):
             messages.error(request, 'You must enroll in this course to view lessons.')
             return redirect('course_detail', slug=slug)
     else:
@@ -45,12 +77,35 @@ def lesson_detail(request, slug, lesson_id):
         return redirect('login')
     
     materials = MaterialService.get_lesson_materials(lesson)
+    outline = LessonService.get_outline(course.pk)
+    previous_lesson, next_lesson = outline.neighbours(lesson.pk)
+    content_html, toc = markup.lesson_content(lesson)
+    analytics.record_lesson_view(request.user, lesson)
     return render(request, 'courses/lesson_detail.html', {
         'course': course,
         'lesson': lesson,
-        'materials': materials
+        'content_html': content_html,
+        'toc': toc,
+        'materials': materials,
+        'outline': outline,
+        'previous_lesson': previous_lesson,
+        'next_lesson': next_lesson,
     })
 
+@login_required
+@require_http_methods(['POST'])
+def complete_lesson(request, slug, lesson_id):
+    lesson = get_object_or_404(
+        Lesson.objects.only('id', 'course_id', 'progress_slot'),
+        id=lesson_id, course__slug=slug, course__is_published=True,
+    )
+    if ProgressService.mark_complete(request.user, lesson):
+        messages.success(request, 'Lesson marked as complete.')
+    _, next_lesson = LessonService.get_outline(lesson.course_id).neighbours(lesson.pk)
+    if next_lesson:
+        return redirect('lesson_detail', slug=slug, lesson_id=next_lesson.id)
+    return redirect('course_detail', slug=slug)
+
 @login_required
 def enroll_course(request, slug):
     course = get_object_or_404(Course, slug=slug, is_published=True)
@@ -69,8 +124,22 @@ def author_dashboard(request):
         messages.error(request, 'You must be an author to access this page.')
         return redirect('home')
     
-    courses = CourseService.get_author_courses(request.user)
-    return render(request, 'courses/author_dashboard.html', {'courses': courses})
+    page = paginate(request, CourseService.get_author_courses(request.user))
+    days = settings.AUTHOR_STATS_DAYS
+    daily_stats = AnalyticsService.get_author_daily_stats(request.user, days)
+    course_stats = AnalyticsService.get_course_stats(page.object_list, days)
+    for course in page.object_list:
+        course.recent_enrollments, course.recent_downloads, course.recent_views = course_stats.get(course.pk, (0, 0, 0))
+    return render(request, 'courses/author_dashboard.html', {
+        'courses': page.object_list,
+        'page': page,
+        'stats_days': days,
+        'daily_stats': daily_stats,
+        'stats_max': max([1, *(max(day['enrollments'], day['downloads']) for day in daily_stats)]),
+        'total_enrollments': sum(day['enrollments'] for day in daily_stats),
+        'total_downloads': sum(day['downloads'] for day in daily_stats),
+        'total_views': sum(day['lesson_views'] for day in daily_stats),
+    })
 
 @login_required
 def create_course(request):
@@ -122,7 +191,7 @@ def delete_course(request, slug):
 @login_required
 def manage_lessons(request, slug):
     course = get_object_or_404(Course, slug=slug, author=request.user)
-    lessons = LessonService.get_course_lessons(course)
+    lessons = LessonService.get_course_lessons(course).with_material_count()
     return render(request, 'courses/manage_lessons.html', {'course': course, 'lessons': lessons})
 
 @login_required
@@ -196,7 +265,77 @@ def create_material(request, slug, lesson_id):
             return redirect('manage_materials', slug=slug, lesson_id=lesson_id)
     else:
         form = MaterialForm()
-    return render(request, 'courses/material_form.html', {'form': form, 'course': course, 'lesson': lesson})
+    return render(request, 'courses/material_form.html', {
+        'form': form,
+        'course': course,
+        'lesson': lesson,
+        'chunked_upload_threshold': settings.CHUNKED_UPLOAD_CHUNK_SIZE,
+    })
+
+def upload_session_data(session):
+    return {
+        'url': reverse('upload_status', args=[session.token]),
+        'status': session.status,
+        'size': session.size,
+        'chunk_size': session.chunk_size,
+        'chunk_count': session.chunk_count,
+        'missing': UploadService.missing_chunks(session) if session.status != 'complete' else [],
+    }
+
+def get_upload_session(request, token):
+    return get_object_or_404(UploadSession.objects.select_related('lesson__course'), token=token, user=request.user)
+
+@login_required
+@require_http_methods(['POST'])
+def initiate_upload(request, slug, lesson_id):
+    course = get_object_or_404(Course, slug=slug, author=request.user)
+    lesson = get_object_or_404(Lesson, id=lesson_id, course=course)
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Expected a JSON body.'}, status=400)
+    form = ChunkedUploadForm(data if isinstance(data, dict) else {})
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    try:
+        session = UploadService.initiate_upload(user=request.user, lesson=lesson, **form.cleaned_data)
+    except UploadError as exc:
+        return JsonResponse({'error': str(exc)}, status=exc.status)
+    return JsonResponse(upload_session_data(session), status=201)
+
+@login_required
+@require_http_methods(['GET'])
+def upload_status(request, token):
+    return JsonResponse(upload_session_data(get_upload_session(request, token)))
+
+@login_required
+@require_http_methods(['PUT'])
+def upload_chunk(request, token, index):
+    session = get_upload_session(request, token)
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        digest = UploadService.receive_chunk(
+            session, index, request, length, sha256=request.headers.get('X-Chunk-SHA256', '')
+        )
+    except UploadError as exc:
+        return JsonResponse({'error': str(exc)}, status=exc.status)
+    return JsonResponse({'index': index, 'sha256': digest})
+
+@login_required
+@require_http_methods(['POST'])
+def complete_upload(request, token):
+    session = get_upload_session(request, token)
+    try:
+        material = UploadService.complete_upload(session)
+    except UploadError as exc:
+        return JsonResponse({'error': str(exc), **upload_session_data(session)}, status=exc.status)
+    messages.success(request, 'Material uploaded successfully!')
+    lesson = session.lesson
+    return JsonResponse({
+        'material_id': material.pk,
+        'sha256': session.sha256,
+        'redirect_url': reverse('manage_materials', args=[lesson.course.slug, lesson.pk]),
+    })
 
 @login_required
 def delete_material(request, slug, lesson_id, material_id):
@@ -212,16 +351,18 @@ def delete_material(request, slug, lesson_id, material_id):
 
 @login_required
 def download_material(request, material_id):
-    material = get_object_or_404(Material, id=material_id)
+    material = get_object_or_404(Material.objects.select_related('lesson__course'), id=material_id)
     course = material.lesson.course
     
-    is_author = course.author == request.user
-    is_enrolled = EnrollmentService.is_enrolled(request.user, course)
+    is_author = course.author_id == request.user.pk
     
-    if not (is_author or is_enrolled):
+    if not (is_author or EnrollmentService.is_enrolled(request.user, course)):
         raise Http404("You don't have permission to download this material")
     
     try:
-        return FileResponse(material.file.open('rb'), as_attachment=True, filename=material.file.name.split('/')[-1])
+        response = serve_file(request, material.file, material.download_filename)
     except FileNotFoundError:
         raise Http404("File not found")
+    if analytics.is_new_download(request, response):
+        analytics.record_download(request.user, material)
+    return response
@@ -1,14 +1,23 @@
 """Gunicorn configuration file."""
 
 import multiprocessing
+import os
+import sys
 
 # Server socket
 bind = "0.0.0.0:8000"
 backlog = 2048
 
 # Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+# GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker serves main.asgi:application
+# on an event loop (pip install uvicorn-worker); combine it with ASYNC_VIEWS=1.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+if worker_class == "sync":
+    default_workers = multiprocessing.cpu_count() * 2 + 1
+else:
+    # Each async worker multiplexes many connections, so one per core is enough.
+    default_workers = multiprocessing.cpu_count() + 1
+workers = int(os.environ.get("GUNICORN_WORKERS", default_workers))
 worker_connections = 1000
 timeout = 30
 keepalive = 2
@@ -33,3 +42,10 @@ tmp_upload_dir = None
 # SSL (uncomment and configure if needed)
 # keyfile = None
 # certfile = None
+
+
+def worker_exit(server, worker):
+    """Write the access events still buffered in the exiting worker."""
+    events = sys.modules.get("courses.events")
+    if events is not None:
+        events.flush()
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from main.database import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -60,6 +63,11 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "main.urls"
 
+# Route the catalog views (home, course list/detail, lessons, downloads) to
+# their async versions in courses/async_views.py. Enable this when serving
+# main.asgi with the uvicorn worker; see GUNICORN_SETUP.md.
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS", "").lower() in ("1", "true", "yes")
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -82,15 +90,82 @@ WSGI_APPLICATION = "main.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
+#
+# Configured from DATABASE_URL, DB_POOL*, DB_CONN_MAX_AGE and SQLITE_TUNED;
+# see main/database.py. Defaults to db.sqlite3 in BASE_DIR. PostgreSQL needs
+# the "postgres" extra (psycopg with its connection pool).
 
 DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+    "default": database_config(BASE_DIR),
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+#
+# CACHE_BACKEND selects the backend: "locmem" (default, per process),
+# "file" or "db" (shared across gunicorn workers). Run
+# `python manage.py createcachetable` once before using "db".
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "locmem")
+
+if CACHE_BACKEND == "file":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get("CACHE_LOCATION", str(BASE_DIR / ".cache")),
+        }
+    }
+elif CACHE_BACKEND == "db":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": os.environ.get("CACHE_LOCATION", "django_cache"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "e-learning-site",
+        }
+    }
+
+# Whether every web and worker process sees the same cache entries. A
+# locmem cache is private to its process, so an invalidation only reaches
+# the process that made it: caches that authorize access (enrollments) are
+# skipped under it and lesson outlines kept only briefly. Set
+# CACHE_SHARED=1 when the site runs as one process.
+CACHE_SHARED = CACHE_BACKEND != "locmem" or os.environ.get("CACHE_SHARED", "").lower() in ("1", "true", "yes")
+
+# Seconds a rendered course card fragment stays cached.
+COURSE_FRAGMENT_CACHE_TIMEOUT = 60 * 60
+# Seconds a user's cached set of enrolled course ids is kept.
+ENROLLMENT_CACHE_TIMEOUT = 24 * 60 * 60
+# Seconds a course's cached lesson outline is kept.
+LESSON_OUTLINE_CACHE_TIMEOUT = 24 * 60 * 60
+# The same when the cache is not shared (CACHE_SHARED): other processes
+# see lesson changes in the sidebar and navigation this many seconds late.
+LESSON_OUTLINE_LOCAL_CACHE_TIMEOUT = 5
+
+# Cache-Control for anonymous catalog pages (see courses/http_cache.py):
+# browsers revalidate after CATALOG_MAX_AGE seconds, shared caches such as
+# a CDN after CATALOG_SHARED_MAX_AGE.
+CATALOG_MAX_AGE = int(os.environ.get("CATALOG_MAX_AGE", "0"))
+CATALOG_SHARED_MAX_AGE = int(os.environ.get("CATALOG_SHARED_MAX_AGE", "60"))
+# Header listing the surrogate keys of a page for targeted CDN purges,
+# e.g. "Surrogate-Key" (Fastly) or "Cache-Tag" (Cloudflare). Off when empty.
+CATALOG_SURROGATE_KEY_HEADER = os.environ.get("CATALOG_SURROGATE_KEY_HEADER", "")
+# Seconds an anonymous catalog page stays in the full-page cache (see
+# courses/page_cache.py); 0 turns the cache off. Writes to courses and
+# lessons purge it, enrollment counts may lag by this much.
+PAGE_CACHE_TIMEOUT = int(os.environ.get("PAGE_CACHE_TIMEOUT", "60"))
+# Seconds the request rendering a missing page holds its lock, and the
+# longest other requests for that page wait for it before rendering too.
+PAGE_CACHE_LOCK_TIMEOUT = 10
+PAGE_CACHE_LOCK_WAIT = 2
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -135,8 +210,54 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Background jobs (courses/jobs.py) are run by `python manage.py run_worker`.
+# JOBS_EAGER=1 runs them in-process when the transaction commits instead.
+JOBS_EAGER = os.environ.get("JOBS_EAGER", "").lower() in ("1", "true", "yes")
+# Seconds after which a job whose worker died is handed to another worker.
+JOB_LOCK_TIMEOUT = 10 * 60
+
+# Widths (px) of the resized JPEG/WebP copies made of course thumbnails and
+# profile pictures. They are generated by a background job after upload.
+IMAGE_DERIVATIVE_WIDTHS = (160, 320, 640, 1280)
+
+# How material downloads are delivered after the permission check:
+# "python" streams from the worker, "x-accel-redirect" (nginx) and
+# "x-sendfile" (Apache/lighttpd) hand the transfer to the front proxy.
+MATERIAL_DELIVERY_MODE = os.environ.get("MATERIAL_DELIVERY_MODE", "python")
+# Internal nginx location that maps onto MEDIA_ROOT for X-Accel-Redirect.
+MATERIAL_X_ACCEL_PREFIX = "/protected-media/"
+
+# Chunked material uploads: parts are assembled in CHUNKED_UPLOAD_ROOT (keep it
+# on the same file system as MEDIA_ROOT so finished files are moved, not
+# copied). Files larger than one chunk use the chunked API from the upload form.
+CHUNKED_UPLOAD_ROOT = BASE_DIR / ".uploads"
+CHUNKED_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+CHUNKED_UPLOAD_MAX_SIZE = 5 * 1024 * 1024 * 1024
+# Hours after which an unfinished upload is removed by expire_uploads.
+CHUNKED_UPLOAD_EXPIRY_HOURS = 24
+
 AUTH_USER_MODEL = "users.User"
 
+# Page size for course listings (home shows a fixed number of featured courses).
+COURSES_PER_PAGE = 12
+HOME_FEATURED_COURSES = 6
+# Days of enrollment and download history on the author dashboard, read from
+# the rollups that aggregate_stats maintains.
+AUTHOR_STATS_DAYS = 30
+
+# Lesson views and downloads are buffered per process and written in
+# batches of this size, or once the oldest is this many seconds old.
+ACCESS_EVENT_BUFFER_SIZE = 200
+ACCESS_EVENT_FLUSH_INTERVAL = 10
+# Raw events older than this are removed by prune_events; the daily rollups are kept.
+ACCESS_EVENT_RETENTION_DAYS = 90
+
+# Upper bound on ranked results returned by the full-text course search.
+SEARCH_MAX_RESULTS = 1000
+# Seconds a course's search document waits on the job queue after a course
+# or lesson edit, so a burst of edits is indexed once.
+SEARCH_REINDEX_DELAY = 10
+
 LOGIN_URL = "login"
 LOGIN_REDIRECT_URL = "home"
 LOGOUT_REDIRECT_URL = "home"
@@ -13,6 +13,12 @@ fi
 echo "Running migrations..."
 poetry run python manage.py migrate
 
+# Start a background job worker and stop it with the server
+echo "Starting background job worker..."
+poetry run python manage.py run_worker &
+WORKER_PID=$!
+trap 'kill $WORKER_PID' EXIT
+
 # Start the server
 echo "Starting development server..."
 echo "Access the application at: http://localhost:8000/"
@@ -139,4 +139,103 @@ document.addEventListener('DOMContentLoaded', function() {
     courseCards.forEach(card => {
         observer.observe(card);
     });
+
+    // Chunked, resumable uploads for large material files
+    const chunkedForm = document.querySelector('form[data-chunked-upload-url]');
+    if (chunkedForm) {
+        chunkedForm.addEventListener('submit', function(e) {
+            const file = chunkedForm.querySelector('input[type="file"]').files[0];
+            if (e.defaultPrevented || !file || file.size <= Number(chunkedForm.dataset.chunkedThreshold)) {
+                return;
+            }
+            e.preventDefault();
+            uploadInChunks(chunkedForm, file).catch(error => {
+                alert('Upload failed: ' + error.message + '\nSubmit the form again to resume.');
+                chunkedForm.querySelectorAll('button[type="submit"]').forEach(button => {
+                    button.disabled = false;
+                    button.textContent = 'Upload Material';
+                });
+            });
+        });
+    }
+
+    async function uploadInChunks(form, file) {
+        const csrfToken = form.querySelector('[name="csrfmiddlewaretoken"]').value;
+        const progress = form.querySelector('.upload-progress');
+        const resumeKey = 'chunked-upload:' + [form.dataset.chunkedUploadUrl, file.name, file.size, file.lastModified].join(':');
+
+        async function request(url, options) {
+            const response = await fetch(url, {
+                credentials: 'same-origin',
+                ...options,
+                headers: {'X-CSRFToken': csrfToken, ...(options && options.headers)},
+            });
+            const data = await response.json();
+            if (!response.ok) {
+                throw new Error(data.error || JSON.stringify(data.errors || data));
+            }
+            return data;
+        }
+
+        // Resume an earlier attempt for the same file if the server still has it.
+        let session = null;
+        const savedUrl = localStorage.getItem(resumeKey);
+        if (savedUrl) {
+            session = await request(savedUrl).catch(() => null);
+        }
+        if (!session || session.status !== 'uploading') {
+            const fields = new FormData(form);
+            session = await request(form.dataset.chunkedUploadUrl, {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({
+                    title: fields.get('title'),
+                    material_type: fields.get('material_type'),
+                    description: fields.get('description'),
+                    filename: file.name,
+                    size: file.size,
+                }),
+            });
+            localStorage.setItem(resumeKey, session.url);
+        }
+
+        const pending = session.missing.slice();
+        let done = session.chunk_count - pending.length;
+        progress.hidden = false;
+        progress.value = 100 * done / session.chunk_count;
+
+        async function sendChunk(index) {
+            const blob = file.slice(index * session.chunk_size, (index + 1) * session.chunk_size);
+            const headers = {};
+            if (window.crypto && crypto.subtle) {
+                const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+                headers['X-Chunk-SHA256'] = Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+            }
+            for (let attempt = 1; ; attempt++) {
+                try {
+                    await request(session.url + 'chunks/' + index + '/', {method: 'PUT', headers: headers, body: blob});
+                    break;
+                } catch (error) {
+                    if (attempt >= 3) {
+                        throw error;
+                    }
+                    await new Promise(resolve => setTimeout(resolve, 1000 * attempt));
+                }
+            }
+            done += 1;
+            progress.value = 100 * done / session.chunk_count;
+        }
+
+        // A few chunks in flight at once keeps the connection busy.
+        async function worker() {
+            while (pending.length) {
+                await sendChunk(pending.shift());
+            }
+        }
+        await Promise.all([worker(), worker(), worker()]);
+
+        const result = await request(session.url + 'complete/', {method: 'POST'});
+        localStorage.removeItem(resumeKey);
+        window.location = result.redirect_url;
+    }
 });
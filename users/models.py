@@ -10,6 +10,7 @@ class User(AbstractUser):
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='student')
     bio = models.TextField(blank=True)
     profile_picture = models.ImageField(upload_to='profiles/', null=True, blank=True)
+    profile_picture_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
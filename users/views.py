@@ -1,9 +1,12 @@
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .forms import UserRegistrationForm, UserLoginForm, UserProfileForm
 from .services import UserService
 from .models import User
+from courses import http_cache
+from courses.pagination import KeysetPaginator
 
 def register(request):
     if request.method == 'POST':
@@ -57,7 +60,15 @@ def profile(request):
         form = UserProfileForm(instance=request.user)
     return render(request, 'users/profile.html', {'form': form})
 
+@http_cache.catalog_page(http_cache.author_profile_validator)
 def author_profile(request, username):
     author = get_object_or_404(User, username=username)
-    courses = author.courses.filter(is_published=True)
-    return render(request, 'users/author_profile.html', {'author': author, 'courses': courses})
+    published = author.courses.published()
+    paginator = KeysetPaginator(published.for_listing(), settings.COURSES_PER_PAGE)
+    page = paginator.get_page(after=request.GET.get('after'), before=request.GET.get('before'))
+    return render(request, 'users/author_profile.html', {
+        'author': author,
+        'courses': page.object_list,
+        'course_count': published.count(),
+        'page': page,
+    })